@@ -0,0 +1,201 @@
+"""
+Resized avatar variants.
+
+Every uploaded avatar gets square variants in each of ``AVATAR_SIZES`` as
+JPEG and WebP, stored next to the original as ``<name>_<size>.<ext>``. They
+are generated after the upload's transaction commits, on a small thread
+pool, so the profile update request does not wait for the resizing.
+"""
+import io
+import os
+import logging
+import threading
+from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, ImageOps
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+
+from .storage import get_avatar_storage
+
+
+logger = logging.getLogger(__name__)
+
+# Pillow format name and file extension of each variant format.
+AVATAR_FORMATS = {
+    "webp": ("WEBP", "webp"),
+    "jpeg": ("JPEG", "jpg"),
+}
+
+
+def get_avatar_sizes():
+    return tuple(sorted(getattr(settings, "AVATAR_SIZES", (40, 128, 256))))
+
+
+def variant_name(name, size, format):
+    root, _ = os.path.splitext(name)
+    return f"{root}_{size}.{AVATAR_FORMATS[format][1]}"
+
+
+def variant_names(name):
+    return [
+        variant_name(name, size, format)
+        for size in get_avatar_sizes()
+        for format in AVATAR_FORMATS
+    ]
+
+
+def _ready_key(name):
+    return f"avatar-variants:v1:{name}"
+
+
+def variants_ready(name, storage=None):
+    """
+    True once every variant of ``name`` exists; cached so templates don't stat files.
+    """
+    key = _ready_key(name)
+    ready = cache.get(key)
+    if ready is None:
+        storage = storage or get_avatar_storage()
+        ready = all(storage.exists(variant) for variant in variant_names(name))
+        # Missing variants may be being generated; look again soon.
+        cache.set(key, ready, None if ready else 60)
+    return ready
+
+
+def _flatten(image):
+    """
+    Return an RGB copy of ``image``, with transparency composited onto white.
+    """
+    if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel("A"))
+        return background
+    return image.convert("RGB")
+
+
+def generate_variants(name, storage=None):
+    """
+    Write every size and format of ``name``; returns the names written.
+    """
+    storage = storage or get_avatar_storage()
+    sizes = get_avatar_sizes()
+    quality = getattr(settings, "AVATAR_QUALITY", 85)
+    written = []
+
+    with storage.open(name, "rb") as f, Image.open(f) as image:
+        # Let the JPEG decoder downscale by a power of two while decoding.
+        image.draft("RGB", (sizes[-1] * 2, sizes[-1] * 2))
+        image = _flatten(ImageOps.exif_transpose(image))
+
+        for size in reversed(sizes):
+            # Resize from the previous (larger) variant: cheaper and just as sharp.
+            image = ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS)
+
+            for format, (pil_format, _) in AVATAR_FORMATS.items():
+                buffer = io.BytesIO()
+                image.save(buffer, pil_format, quality=quality, optimize=True)
+
+                target = variant_name(name, size, format)
+                if storage.exists(target):
+                    storage.delete(target)
+                written.append(storage.save(target, ContentFile(buffer.getvalue())))
+
+    cache.set(_ready_key(name), True, None)
+    return written
+
+
+def delete_variants(name, storage=None):
+    storage = storage or get_avatar_storage()
+    for variant in variant_names(name):
+        storage.delete(variant)
+    cache.delete(_ready_key(name))
+
+
+def get_release_cutoff(min_age=None):
+    """
+    Avatar files modified after this may belong to an upload still in flight.
+    """
+    if min_age is None:
+        min_age = getattr(settings, "AVATAR_SWEEP_MIN_AGE", 60 * 60)
+    return timezone.now() - timedelta(seconds=min_age)
+
+
+def is_recent(name, storage=None, cutoff=None):
+    """
+    True if the avatar file ``name`` was saved after ``cutoff``; see
+    ``ContentAddressedStorageMixin``.
+    """
+    storage = storage or get_avatar_storage()
+    try:
+        return storage.get_modified_time(name) > (cutoff or get_release_cutoff())
+    except FileNotFoundError:
+        return False
+
+
+def delete_avatar(name, storage=None):
+    """
+    Delete the avatar file ``name`` and its variants.
+    """
+    storage = storage or get_avatar_storage()
+    delete_variants(name, storage)
+    storage.delete(name)
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, "AVATAR_WORKERS", 2),
+                thread_name_prefix="avatar",
+            )
+    return _executor
+
+
+def _generate_logged(name):
+    try:
+        generate_variants(name)
+    except Exception:
+        # The original stays in use; variants can be rebuilt later.
+        logger.exception("Could not generate avatar variants for %s", name)
+
+
+def schedule_variants(name, using=None):
+    """
+    Generate the variants of ``name`` once the current transaction commits.
+
+    With ``AVATAR_VARIANTS_ASYNC = False`` they are generated on commit in
+    the calling thread instead, which keeps tests deterministic. An image
+    another user uploaded before already has its variants.
+    """
+    if variants_ready(name):
+        return
+    if getattr(settings, "AVATAR_VARIANTS_ASYNC", True):
+        transaction.on_commit(lambda: get_executor().submit(_generate_logged, name), using=using)
+    else:
+        transaction.on_commit(lambda: _generate_logged(name), using=using)
+
+
+def avatar_variant_url(user, size, format="jpeg"):
+    """
+    URL of the smallest variant at least ``size`` px wide, or ``None``.
+
+    Falls back to the largest variant, and to ``None`` when the user has no
+    avatar or its variants are not ready yet.
+    """
+    if not user.avatar or not variants_ready(user.avatar.name):
+        return None
+    sizes = get_avatar_sizes()
+    chosen = next((candidate for candidate in sizes if candidate >= size), sizes[-1])
+    return get_avatar_storage().url(variant_name(user.avatar.name, chosen, format))
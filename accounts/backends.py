@@ -0,0 +1,79 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.contrib.auth.backends import ModelBackend
+
+from .models import User
+
+
+# Backends whose entries only the current process sees.
+PER_PROCESS_CACHES = (LocMemCache, DummyCache)
+
+
+def is_shared_cache(cache):
+    return not isinstance(cache, PER_PROCESS_CACHES)
+
+
+def get_user_cache():
+    """
+    The cache named by ``USER_CACHE``, or ``None`` when user rows are not cached.
+    """
+    alias = getattr(settings, "USER_CACHE", None)
+    return caches[alias] if alias is not None else None
+
+
+def user_cache_key(user_id):
+    return f"accounts:user:v1:{user_id}"
+
+
+def invalidate_cached_user(user_id):
+    cache = get_user_cache()
+    if cache is not None:
+        cache.delete(user_cache_key(user_id))
+
+
+class CachedModelBackend(ModelBackend):
+    """
+    ``ModelBackend`` that loads the user of a session from ``USER_CACHE``.
+
+    Every authenticated request resolves ``request.user`` through
+    ``get_user()``; the row is cached for ``USER_CACHE_TIMEOUT`` seconds and
+    dropped whenever the user is saved or deleted (accounts/signals.py), which
+    covers profile updates, password changes, deactivation and logins. The
+    cache has to be shared by every process for that to reach all of them;
+    accounts/checks.py refuses a per-process one. Without ``USER_CACHE`` this
+    is ``ModelBackend``.
+    """
+
+    def get_user(self, user_id):
+        cache = get_user_cache()
+        if cache is None:
+            return super().get_user(user_id)
+        key = user_cache_key(user_id)
+
+        user = cache.get(key)
+        if user is None:
+            try:
+                user = User._default_manager.get(pk=user_id)
+            except User.DoesNotExist:
+                return None
+            cache.set(key, user, getattr(settings, "USER_CACHE_TIMEOUT", 300))
+
+        return user if self.user_can_authenticate(user) else None
+
+    async def aget_user(self, user_id):
+        cache = get_user_cache()
+        if cache is None:
+            return await super().aget_user(user_id)
+        key = user_cache_key(user_id)
+
+        user = await cache.aget(key)
+        if user is None:
+            try:
+                user = await User._default_manager.aget(pk=user_id)
+            except User.DoesNotExist:
+                return None
+            await cache.aset(key, user, getattr(settings, "USER_CACHE_TIMEOUT", 300))
+
+        return user if self.user_can_authenticate(user) else None
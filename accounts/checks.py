@@ -0,0 +1,44 @@
+"""
+System checks that sessions and user rows are only cached where every
+process sees the same entries.
+
+A logout, a password change or a deactivation drops the cached session or
+user; with a per-process cache, other workers keep serving their copy.
+"""
+from django.conf import settings
+from django.core.cache import caches
+from django.core.checks import Error, Tags, register
+
+from .backends import is_shared_cache
+
+
+CACHED_SESSION_ENGINES = {
+    "django.contrib.sessions.backends.cache",
+    "django.contrib.sessions.backends.cached_db",
+}
+
+
+@register(Tags.caches)
+def check_shared_caches(app_configs, **kwargs):
+    errors = []
+
+    alias = settings.SESSION_CACHE_ALIAS
+    if settings.SESSION_ENGINE in CACHED_SESSION_ENGINES and not is_shared_cache(caches[alias]):
+        errors.append(Error(
+            f"SESSION_ENGINE caches sessions in {alias!r}, a cache each process keeps for itself.",
+            hint=(
+                "Point SESSION_CACHE_ALIAS at a Redis, Memcached, database or file cache, "
+                "or use the 'django.contrib.sessions.backends.db' engine."
+            ),
+            id="accounts.E001",
+        ))
+
+    alias = getattr(settings, "USER_CACHE", None)
+    if alias is not None and not is_shared_cache(caches[alias]):
+        errors.append(Error(
+            f"USER_CACHE is {alias!r}, a cache each process keeps for itself.",
+            hint="Point USER_CACHE at a Redis, Memcached, database or file cache, or set it to None.",
+            id="accounts.E002",
+        ))
+
+    return errors
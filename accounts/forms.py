@@ -1,3 +1,5 @@
+from PIL import Image
+
 from django import forms
 from django.utils.translation import gettext_lazy as _
 from django.contrib.auth.forms import (
@@ -7,6 +9,7 @@ from django.contrib.auth.forms import (
 )
 
 from .models import User
+from .utils import open_avatar
 
 
 class AuthenticationForm(DjangoAuthenticationForm):
@@ -46,11 +49,34 @@ class UserCreationForm(DjangoUserCreationForm):
 
     
 
+class AvatarField(forms.ImageField):
+    """
+    Image field that reads only the header of the upload.
+
+    ``forms.ImageField`` runs Pillow's ``verify()`` over the whole file and
+    reports every failure as the same generic error. ``open_avatar`` says
+    what is wrong, and the file is only decoded once it has passed.
+    """
+
+    def to_python(self, data):
+        f = forms.FileField.to_python(self, data)
+        if f is None:
+            return None
+
+        image = open_avatar(f)
+        f.image = image
+        f.content_type = Image.MIME.get(image.format)
+        return f
+
+
 class UserChangeForm(DjangoUserChangeForm):
 
     class Meta:
         model = User
         fields = ("email", "avatar", "first_name", "last_name",)
+        field_classes = {
+            "avatar": AvatarField,
+        }
         
         widgets = {
             "avatar": forms.FileInput,
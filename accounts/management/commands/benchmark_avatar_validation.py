@@ -0,0 +1,141 @@
+import io
+import time
+import zlib
+import struct
+
+from PIL import Image
+
+from django import forms
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.forms import AvatarField
+from accounts.utils import validate_avatar
+from notes_app.benchmark import environment, summarize, write_report
+
+
+def _image(format, size, **options):
+    buffer = io.BytesIO()
+    # Gradients and noise compress like a photo rather than like a flat colour.
+    gradient = Image.linear_gradient("L").resize(size)
+    channels = (gradient, Image.effect_noise(size, 32), gradient.transpose(Image.Transpose.FLIP_LEFT_RIGHT))
+    Image.merge("RGB", channels).save(buffer, format, **options)
+    return buffer.getvalue()
+
+
+def _png_bomb(width, height):
+    """
+    A valid 1×1 PNG whose header claims ``width`` × ``height`` pixels.
+    """
+    data = bytearray(_image("PNG", (1, 1)))
+    ihdr = data[12:29]
+    ihdr[4:12] = struct.pack(">II", width, height)
+    data[12:29] = ihdr
+    data[29:33] = struct.pack(">I", zlib.crc32(ihdr))
+    return bytes(data)
+
+
+CASES = [
+    ("jpeg 256x256", "avatar.jpg", lambda: _image("JPEG", (256, 256), quality=90)),
+    ("jpeg 1600x1200", "photo.jpg", lambda: _image("JPEG", (1600, 1200), quality=90)),
+    ("png 512x512", "avatar.png", lambda: _image("PNG", (512, 512))),
+    # Under Pillow's own bomb limit, so only AVATAR_MAX_PIXELS catches it.
+    ("png bomb 10000x10000", "bomb.png", lambda: _png_bomb(10000, 10000)),
+    ("png bomb 50000x50000", "bomb.png", lambda: _png_bomb(50000, 50000)),
+    ("gif 64x64", "avatar.gif", lambda: _image("GIF", (64, 64))),
+    ("not an image", "avatar.png", lambda: b"<html>definitely not a PNG</html>" * 10),
+]
+
+
+def validate_header(upload):
+    """
+    What a profile update runs now: the form field, then the model validator.
+    """
+    validate_avatar(AvatarField().clean(upload))
+
+
+def validate_previous(upload):
+    """
+    What it ran before: ``forms.ImageField`` with ``verify()``, then ``Image.open``.
+    """
+    forms.ImageField().clean(upload)
+    upload.seek(0)
+    with Image.open(upload) as image:
+        if image.format not in ("JPEG", "PNG"):
+            raise ValidationError("Only JPG and PNG image formats are allowed.")
+
+
+def decode(upload):
+    """
+    Reference: fully decoding the pixels, as resizing the variants does.
+    """
+    with Image.open(upload) as image:
+        image.load()
+
+
+METHODS = {
+    "header": validate_header,
+    "previous": validate_previous,
+    "decode": decode,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Time avatar upload validation per upload for typical, hostile and invalid "
+        "files, against the previous verify()-based validation and a full decode, "
+        "and report the percentiles as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=200,
+            help="Timed validations per case and method (default: 200).",
+        )
+        parser.add_argument(
+            "--decode-bombs",
+            action="store_true",
+            help="Also decode the decompression bomb (allocates gigabytes).",
+        )
+        parser.add_argument(
+            "--output",
+            default="-",
+            help="Write the JSON report to this file instead of stdout.",
+        )
+
+    def handle(self, *args, **options):
+        if options["repeat"] < 1:
+            raise CommandError("--repeat must be at least 1.")
+
+        report = {**environment(), "repeat": options["repeat"], "results": []}
+
+        for case, filename, build in CASES:
+            content = build()
+            for method, validate in METHODS.items():
+                if method == "decode" and "bomb" in case and not options["decode_bombs"]:
+                    continue
+                result = self.run_case(validate, filename, content, options["repeat"])
+                report["results"].append({"case": case, "bytes": len(content), "method": method, **result})
+
+        write_report(report, options["output"], self.stdout)
+
+    def run_case(self, validate, filename, content, repeat):
+        latencies, outcome = [], None
+
+        for _ in range(repeat):
+            upload = SimpleUploadedFile(filename, content)
+            start = time.perf_counter()
+            try:
+                validate(upload)
+                outcome = "valid"
+            except ValidationError as e:
+                outcome = e.error_list[0].code or "invalid"
+            except Exception as e:
+                # Only the decode reference lets Pillow's own errors through.
+                outcome = type(e).__name__
+            latencies.append((time.perf_counter() - start) * 1_000_000)
+
+        return {"outcome": outcome, "latency_us": summarize(latencies, digits=1)}
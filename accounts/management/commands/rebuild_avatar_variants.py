@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.avatars import generate_variants
+from accounts.models import User
+
+
+class Command(BaseCommand):
+    help = "Generate the resized JPEG and WebP variants of uploaded avatars."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--user",
+            dest="email",
+            help="Only rebuild the avatar of this email address.",
+        )
+
+    def handle(self, *args, **options):
+        users = User.objects.exclude(avatar="")
+
+        if options["email"]:
+            users = users.filter(email=options["email"])
+            if not users.exists():
+                raise CommandError(f"No user with an avatar and email {options['email']!r}.")
+
+        count = failed = 0
+        for name in users.values_list("avatar", flat=True).iterator():
+            try:
+                generate_variants(name)
+            except (OSError, ValueError) as e:
+                failed += 1
+                self.stderr.write(f"Skipped {name}: {e}")
+                continue
+            count += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated avatar variants for {count} users ({failed} skipped)."
+        ))
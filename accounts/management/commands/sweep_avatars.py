@@ -0,0 +1,118 @@
+import os
+import re
+from itertools import islice
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.avatars import AVATAR_FORMATS, delete_avatar, get_release_cutoff, is_recent
+from accounts.models import User
+from accounts.storage import get_avatar_storage
+
+
+AVATAR_DIR = "avatar_images"
+VARIANT_RE = re.compile(
+    r"^(?P<root>.+)_\d+\.(?:%s)$" % "|".join(ext for _, ext in AVATAR_FORMATS.values())
+)
+
+
+def _batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete avatar files, and their resized variants, that no user references. "
+        "Covers both content-hash names and the older per-upload names."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Avatar files checked per query (default: 500).",
+        )
+        parser.add_argument(
+            "--min-age",
+            type=int,
+            default=getattr(settings, "AVATAR_SWEEP_MIN_AGE", 3600),
+            help="Leave files younger than this many seconds alone (default: AVATAR_SWEEP_MIN_AGE).",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report what would be deleted.",
+        )
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1 or options["min_age"] < 0:
+            raise CommandError("--batch-size must be positive and --min-age not negative.")
+
+        self.storage = get_avatar_storage()
+        self.cutoff = get_release_cutoff(options["min_age"])
+        self.dry_run = options["dry_run"]
+        self.verbosity = options["verbosity"]
+
+        if not self.storage.exists(AVATAR_DIR):
+            self.stdout.write("No avatars stored.")
+            return
+
+        checked = swept = files = 0
+        # Old uploads sit in the directory itself, content-hash names one level down.
+        directories, _ = self.storage.listdir(AVATAR_DIR)
+        for directory in [AVATAR_DIR] + [os.path.join(AVATAR_DIR, d) for d in sorted(directories)]:
+            for batch, variants in self.scan(directory, options["batch_size"]):
+                checked += len(batch)
+                for name in self.orphans(batch):
+                    found = variants.get(name, [])
+                    swept += 1
+                    files += 1 + len(found)
+                    if self.verbosity > 1:
+                        self.stdout.write(f"{'Would delete' if self.dry_run else 'Deleted'} {name}")
+                    if not self.dry_run:
+                        # Also variants of sizes no longer in AVATAR_SIZES.
+                        for variant in found:
+                            self.storage.delete(variant)
+                        delete_avatar(name, self.storage)
+
+        verb = "Would sweep" if self.dry_run else "Swept"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {swept} of {checked} avatars ({files} files with variants)."
+        ))
+
+    def scan(self, directory, batch_size):
+        """
+        Yield batches of the avatar names in ``directory``, with the variants
+        found for each. Variants whose avatar is gone count as avatars.
+        """
+        _, filenames = self.storage.listdir(directory)
+        filenames = set(filenames)
+        roots = {os.path.splitext(filename)[0]: filename for filename in filenames}
+
+        variants = {}
+        originals = []
+        for filename in sorted(filenames):
+            match = VARIANT_RE.match(filename)
+            original = match and roots.get(match["root"])
+            if original:
+                variants.setdefault(os.path.join(directory, original), []).append(
+                    os.path.join(directory, filename)
+                )
+            else:
+                originals.append(os.path.join(directory, filename))
+
+        for batch in _batched(originals, batch_size):
+            yield batch, variants
+
+    def orphans(self, names):
+        referenced = set(User.objects.filter(avatar__in=names).values_list("avatar", flat=True))
+        for name in names:
+            if name in referenced:
+                continue
+            # Skip uploads whose user row may not be committed yet.
+            if is_recent(name, self.storage, self.cutoff):
+                continue
+            yield name
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.2 on 2026-10-18 16:59
+
+import accounts.storage
+import accounts.utils
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_remove_user_gender'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='user',
+            name='avatar',
+            field=models.ImageField(blank=True, help_text='Upload a profile picture (max 2MB, JPG/PNG only)', storage=accounts.storage.get_avatar_storage, upload_to=accounts.utils.upload_avatar_to, validators=[accounts.utils.validate_avatar], verbose_name='profile picture'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+from django.views import View
+from django.contrib.auth.mixins import LoginRequiredMixin
+
+
+class AsyncLoginRequiredMixin(LoginRequiredMixin):
+    """
+    ``LoginRequiredMixin`` for views whose handlers are coroutines.
+
+    Loads the user with ``request.auser()`` and puts it on ``request.user``,
+    so views and templates never evaluate the lazy user, which would query
+    the database from the event loop.
+    """
+
+    async def dispatch(self, request, *args, **kwargs):
+        request.user = await request.auser()
+        if not request.user.is_authenticated:
+            return self.handle_no_permission()
+        return await View.dispatch(self, request, *args, **kwargs)
@@ -5,6 +5,7 @@ from django.utils.translation import gettext_lazy as _
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin
 
 from .managers import UserManager
+from .storage import get_avatar_storage
 from .utils import *
 
 
@@ -54,6 +55,7 @@ class User(AbstractBaseUser, PermissionsMixin):
     avatar = models.ImageField(
         verbose_name=_("profile picture"),
         upload_to=upload_avatar_to,
+        storage=get_avatar_storage,
         blank=True,
         validators=[validate_avatar],
         help_text=_("Upload a profile picture (max 2MB, JPG/PNG only)")
@@ -79,4 +81,20 @@ class User(AbstractBaseUser, PermissionsMixin):
 
     def get_short_name(self):
         """Return the short name of the user."""
-        return self.first_name
\ No newline at end of file
+        return self.first_name
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored avatar so the signal hooks can tell a new upload apart
+        instance._remember_avatar()
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        if fields is None or "avatar" in fields:
+            self._remember_avatar()
+
+    def _remember_avatar(self):
+        avatar = self.__dict__.get("avatar")
+        self._stored_avatar = getattr(avatar, "name", avatar)
\ No newline at end of file
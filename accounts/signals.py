@@ -0,0 +1,66 @@
+from django.db import transaction
+from django.dispatch import receiver
+from django.db.models.signals import post_delete, post_save
+
+from . import avatars
+from .backends import invalidate_cached_user
+from .models import User
+
+
+def release_avatar(name, using=None):
+    """
+    Delete the avatar file ``name`` once the transaction commits, unless a
+    user still references it or it is younger than ``AVATAR_SWEEP_MIN_AGE``.
+
+    Avatar files are shared between users who uploaded the same image, so the
+    referencing users are the file's reference count. It is counted on commit,
+    when the change that dropped this reference is visible to everyone. An
+    upload of the same image still in flight is not counted, but it made the
+    file young; young files are left to ``sweep_avatars``.
+    """
+    if not name:
+        return
+
+    def release():
+        if User.objects.using(using).filter(avatar=name).exists():
+            return
+        if not avatars.is_recent(name):
+            avatars.delete_avatar(name)
+
+    transaction.on_commit(release, using=using)
+
+
+@receiver(post_save, sender=User)
+def generate_avatar_variants(sender, instance, created, raw=False, using=None, **kwargs):
+    """
+    Resize a newly uploaded avatar once the upload is committed, and release
+    the one it replaced.
+    """
+    if raw:
+        return
+
+    name = instance.avatar.name or ""
+    stored = getattr(instance, "_stored_avatar", None) or ""
+    if not created and name == stored:
+        return
+
+    instance._stored_avatar = name
+    release_avatar(stored, using=using)
+    if name:
+        avatars.schedule_variants(name, using=using)
+
+
+@receiver(post_delete, sender=User)
+def release_deleted_avatar(sender, instance, using=None, **kwargs):
+    release_avatar(instance.avatar.name, using=using)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_cache(sender, instance, using=None, **kwargs):
+    """
+    Drop the cached row behind ``request.user`` once the write commits, so
+    profile updates, password changes and deletions reach every session.
+    """
+    user_id = instance.pk  # Cleared on the instance once a delete finishes.
+    transaction.on_commit(lambda: invalidate_cached_user(user_id), using=using)
@@ -0,0 +1,85 @@
+"""
+Content-addressed storage for avatars.
+
+Avatars are named after the SHA-256 of their bytes, so identical uploads
+share one file. Files are not owned by a single user: a file is released
+(with its resized variants) when no ``User.avatar`` references it any more,
+and ``sweep_avatars`` removes whatever a crash or race left behind. Both
+leave files younger than ``AVATAR_SWEEP_MIN_AGE`` alone.
+"""
+import os
+import hashlib
+
+from django.core.files.storage import FileSystemStorage, storages
+
+
+AVATAR_STORAGE_ALIAS = "avatars"
+HASH_CHUNK_SIZE = 64 * 1024
+
+
+def hash_file(file):
+    """
+    SHA-256 of ``file``, read in chunks and rewound afterwards.
+    """
+    hasher = hashlib.sha256()
+    if hasattr(file, "seek"):
+        file.seek(0)
+    for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b""):
+        hasher.update(chunk)
+    if hasattr(file, "seek"):
+        file.seek(0)
+    return hasher.hexdigest()
+
+
+def content_hash(file):
+    """
+    Hash computed by the upload handlers while the file streamed in, if any.
+    """
+    return getattr(file, "content_hash", None) or hash_file(file)
+
+
+class ContentAddressedStorageMixin:
+    """
+    Never rename or overwrite: a name that exists already holds these bytes.
+
+    Saving such a name again refreshes its modification time instead. An
+    upload in flight does not reference its file yet, so this is what keeps
+    the age checks from deleting it.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        return name
+
+    def touch(self, name):
+        """
+        Set the modification time of ``name`` to now; raises
+        ``FileNotFoundError`` if it is gone.
+        """
+        raise NotImplementedError("Content-addressed storages must implement touch().")
+
+    def _save(self, name, content):
+        if self.exists(name):
+            try:
+                self.touch(name)
+                return name
+            except FileNotFoundError:
+                pass  # Released in the meantime; write it again.
+        return super()._save(name, content)
+
+
+class ContentAddressedFileSystemStorage(ContentAddressedStorageMixin, FileSystemStorage):
+
+    def __init__(self, **kwargs):
+        # Two uploads of a new image racing each other write the same bytes.
+        kwargs.setdefault("allow_overwrite", True)
+        super().__init__(**kwargs)
+
+    def touch(self, name):
+        os.utime(self.path(name))
+
+
+def get_avatar_storage():
+    """
+    The ``avatars`` entry of ``STORAGES``; callable so ``User.avatar`` follows settings.
+    """
+    return storages[AVATAR_STORAGE_ALIAS]
@@ -0,0 +1,42 @@
+from django import template
+from django.templatetags.static import static
+
+from accounts.avatars import avatar_variant_url
+
+
+register = template.Library()
+
+PLACEHOLDER = "assets/img/user-placeholder.jpeg"
+
+
+def _fallback_url(user):
+    return user.avatar.url if user.avatar else static(PLACEHOLDER)
+
+
+@register.simple_tag
+def avatar_url(user, size, format="jpeg"):
+    """
+    URL of the smallest avatar variant covering ``size`` px.
+
+    Falls back to the original upload until the variants exist, and to the
+    placeholder image for users without an avatar.
+    """
+    return avatar_variant_url(user, size, format) or _fallback_url(user)
+
+
+@register.inclusion_tag("accounts/partials/avatar.html")
+def avatar(user, size, **attrs):
+    """
+    Render a ``<picture>`` with WebP and JPEG variants for 1x and 2x screens.
+
+    Extra keyword arguments (``id``, ``class``, ``alt``) go on the ``<img>``.
+    """
+    attrs.setdefault("alt", "avatar")
+    return {
+        "size": size,
+        "attrs": attrs,
+        "src": avatar_variant_url(user, size) or _fallback_url(user),
+        "jpeg_2x": avatar_variant_url(user, size * 2),
+        "webp": avatar_variant_url(user, size, "webp"),
+        "webp_2x": avatar_variant_url(user, size * 2, "webp"),
+    }
@@ -1,3 +1,378 @@
-from django.test import TestCase
+import io
+import os
+import time
+import shutil
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from PIL import Image, ImageFile
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.template import Context, Template
+from django.urls import reverse
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from note.models import Note
+from note.tests import TEST_STORAGES, ClearCacheMixin
+
+from . import avatars
+from .avatars import AVATAR_FORMATS, avatar_variant_url, get_avatar_sizes, variant_name, variants_ready
+from .backends import get_user_cache
+from .checks import check_shared_caches
+from .models import User
+from .storage import get_avatar_storage
+from .templatetags.avatar_tags import PLACEHOLDER, avatar_url
+from .utils import open_avatar, validate_avatar
+
+
+UNCACHED = {
+    "SESSION_ENGINE": "django.contrib.sessions.backends.db",
+    "AUTHENTICATION_BACKENDS": ["django.contrib.auth.backends.ModelBackend"],
+}
+
+
+def shared_cache_settings(location):
+    """
+    Sessions and users cached in a file cache at ``location``, which every
+    process on the host shares, as Redis would be in production.
+    """
+    return {
+        "CACHES": {
+            **settings.CACHES,
+            "shared": {"BACKEND": "django.core.cache.backends.filebased.FileBasedCache", "LOCATION": location},
+        },
+        "SESSION_ENGINE": "django.contrib.sessions.backends.cached_db",
+        "SESSION_CACHE_ALIAS": "shared",
+        "USER_CACHE": "shared",
+    }
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class SessionUserCacheTests(ClearCacheMixin, TestCase):
+    """
+    With a shared cache, authenticated requests load the session and
+    ``request.user`` from it, and writes to the user reach the cached copy.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        location = tempfile.mkdtemp()
+        cls.addClassCleanup(shutil.rmtree, location)
+        cls.enterClassContext(override_settings(**shared_cache_settings(location)))
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("owner@example.com", "s3cret-pass!")
+        cls.note = Note.objects.create(owner=cls.user, title="Groceries", description="Milk")
+
+    def setUp(self):
+        super().setUp()
+        get_user_cache().clear()
+
+    def request_queries(self, client, url, method="get"):
+        with CaptureQueriesContext(connection) as ctx:
+            response = getattr(client, method)(url)
+        self.assertLess(response.status_code, 400)
+        return [query["sql"] for query in ctx.captured_queries]
+
+    def logged_in_client(self):
+        client = self.client_class()
+        client.force_login(self.user)
+        client.get(reverse("note:note_list"))  # Fills the user cache.
+        return client
+
+    def test_queries_saved_per_request(self):
+        for url, method in [
+            (reverse("note:note_favorite_toggle", args=[self.note.pk]), "post"),
+            (reverse("note:note_list"), "get"),
+        ]:
+            with self.subTest(url=url):
+                with override_settings(**UNCACHED):
+                    client = self.client_class()
+                    client.force_login(self.user)
+                    uncached = self.request_queries(client, url, method)
+
+                cached = self.request_queries(self.logged_in_client(), url, method)
+
+                self.assertEqual(len(uncached) - len(cached), 2)
+                for table in ('"django_session"', '"accounts_user"'):
+                    self.assertTrue(any(table in sql for sql in uncached))
+                    self.assertFalse(any(table in sql for sql in cached))
+
+    def test_profile_update_reaches_cached_user(self):
+        self.client.force_login(self.user)
+        self.client.get(reverse("accounts:update"))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse("accounts:update"), {
+                "email": self.user.email,
+                "first_name": "Ada",
+                "last_name": "Lovelace",
+            })
+        self.assertEqual(response.status_code, 204)
+
+        response = self.client.get(reverse("accounts:update"))
+        self.assertEqual(response.context["user"].first_name, "Ada")
+
+    def test_logout_ends_the_session_everywhere(self):
+        client = self.logged_in_client()
+        # The same session, as sent to another worker.
+        other = self.client_class()
+        other.cookies = client.cookies
+
+        client.post(reverse("accounts:logout"))
+        self.assertEqual(other.get(reverse("note:note_list")).status_code, 302)
+
+    def test_password_change_ends_other_sessions(self):
+        client = self.logged_in_client()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            user = User.objects.get(pk=self.user.pk)
+            user.set_password("n3w-s3cret-pass!")
+            user.save()
+
+        self.assertEqual(client.get(reverse("note:note_list")).status_code, 302)
+
+    def test_deactivation_ends_sessions(self):
+        client = self.logged_in_client()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            user = User.objects.get(pk=self.user.pk)
+            user.is_active = False
+            user.save()
+
+        self.assertEqual(client.get(reverse("note:note_list")).status_code, 302)
+
+
+class SharedCacheCheckTests(SimpleTestCase):
+    """
+    Sessions and users are only cached in a cache every process shares.
+    """
+
+    def errors(self):
+        return [error.id for error in check_shared_caches(None)]
+
+    @override_settings(
+        SESSION_ENGINE="django.contrib.sessions.backends.cached_db",
+        SESSION_CACHE_ALIAS="default",
+        USER_CACHE="default",
+    )
+    def test_per_process_cache(self):
+        self.assertEqual(self.errors(), ["accounts.E001", "accounts.E002"])
+
+    def test_shared_cache(self):
+        with override_settings(**shared_cache_settings(tempfile.gettempdir())):
+            self.assertEqual(self.errors(), [])
+
+    @override_settings(SESSION_ENGINE="django.contrib.sessions.backends.db", USER_CACHE=None)
+    def test_uncached(self):
+        self.assertEqual(self.errors(), [])
+        self.assertIsNone(get_user_cache())
+
+
+def image_upload(size=(300, 200), format="PNG", mode="RGB", color="red", name=None):
+    buffer = io.BytesIO()
+    Image.new(mode, size, color).save(buffer, format)
+    return SimpleUploadedFile(name or f"avatar.{format.lower()}", buffer.getvalue())
+
+
+@override_settings(STORAGES=TEST_STORAGES, AVATAR_VARIANTS_ASYNC=False)
+class AvatarTestCase(ClearCacheMixin, TestCase):
+    """
+    Stores avatars in a throwaway ``MEDIA_ROOT``.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        media_root = tempfile.mkdtemp()
+        cls.addClassCleanup(shutil.rmtree, media_root)
+        cls.enterClassContext(override_settings(MEDIA_ROOT=media_root))
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("owner@example.com", "s3cret-pass!")
+
+    def setUp(self):
+        super().setUp()
+        self.storage = get_avatar_storage()
+
+    def upload(self, user, upload):
+        self.client.force_login(user)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse("accounts:update"), {
+                "email": user.email,
+                "first_name": "Ada",
+                "avatar": upload,
+            })
+        user.refresh_from_db()
+        return response
+
+
+class AvatarVariantTests(AvatarTestCase):
+    """
+    Uploaded avatars get square JPEG and WebP variants in every size, and
+    pages pick the smallest one covering the rendered size.
+    """
+
+    def test_variants(self):
+        self.assertEqual(self.upload(self.user, image_upload()).status_code, 204)
+        name = self.user.avatar.name
+        self.assertTrue(variants_ready(name))
+
+        for size in get_avatar_sizes():
+            for format, (pil_format, ext) in AVATAR_FORMATS.items():
+                with self.subTest(size=size, format=format):
+                    with self.storage.open(variant_name(name, size, format)) as f, Image.open(f) as image:
+                        self.assertEqual(image.format, pil_format)
+                        self.assertEqual(image.size, (size, size))
+
+    def test_transparency_is_flattened(self):
+        self.upload(self.user, image_upload(mode="RGBA", color=(0, 0, 0, 0)))
+        with self.storage.open(variant_name(self.user.avatar.name, 40, "jpeg")) as f, Image.open(f) as image:
+            self.assertEqual(image.convert("RGB").getpixel((20, 20)), (255, 255, 255))
+
+    def test_variant_urls(self):
+        self.upload(self.user, image_upload())
+        name = self.user.avatar.name
+        self.assertEqual(avatar_variant_url(self.user, 40), self.storage.url(variant_name(name, 40, "jpeg")))
+        self.assertEqual(avatar_variant_url(self.user, 100, "webp"), self.storage.url(variant_name(name, 128, "webp")))
+        self.assertEqual(avatar_variant_url(self.user, 1000), self.storage.url(variant_name(name, 256, "jpeg")))
+
+        html = Template("{% load avatar_tags %}{% avatar user 40 %}").render(Context({"user": self.user}))
+        self.assertIn(f'srcset="{self.storage.url(variant_name(name, 40, "webp"))} 1x', html)
+        self.assertIn(f'{self.storage.url(variant_name(name, 128, "jpeg"))} 2x', html)
+
+    def test_fallbacks(self):
+        self.assertIn(PLACEHOLDER, avatar_url(self.user, 40))
+
+        # Before the variants exist the original is served.
+        with override_settings(AVATAR_VARIANTS_ASYNC=True), mock.patch.object(avatars, "get_executor"):
+            self.upload(self.user, image_upload())
+        caches["default"].clear()
+        self.assertFalse(variants_ready(self.user.avatar.name))
+        self.assertEqual(avatar_url(self.user, 40), self.user.avatar.url)
+
+
+class AvatarReleaseTests(AvatarTestCase):
+    """
+    Identical uploads share one file, which is deleted once nobody
+    references it and it is older than ``AVATAR_SWEEP_MIN_AGE``.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.other = User.objects.create_user("other@example.com", "s3cret-pass!")
+
+    def age(self, name, seconds=2 * 60 * 60):
+        """
+        Backdate ``name`` as if it was saved ``seconds`` ago.
+        """
+        mtime = time.time() - seconds
+        os.utime(self.storage.path(name), (mtime, mtime))
+
+    def sweep(self, *args):
+        out = io.StringIO()
+        call_command("sweep_avatars", *args, stdout=out)
+        return out.getvalue()
+
+    def test_identical_uploads_share_a_file(self):
+        self.upload(self.user, image_upload())
+        self.upload(self.other, image_upload(name="copy.png"))
+        self.assertEqual(self.user.avatar.name, self.other.avatar.name)
+
+        # Still referenced by the other user.
+        name = self.user.avatar.name
+        self.age(name)
+        self.upload(self.user, image_upload(color="blue"))
+        self.assertTrue(self.storage.exists(name))
+
+    def test_released_once_old(self):
+        self.upload(self.user, image_upload())
+        name = self.user.avatar.name
+        self.age(name)
+        self.upload(self.user, image_upload(color="blue"))
+        self.assertFalse(self.storage.exists(name))
+        self.assertFalse(self.storage.exists(variant_name(name, 40, "jpeg")))
+
+    def test_young_file_left_to_sweep(self):
+        self.upload(self.user, image_upload())
+        name = self.user.avatar.name
+        self.upload(self.user, image_upload(color="blue"))
+        self.assertTrue(self.storage.exists(name))
+
+        self.assertIn("Swept 0 of 2 avatars", self.sweep())
+        self.assertIn("Would sweep 1 of 2 avatars", self.sweep("--min-age", "0", "--dry-run"))
+        self.assertTrue(self.storage.exists(name))
+        self.assertIn("Swept 1 of 2 avatars", self.sweep("--min-age", "0"))
+        self.assertFalse(self.storage.exists(name))
+        self.assertTrue(self.storage.exists(self.user.avatar.name))
+
+    def test_saving_again_refreshes_the_file(self):
+        # An upload of the same image, not committed yet, makes the file young.
+        self.upload(self.user, image_upload())
+        name = self.user.avatar.name
+        self.age(name)
+        self.assertEqual(self.storage.save(name, image_upload()), name)
+        self.assertTrue(avatars.is_recent(name))
+
+        self.upload(self.user, image_upload(color="blue"))
+        self.assertTrue(self.storage.exists(name))
+
+
+class AvatarValidationTests(SimpleTestCase):
+    """
+    Uploads are checked from the image header alone; see ``open_avatar``.
+    """
+
+    def assertRejected(self, upload, code):
+        with self.assertRaises(ValidationError) as cm:
+            validate_avatar(upload)
+        self.assertEqual(cm.exception.code, code)
+        return cm.exception
+
+    def test_valid(self):
+        for format in ("PNG", "JPEG"):
+            with self.subTest(format=format):
+                image = open_avatar(image_upload(format=format))
+                self.assertEqual((image.format, image.size), (format, (300, 200)))
+
+    def test_pixels_are_not_decoded(self):
+        upload = image_upload(size=(2000, 2000))
+        with mock.patch.object(ImageFile.ImageFile, "load") as load:
+            validate_avatar(upload)
+        load.assert_not_called()
+
+    def test_not_an_image(self):
+        self.assertRejected(SimpleUploadedFile("avatar.png", b"not an image"), "invalid_image")
+        self.assertRejected(SimpleUploadedFile("avatar.png", image_upload().read()[:10]), "invalid_image")
+
+    def test_format(self):
+        error = self.assertRejected(image_upload(format="GIF", mode="P"), "invalid_format")
+        self.assertEqual(error.params, {"format": "GIF"})
+
+    @override_settings(AVATAR_MAX_UPLOAD_SIZE=1024)
+    def test_file_too_large(self):
+        upload = SimpleUploadedFile("avatar.png", os.urandom(2048))
+        error = self.assertRejected(upload, "file_too_large")
+        self.assertEqual(error.params, {"size": "2.0\xa0KB", "limit": "1.0\xa0KB"})
+
+    @override_settings(AVATAR_MAX_PIXELS=100 * 100)
+    def test_too_many_pixels(self):
+        open_avatar(image_upload(size=(100, 100)))
+        error = self.assertRejected(image_upload(size=(101, 100)), "too_many_pixels")
+        self.assertEqual(error.params, {"width": 101, "height": 100, "limit": "0.0"})
+
+    def test_decompression_bomb(self):
+        # A few KB of PNG declaring far more pixels than Pillow's own limit.
+        bomb = image_upload(size=(20000, 20000), mode="1", color=0)
+        self.assertLess(bomb.size, 100 * 1024)
+        self.assertRejected(bomb, "too_many_pixels")
@@ -1,35 +1,112 @@
 import os
-import uuid
-from PIL import Image
+import warnings
+from PIL import Image, UnidentifiedImageError
 
+from django.conf import settings
 from django.core.exceptions import ValidationError
+from django.template.defaultfilters import filesizeformat
 from django.utils.translation import gettext_lazy as _
 
+from .storage import content_hash
+
+
+# Extension by image format, so the same bytes always get the same name.
+AVATAR_EXTENSIONS = {"JPEG": ".jpg", "PNG": ".png"}
+
 
 def upload_avatar_to(instance, filename):
-    filename, ext = os.path.splitext(filename)
-    return os.path.join(
-        "avatar_images",
-        "avatar_{uuid}_{filename}{ext}".format(
-            uuid=uuid.uuid4(), filename=filename, ext=ext
-        ),
+    """
+    Name the avatar after the SHA-256 of its bytes, fanned out by prefix.
+
+    Uploading an image already in storage yields the same name, so it is
+    stored once however many users pick it.
+    """
+    file = instance.avatar.file
+    digest = content_hash(file)
+    ext = AVATAR_EXTENSIONS.get(getattr(file, "image", None) and file.image.format)
+    if ext is None:
+        ext = os.path.splitext(filename)[1].lower()
+    return os.path.join("avatar_images", digest[:2], f"{digest}{ext}")
+
+
+def get_avatar_limits():
+    """
+    ``(max_bytes, max_pixels)`` from ``AVATAR_MAX_UPLOAD_SIZE`` and ``AVATAR_MAX_PIXELS``.
+    """
+    return (
+        getattr(settings, "AVATAR_MAX_UPLOAD_SIZE", 2 * 1024 * 1024),
+        getattr(settings, "AVATAR_MAX_PIXELS", 4096 * 4096),
     )
 
 
+def open_avatar(file):
+    """
+    Open ``file`` with Pillow, reading only its header, and check the format
+    and dimensions it declares.
+
+    Returns the image unloaded: no pixels are decoded, so a small, highly
+    compressed file claiming huge dimensions is rejected before anything
+    allocates memory for them.
+    """
+    max_pixels = get_avatar_limits()[1]
+
+    if hasattr(file, "seek"):
+        file.seek(0)
+    try:
+        with warnings.catch_warnings():
+            # The limit below is ours; Pillow's own only applies past it.
+            warnings.simplefilter("ignore", Image.DecompressionBombWarning)
+            image = Image.open(file)
+    except Image.DecompressionBombError:
+        raise ValidationError(
+            _("The image has too many pixels; the limit is %(limit)s megapixels."),
+            code="too_many_pixels",
+            params={"limit": _megapixels(max_pixels)},
+        )
+    except (UnidentifiedImageError, OSError, SyntaxError, ValueError):
+        raise ValidationError(
+            _("The file is not an image, or its header is damaged."),
+            code="invalid_image",
+        )
+    finally:
+        if hasattr(file, "seek"):
+            file.seek(0)
+
+    if image.format not in AVATAR_EXTENSIONS:
+        raise ValidationError(
+            _("%(format)s images are not allowed; upload a JPG or PNG image."),
+            code="invalid_format",
+            params={"format": image.format},
+        )
+
+    width, height = image.size
+    if width * height > max_pixels:
+        raise ValidationError(
+            _("The image is %(width)s × %(height)s pixels; the limit is %(limit)s megapixels."),
+            code="too_many_pixels",
+            params={"width": width, "height": height, "limit": _megapixels(max_pixels)},
+        )
+    return image
+
+
+def _megapixels(pixels):
+    return f"{pixels / 1_000_000:.1f}"
+
+
 def validate_avatar(image):
     """
-    Validate avatar image for size and format.
+    Validate avatar image for size, format and dimensions, from its header.
     """
-    # Check file size (max 2MB)
-    max_size = 2 * 1024 * 1024  # 2MB in bytes
+    # Stored avatars were validated when they were uploaded.
+    if getattr(image, "_committed", False):
+        return
+
+    max_size = get_avatar_limits()[0]
     if image.size > max_size:
-        raise ValidationError(_("Image file size cannot exceed 2MB."))
-    
-    # Check file format
-    allowed_formats = ["JPEG", "JPG", "PNG"]
-    try:
-        with Image.open(image) as img:
-            if img.format not in allowed_formats:
-                raise ValidationError(_("Only JPG and PNG image formats are allowed."))
-    except Exception:
-        raise ValidationError(_("Invalid image file."))
\ No newline at end of file
+        raise ValidationError(
+            _("The image is %(size)s; the limit is %(limit)s."),
+            code="file_too_large",
+            params={"size": filesizeformat(image.size), "limit": filesizeformat(max_size)},
+        )
+
+    open_avatar(image)
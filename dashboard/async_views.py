@@ -0,0 +1,19 @@
+"""
+Async implementation of the dashboard, served when ``NOTE_ASYNC_VIEWS`` is on.
+"""
+from django.utils.decorators import method_decorator
+
+from accounts.mixins import AsyncLoginRequiredMixin
+from note.stats import aget_note_stats, get_daily_stats
+from note.conditional import aconditional_notes, dashboard_etag
+
+from . import views
+
+
+class DashboardView(AsyncLoginRequiredMixin, views.DashboardView):
+
+    @method_decorator(aconditional_notes(etag_func=dashboard_etag, last_modified_func=None))
+    async def get(self, request):
+        note_stats = await aget_note_stats(request.user)
+        notes_by_day = [row async for row in get_daily_stats(request.user).values("day", "created")]
+        return self.render_dashboard(request, note_stats, notes_by_day)
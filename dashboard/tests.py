@@ -1,3 +1,44 @@
-from django.test import TestCase
+from django.urls import reverse
+from django.test import TestCase, override_settings
 
-# Create your tests here.
+from accounts.models import User
+from note.models import Note
+from note.tests import TEST_STORAGES, ClearCacheMixin
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class DashboardTests(ClearCacheMixin, TestCase):
+    """
+    The dashboard renders from the NoteStats rollup and answers conditional
+    GETs until the rollup or the user changes.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("owner@example.com", "s3cret-pass!")
+        for i in range(3):
+            Note.objects.create(owner=cls.user, title=f"Note {i}", is_favourite=bool(i % 2))
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+        self.url = reverse("dashboard:dashboard")
+
+    def test_stats(self):
+        response = self.client.get(self.url)
+        stats = response.context["stats"]
+        self.assertEqual(
+            (stats["total_notes"], stats["favourite_notes"], stats["recent_notes"]),
+            (3, 1, 3),
+        )
+        self.assertEqual(stats["last_updated"].title, "Note 2")
+
+    def test_not_modified(self):
+        self.client.get(self.url)  # Sets the CSRF cookie the ETag covers.
+        etag = self.client.get(self.url)["ETag"]
+        self.assertEqual(self.client.get(self.url, headers={"If-None-Match": etag}).status_code, 304)
+
+        Note.objects.create(owner=self.user, title="Another")
+        response = self.client.get(self.url, headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["stats"]["total_notes"], 4)
@@ -1,10 +1,15 @@
+from django.conf import settings
 from django.urls import path
 
-from .views import DashboardView
+from . import async_views, views
 
 
 app_name = "dashboard"
 
+# Same view, implemented with coroutines and the async ORM.
+if getattr(settings, "NOTE_ASYNC_VIEWS", False):
+    views = async_views
+
 urlpatterns = [
-    path("", DashboardView.as_view(), name="dashboard"),
+    path("", views.DashboardView.as_view(), name="dashboard"),
 ]
\ No newline at end of file
@@ -2,36 +2,37 @@ from django.views import View
 from django.shortcuts import render
 from django.utils import timezone
 from datetime import timedelta
-from django.db.models import Count
-from django.db.models.functions import TruncDate
+from django.utils.decorators import method_decorator
 from django.contrib.auth.mixins import LoginRequiredMixin
 import json
 from django.core.serializers.json import DjangoJSONEncoder
 
-from note.models import Note
+from note.stats import get_note_stats, get_daily_stats
+from note.conditional import conditional_notes, dashboard_etag
 
 
+@method_decorator(conditional_notes(etag_func=dashboard_etag, last_modified_func=None), name="get")
 class DashboardView(LoginRequiredMixin, View):
     
     def get(self, request):
-        notes_qs = Note.objects.filter(owner=request.user)
-        
-        notes_by_day = (
-            notes_qs
-            .annotate(day=TruncDate("created_at"))
-            .values("day")
-            .annotate(total=Count("id"))
-            .order_by("day")
+        note_stats = get_note_stats(request.user)
+        notes_by_day = list(get_daily_stats(request.user).values("day", "created"))
+        return self.render_dashboard(request, note_stats, notes_by_day)
+
+    def render_dashboard(self, request, note_stats, notes_by_day):
+        # Convert buckets into JSON-safe format
+        notes_by_day_json = json.dumps(
+            [{"day": row["day"], "total": row["created"]} for row in notes_by_day],
+            cls=DjangoJSONEncoder,
         )
-        
-        # Convert queryset into JSON-safe format
-        notes_by_day_json = json.dumps(list(notes_by_day), cls=DjangoJSONEncoder)
+
+        week_ago = timezone.localdate() - timedelta(days=7)
 
         stats = {
-            "total_notes": notes_qs.count(),
-            "favourite_notes": notes_qs.filter(is_favourite=True).count(),
-            "recent_notes": notes_qs.filter(updated_at__gte=timezone.now() - timedelta(days=7)).count(),
-            "last_updated": notes_qs.first(),
+            "total_notes": note_stats.total_notes,
+            "favourite_notes": note_stats.favourite_notes,
+            "recent_notes": sum(row["created"] for row in notes_by_day if row["day"] > week_ago),
+            "last_updated": note_stats.last_updated,
         }
 
         return render(
@@ -0,0 +1,124 @@
+"""
+Async implementations of the note views.
+
+``note/urls.py`` serves these instead of the classes of the same name in
+``views`` when ``NOTE_ASYNC_VIEWS`` is on. They subclass the sync views and
+only replace the handlers: queries go through the async ORM, and responses
+are built by the same methods, so both render identical pages.
+
+Bulk actions, export, import and revision history stay synchronous; they
+run long transactions, stream files or replay diffs, and are re-exported
+from ``views``, as is the event stream, which is async in both.
+"""
+from asgiref.sync import sync_to_async
+
+from django.shortcuts import render, aget_object_or_404
+from django.utils.decorators import method_decorator
+
+from accounts.mixins import AsyncLoginRequiredMixin
+
+from . import views
+from .models import Note
+from .forms import NoteForm
+from .cache import NoteSearch
+from .search import add_compressed_excerpts, parse_terms, with_excerpts
+from .conditional import aconditional_notes
+from .views import (
+    NoteBulkActionView, NoteEventStreamView, NoteExportView, NoteHistoryView, NoteImportView,
+    NoteRestoreView,
+)
+
+
+class NoteListView(AsyncLoginRequiredMixin, views.NoteListView):
+
+    @method_decorator(aconditional_notes())
+    async def get(self, request):
+        notes = await self.apaginate(request, Note.objects.filter(owner=request.user).for_cards())
+        return self.render_notes(request, notes)
+
+
+class NoteDetailView(AsyncLoginRequiredMixin, views.NoteDetailView):
+
+    async def get(self, request, pk):
+        note = await aget_object_or_404(Note, pk=pk, owner=request.user)
+        return render(request, "note/note_detail.html", {"note": note})
+
+
+class NoteCreateView(AsyncLoginRequiredMixin, views.NoteCreateView):
+
+    async def post(self, request):
+        form = NoteForm(request.POST)
+
+        if form.is_valid():
+            note = form.save(commit=False)
+            note.owner = request.user
+            await note.asave()
+
+            is_first_note = not await (
+                Note.objects.filter(owner=request.user).exclude(pk=note.pk).aexists()
+            )
+            return self.created_response(request, note, is_first_note)
+
+        return self.invalid_response(request, form)
+
+
+class NoteUpdateView(AsyncLoginRequiredMixin, views.NoteUpdateView):
+
+    async def get(self, request, pk):
+        note = await aget_object_or_404(Note, pk=pk, owner=request.user)
+        return self.form_response(request, note)
+
+    async def post(self, request, pk):
+        note = await aget_object_or_404(Note, pk=pk, owner=request.user)
+        form = NoteForm(request.POST, instance=note)
+
+        if form.is_valid():
+            # NoteForm has no many-to-many fields to save after the instance.
+            note = form.save(commit=False)
+            await note.asave()
+            return self.updated_response(request, note)
+
+        return self.invalid_response(request, form, note)
+
+
+class NoteDeleteView(AsyncLoginRequiredMixin, views.NoteDeleteView):
+
+    async def post(self, request, pk):
+        note = await aget_object_or_404(Note, pk=pk, owner=request.user)
+        note_id = note.id
+        await note.adelete()
+        has_notes = await Note.objects.filter(owner=request.user).aexists()
+        return self.deleted_response(request, note_id, has_notes)
+
+
+class FavouriteNoteListView(AsyncLoginRequiredMixin, views.FavouriteNoteListView):
+
+    @method_decorator(aconditional_notes())
+    async def get(self, request, is_favourite):
+        notes = await self.apaginate(request, self.get_queryset(request, is_favourite))
+        return self.render_notes(request, notes)
+
+
+class NoteFavoriteToggleView(AsyncLoginRequiredMixin, views.NoteFavoriteToggleView):
+
+    async def post(self, request, pk):
+        notes = await Note.objects.filter(pk=pk, owner=request.user).atoggle("is_favourite")
+        return self.toggled_response(request, notes)
+
+
+class NoteSearchView(AsyncLoginRequiredMixin, views.NoteSearchView):
+
+    async def get(self, request, *args, **kwargs):
+        query = request.GET.get("search", "")
+        all_notes = Note.objects.filter(owner=request.user).for_cards()
+        cache_status = None
+
+        if query:
+            search = NoteSearch(request.user, query)
+            notes = await self.apaginate(request, with_excerpts(all_notes, parse_terms(query)), params={"search": query}, search=search)
+            await sync_to_async(add_compressed_excerpts)(notes, parse_terms(query))
+            cache_status = search.cache_status
+        else:
+            notes = await self.apaginate(request, all_notes)
+
+        return self.render_results(request, query, notes, cache_status)
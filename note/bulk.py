@@ -0,0 +1,70 @@
+from django.db import router, transaction
+
+from . import events, stats
+from .models import Note, NoteRevision, NoteStats
+from .search import get_search_backend
+from .cache import get_fragment_cache, get_search_cache, note_item_cache_key
+
+
+def bulk_delete(owner, note_ids):
+    """
+    Delete ``owner``'s notes among ``note_ids`` with a single ``DELETE``.
+
+    ``QuerySet.delete()`` would send ``post_delete`` for every row, so the
+    deletion collector is skipped: the fields the index, rollup and cache
+    updates need are read in one query, the rows that reference the notes
+    are handled here, and each side effect then runs once for the batch.
+    Returns the ids that were actually deleted.
+    """
+    using = router.db_for_write(Note)
+
+    with transaction.atomic(using=using):
+        notes = list(
+            Note.objects.using(using)
+            .filter(owner=owner, pk__in=note_ids)
+            .select_for_update()
+            .only("id", "owner_id", "is_favourite", "created_at", "updated_at")
+        )
+        deleted_ids = [note.pk for note in notes]
+        if not deleted_ids:
+            return []
+
+        # What on_delete would do for the models referencing Note.
+        NoteRevision.objects.using(using).filter(note_id__in=deleted_ids)._raw_delete(using)
+        NoteStats.objects.using(using).filter(last_updated_id__in=deleted_ids).update(
+            last_updated=None, last_updated_at=None,
+        )
+        Note.objects.using(using).filter(pk__in=deleted_ids)._raw_delete(using)
+
+        get_search_backend(using).remove_many(notes)
+        stats.notes_deleted(owner.pk, notes)
+        events.publish_note_event(owner.pk, events.DELETED, deleted_ids, using=using)
+
+    get_fragment_cache().delete_many([note_item_cache_key(note) for note in notes])
+    get_search_cache().invalidate(owner.pk)
+    return deleted_ids
+
+
+def bulk_set_favourite(owner, note_ids, is_favourite):
+    """
+    Set ``is_favourite`` on ``owner``'s notes among ``note_ids`` with a single
+    ``UPDATE``.
+
+    Like the single toggle, ``updated_at`` is left alone, and only the notes
+    whose flag changed are announced. Returns the notes as they are after
+    the update.
+    """
+    using = router.db_for_write(Note)
+    notes = Note.objects.using(using).filter(owner=owner, pk__in=note_ids)
+
+    with transaction.atomic(using=using):
+        changed = notes.exclude(is_favourite=is_favourite).update_returning(is_favourite=is_favourite)
+        stats.favourites_changed(owner.pk, len(changed) if is_favourite else -len(changed))
+        notes = list(notes.order_by("-updated_at", "-id"))
+        if changed:
+            events.publish_note_event(owner.pk, events.UPDATED, [note.pk for note in changed], using=using)
+
+    if changed:
+        # The cards are keyed on is_favourite; only the searches went stale.
+        get_search_cache().invalidate(owner.pk)
+    return notes
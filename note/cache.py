@@ -0,0 +1,339 @@
+import bisect
+import threading
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.safestring import mark_safe
+from django.template.loader import render_to_string
+from django.contrib.humanize.templatetags.humanize import naturaltime
+
+from .models import Note, NoteStats
+from .search import fold_term, get_search_backend, parse_terms
+
+
+NOTE_ITEM_TEMPLATE = "note/partials/note_item.html"
+
+# Request- and time-dependent values are rendered as these markers, cached,
+# and swapped for the real values on every lookup.
+CSRF_TOKEN_MARKER = "__note_item_csrf_token__"
+UPDATED_AT_MARKER = "__note_item_updated_at__"
+
+
+def get_fragment_cache():
+    return caches[getattr(settings, "NOTE_FRAGMENT_CACHE", "default")]
+
+
+def _note_item_key(note_id, updated_at, is_favourite):
+    # Favourite toggles leave updated_at alone, so the flag is part of the key.
+    return f"note-item:v4:{note_id.hex}:{updated_at.timestamp()}:{int(is_favourite)}"
+
+
+def note_item_cache_key(note):
+    return _note_item_key(note.pk, note.updated_at, note.is_favourite)
+
+
+def invalidate_note_item(note):
+    """
+    Free the card cached for ``note`` as it was last read or saved.
+
+    A write moves the note to a new key, so this is not needed for the card
+    to be fresh; it evicts the entry nothing can hit any more.
+    """
+    updated_at = getattr(note, "_stored_updated_at", None)
+    is_favourite = getattr(note, "_stored_is_favourite", None)
+    if updated_at is not None and is_favourite is not None:
+        get_fragment_cache().delete(_note_item_key(note.pk, updated_at, is_favourite))
+
+
+def render_note_item(note, csrf_token=""):
+    """
+    Render a note card, reusing the cached HTML while the note is unchanged.
+    """
+    cache = get_fragment_cache()
+    key = note_item_cache_key(note)
+
+    html = cache.get(key)
+    if html is None:
+        html = render_to_string(
+            NOTE_ITEM_TEMPLATE,
+            {
+                "note": note,
+                "csrf_token": CSRF_TOKEN_MARKER,
+                "updated_at_display": UPDATED_AT_MARKER,
+            },
+        )
+        cache.set(key, html, getattr(settings, "NOTE_FRAGMENT_CACHE_TIMEOUT", 60 * 60 * 24))
+
+    return mark_safe(
+        html
+        .replace(CSRF_TOKEN_MARKER, str(csrf_token))
+        .replace(UPDATED_AT_MARKER, str(naturaltime(note.updated_at)))
+    )
+
+
+class SearchResultCache:
+    """
+    In-process LRU of search hits per user, keyed by the normalized terms.
+
+    A query whose terms extend a cached query's terms (``meet`` ->
+    ``meeting``) can only match a subset of the cached hits. Filtering
+    them against their stored word tokens leaves the candidates in memory;
+    the backend still ranks those for the new terms, in one query narrowed
+    to their ids. Terms and tokens are compared without diacritics, as the
+    full-text index compares them, so the filter never drops a candidate
+    the backend would match.
+
+    Entries are tagged with the user's generation, read from their
+    NoteStats rollup, which every note write moves. A write made in any
+    process therefore retires the entries cached in all of them.
+    """
+
+    def __init__(self, max_users=None, max_entries=None, max_hits=None):
+        self.max_users = max_users or getattr(settings, "NOTE_SEARCH_CACHE_USERS", 256)
+        self.max_entries = max_entries or getattr(settings, "NOTE_SEARCH_CACHE_ENTRIES", 16)
+        # Larger results are not cached; their pages go to the backend.
+        self.max_hits = max_hits or getattr(settings, "NOTE_SEARCH_CACHE_MAX_HITS", 500)
+
+        self._users = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.refinements = 0
+        self.misses = 0
+
+    def generation(self, owner_id):
+        """
+        The state of ``owner_id``'s notes, or ``None`` while they have no
+        rollup (and their results cannot be cached).
+        """
+        return (
+            NoteStats.objects
+            .filter(owner_id=owner_id)
+            .values_list("modified_at", "total_notes", "deleted_notes")
+            .first()
+        )
+
+    def invalidate(self, owner_id):
+        """
+        Free ``owner_id``'s entries in this process now; other processes
+        drop theirs when they see the new generation.
+        """
+        with self._lock:
+            self._users.pop(owner_id, None)
+
+    @staticmethod
+    def extends(terms, cached_terms):
+        """
+        True when every cached term is a prefix of one of ``terms``.
+        """
+        terms = [fold_term(term) for term in terms]
+        return all(
+            any(term.startswith(fold_term(cached)) for term in terms)
+            for cached in cached_terms
+        )
+
+    @staticmethod
+    def matches(tokens, terms):
+        """
+        True when every one of ``terms`` is a prefix of one of the (folded)
+        ``tokens``.
+        """
+        return all(
+            any(token.startswith(fold_term(term)) for token in tokens)
+            for term in terms
+        )
+
+    def lookup(self, owner_id, terms, generation):
+        """
+        Return ``(rows, status)``; ``rows`` is ``None`` on a miss.
+
+        On a hit ``rows`` are the cached ``(note_id, score)`` hits. On a
+        refinement they are the ``(note_id, score, tokens)`` rows of a
+        broader query that can still match, which need ranking again.
+        """
+        key = tuple(terms)
+
+        with self._lock:
+            entries = self._users.get(owner_id)
+            if generation is None or entries is None or entries.generation != generation:
+                self._users.pop(owner_id, None)
+                self.misses += 1
+                return None, "miss"
+
+            self._users.move_to_end(owner_id)
+
+            if key in entries:
+                entries.move_to_end(key)
+                self.hits += 1
+                return [(note_id, score) for note_id, score, tokens in entries[key]], "hit"
+
+            # Refine the narrowest cached superset: the one with fewest hits.
+            candidates = [
+                cached for cached_key, cached in entries.items()
+                if self.extends(key, cached_key)
+            ]
+            if candidates:
+                base = min(candidates, key=len)
+                self.refinements += 1
+                return [row for row in base if self.matches(row[2], key)], "refine"
+
+            self.misses += 1
+            return None, "miss"
+
+    def store(self, owner_id, terms, generation, hits, tokens):
+        """
+        Cache ``hits``; ``tokens`` maps note ids to their searchable words.
+
+        ``generation`` must be read before the search ran, so results that
+        raced with a write are stored under the already-stale generation.
+        """
+        if generation is None:
+            return
+
+        rows = sorted(
+            (
+                (note_id, score, tokens[note_id])
+                for note_id, score in hits
+                if note_id in tokens
+            ),
+            key=rank_key,
+        )
+
+        with self._lock:
+            entries = self._users.get(owner_id)
+            if entries is None or entries.generation != generation:
+                entries = _UserEntries(generation)
+                self._users[owner_id] = entries
+            self._users.move_to_end(owner_id)
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+            self._store(entries, tuple(terms), rows)
+
+    def _store(self, entries, key, rows):
+        entries[key] = rows
+        entries.move_to_end(key)
+        while len(entries) > self.max_entries:
+            entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "refinements": self.refinements,
+                "misses": self.misses,
+                "users": len(self._users),
+                "entries": sum(len(entries) for entries in self._users.values()),
+            }
+
+
+class _UserEntries(OrderedDict):
+
+    def __init__(self, generation):
+        super().__init__()
+        self.generation = generation
+
+
+_search_cache = None
+
+
+def get_search_cache():
+    global _search_cache
+    if _search_cache is None:
+        _search_cache = SearchResultCache()
+    return _search_cache
+
+
+def rank_key(hit):
+    """
+    Sort key putting hits best match first, ties broken on the note id.
+    """
+    return (-hit[1], hit[0].hex)
+
+
+def page_hits(hits, after=None, limit=None):
+    """
+    The ``limit`` hits of the ranked ``hits`` that come after ``after``.
+    """
+    start = 0
+    if after is not None:
+        score, note_id = after
+        start = bisect.bisect_right(hits, (-score, note_id.hex), key=rank_key)
+    return hits[start:] if limit is None else hits[start:start + limit]
+
+
+def search_notes(owner, query, after=None, limit=None):
+    """
+    Return ranked ``(note_id, score)`` hits for ``query`` and the cache status.
+
+    ``after`` and ``limit`` select one page, as for ``BaseSearchBackend.search``.
+    Results of up to ``NOTE_SEARCH_CACHE_MAX_HITS`` hits are cached and paged
+    in memory; pages of larger ones are ranked by the backend each time.
+    A refinement is not answered from memory alone: the cached hits only
+    narrow the backend query to the notes that can still match.
+    """
+    terms = parse_terms(query)
+    if not terms:
+        return [], "miss"
+
+    cache = get_search_cache()
+    generation = cache.generation(owner.pk)
+    rows, status = cache.lookup(owner.pk, terms, generation)
+    if status == "hit":
+        return page_hits(rows, after, limit), status
+
+    backend = get_search_backend()
+    if status == "refine":
+        tokens = {note_id: note_tokens for note_id, score, note_tokens in rows}
+        hits = backend.search(owner, query, note_ids=list(tokens)) if tokens else []
+        cache.store(owner.pk, terms, generation, hits, tokens)
+        return page_hits(hits, after, limit), status
+
+    if after is not None:
+        return backend.search(owner, query, limit=limit, after=after), status
+
+    # One hit past the cache limit tells whether the whole result fits.
+    hits = backend.search(owner, query, limit=cache.max_hits + 1)
+    if len(hits) > cache.max_hits:
+        if limit is None or limit > len(hits):
+            hits = backend.search(owner, query, limit=limit)
+        return page_hits(hits, None, limit), status
+
+    tokens = {
+        note_id: frozenset(map(fold_term, parse_terms(f"{title} {description}")))
+        for note_id, title, description in Note.objects.filter(
+            owner=owner, pk__in=[note_id for note_id, score in hits]
+        ).values_list("id", "title", "description")
+    }
+    cache.store(owner.pk, terms, generation, hits, tokens)
+    return page_hits(hits, None, limit), status
+
+
+async def asearch_notes(owner, query, after=None, limit=None):
+    """
+    Async ``search_notes``. The search backends query through raw cursors,
+    which have no async API, so the lookup runs on a worker thread.
+    """
+    return await sync_to_async(search_notes)(owner, query, after, limit)
+
+
+class NoteSearch:
+    """
+    The pages of ``owner``'s notes matching ``query``, for ``RankedPaginator``.
+
+    ``cache_status`` tells how the search cache answered the last page.
+    """
+
+    def __init__(self, owner, query):
+        self.owner = owner
+        self.query = query
+        self.cache_status = None
+
+    def hits(self, after=None, limit=None):
+        hits, self.cache_status = search_notes(self.owner, self.query, after, limit)
+        return hits
+
+    async def ahits(self, after=None, limit=None):
+        hits, self.cache_status = await asearch_notes(self.owner, self.query, after, limit)
+        return hits
@@ -0,0 +1,127 @@
+import hashlib
+from functools import wraps
+
+from django.utils import timezone
+from django.views.decorators.http import condition
+from django.views.decorators.vary import vary_on_headers
+from django.views.decorators.cache import cache_control
+
+from .models import NoteStats
+
+
+def get_note_validators(request):
+    """
+    Return the validator fields of the user's NoteStats row, once per request.
+
+    ``last_updated_at`` is the max ``Note.updated_at``; ``deleted_notes`` and
+    ``modified_at`` also move on deletes and on toggles that leave
+    ``updated_at`` alone.
+    """
+    if not hasattr(request, "_note_validators"):
+        request._note_validators = (
+            NoteStats.objects
+            .filter(owner=request.user)
+            .values("last_updated_at", "modified_at", "deleted_notes")
+            .first()
+        )
+    return request._note_validators
+
+
+async def aget_note_validators(request):
+    """
+    Async ``get_note_validators``, caching on the request the same way.
+    """
+    if not hasattr(request, "_note_validators"):
+        request._note_validators = await (
+            NoteStats.objects
+            .filter(owner=request.user)
+            .values("last_updated_at", "modified_at", "deleted_notes")
+            .afirst()
+        )
+    return request._note_validators
+
+
+def prefetch_note_validators(view):
+    """
+    Load the validators of an async view before ``condition`` asks for them.
+
+    ``condition`` calls the ETag and Last-Modified functions synchronously,
+    which must not query from the event loop; they find them cached instead.
+    """
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        await aget_note_validators(request)
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+def user_version(user):
+    """
+    The user fields rendered in the page chrome (navbar name and avatar).
+    """
+    return (user.email, user.first_name, user.last_name, user.avatar.name)
+
+
+def _etag(request, *parts):
+    validators = get_note_validators(request)
+    if validators is None:
+        # No rollup yet; let the view render (and build it).
+        return None
+
+    key = ":".join(
+        str(part) for part in (
+            request.user.pk,
+            *user_version(request.user),
+            validators["last_updated_at"],
+            validators["modified_at"],
+            validators["deleted_notes"],
+            # Full page and HTMX partial are different representations.
+            request.headers.get("HX-Request", ""),
+            request.get_full_path(),
+            # Cached pages embed CSRF tokens derived from this secret.
+            request.META.get("CSRF_COOKIE", ""),
+            *parts,
+        )
+    )
+    return hashlib.md5(key.encode(), usedforsecurity=False).hexdigest()
+
+
+def notes_etag(request, *args, **kwargs):
+    return _etag(request)
+
+
+def dashboard_etag(request, *args, **kwargs):
+    # "Recent notes" is a sliding window, so the page also changes at midnight.
+    return _etag(request, timezone.localdate())
+
+
+def notes_last_modified(request, *args, **kwargs):
+    # Full pages also render the user's chrome, which has no timestamp to go
+    # by; only the ETag validates them.
+    if not request.headers.get("HX-Request"):
+        return None
+    validators = get_note_validators(request)
+    if validators is None:
+        return None
+    stamps = [validators["last_updated_at"], validators["modified_at"]]
+    return max((stamp for stamp in stamps if stamp), default=None)
+
+
+def conditional_notes(etag_func=notes_etag, last_modified_func=notes_last_modified):
+    """
+    Decorators answering ``304 Not Modified`` before a note page is rendered.
+
+    For use with ``method_decorator`` on a view's ``get``.
+    """
+    return [
+        vary_on_headers("HX-Request"),
+        cache_control(private=True, no_cache=True),
+        condition(etag_func=etag_func, last_modified_func=last_modified_func),
+    ]
+
+
+def aconditional_notes(etag_func=notes_etag, last_modified_func=notes_last_modified):
+    """
+    ``conditional_notes`` for views whose ``get`` is a coroutine.
+    """
+    return [prefetch_note_validators, *conditional_notes(etag_func, last_modified_func)]
@@ -0,0 +1,155 @@
+"""
+Live note change events.
+
+Note writes publish ``created``, ``updated`` and ``deleted`` events on their
+owner's channel once the transaction commits, and ``NoteEventStreamView``
+relays them to the owner's open pages as Server-Sent Events.
+
+The broker is pluggable through ``NOTE_EVENTS_BROKER``. The default
+``InProcessBroker`` only reaches streams served by the same process; with
+several ASGI workers, a broker shared between them (Redis pub/sub, PostgreSQL
+``LISTEN``/``NOTIFY``) implements the same two methods.
+"""
+import asyncio
+import logging
+import threading
+from collections import namedtuple
+from contextlib import asynccontextmanager
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+
+logger = logging.getLogger(__name__)
+
+CREATED, UPDATED, DELETED = "created", "updated", "deleted"
+
+NoteEvent = namedtuple("NoteEvent", ["type", "note_ids"])
+
+
+def note_channel(owner_id):
+    return f"notes:{owner_id}"
+
+
+class Subscription:
+    """
+    One stream's queue of events, bound to the event loop serving it.
+
+    ``get()`` returns ``None`` once events have been dropped because the
+    stream fell too far behind; the stream should then tell the page to
+    reload instead of applying what is left.
+    """
+
+    def __init__(self, maxsize):
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize)
+        self.overflowed = False
+
+    def put(self, event):
+        # Always called on self.loop.
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    async def get(self):
+        if self.overflowed:
+            return None
+        event = await self.queue.get()
+        return None if self.overflowed else event
+
+
+class BaseBroker:
+    """
+    Interface for the pub/sub behind the note event stream.
+
+    ``publish()`` is called from ordinary request threads and must not block;
+    ``subscribe()`` is an async context manager used by the event stream, and
+    yields an object with an awaitable ``get()``.
+    """
+
+    def publish(self, channel, event):
+        raise NotImplementedError
+
+    def subscribe(self, channel):
+        raise NotImplementedError
+
+
+class InProcessBroker(BaseBroker):
+    """
+    Fan events out to the subscriptions of this process.
+
+    Each subscription gets a bounded queue on its own event loop, so a stream
+    waiting for events holds no thread, and a stalled one cannot make
+    publishers wait or grow without limit.
+    """
+
+    def __init__(self, max_queued=None):
+        if max_queued is None:
+            max_queued = getattr(settings, "NOTE_EVENTS_MAX_QUEUED", 100)
+        self.max_queued = max_queued
+        self._channels = {}
+        self._lock = threading.Lock()
+
+    def publish(self, channel, event):
+        with self._lock:
+            subscriptions = list(self._channels.get(channel, ()))
+
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.put, event)
+            except RuntimeError:
+                # The loop closed before the stream unsubscribed.
+                self._unsubscribe(channel, subscription)
+
+    @asynccontextmanager
+    async def subscribe(self, channel):
+        subscription = Subscription(self.max_queued)
+        with self._lock:
+            self._channels.setdefault(channel, set()).add(subscription)
+        try:
+            yield subscription
+        finally:
+            self._unsubscribe(channel, subscription)
+
+    def _unsubscribe(self, channel, subscription):
+        with self._lock:
+            subscriptions = self._channels.get(channel)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._channels[channel]
+
+
+_brokers = {}
+
+
+def get_broker():
+    """
+    Return the broker named by ``settings.NOTE_EVENTS_BROKER``.
+    """
+    if "default" not in _brokers:
+        broker_path = getattr(settings, "NOTE_EVENTS_BROKER", "note.events.InProcessBroker")
+        _brokers["default"] = import_string(broker_path)()
+    return _brokers["default"]
+
+
+def publish_note_event(owner_id, event_type, note_ids, using=None):
+    """
+    Publish one event covering ``note_ids`` once the current transaction
+    commits, so streams never render a write that was rolled back.
+    """
+    event = NoteEvent(event_type, [str(note_id) for note_id in note_ids])
+    channel = note_channel(owner_id)
+
+    def publish():
+        try:
+            get_broker().publish(channel, event)
+        except Exception:
+            # A lost live update must not fail the write that caused it.
+            logger.exception("Could not publish %s on %s.", event, channel)
+
+    transaction.on_commit(publish, using=using)
@@ -0,0 +1,175 @@
+import io
+import csv
+import json
+import zipfile
+from datetime import datetime
+
+from django.conf import settings
+from django.utils.text import slugify
+
+from .models import Note
+
+
+EXPORT_FIELDS = ("id", "title", "description", "is_favourite", "created_at", "updated_at")
+
+
+def get_chunk_size():
+    return getattr(settings, "NOTE_EXPORT_CHUNK_SIZE", 2000)
+
+
+def serialize(row):
+    """
+    Turn a ``values()`` row into plain JSON/CSV-friendly values.
+    """
+    return {
+        "id": str(row["id"]),
+        "title": row["title"],
+        # str() decompresses long descriptions.
+        "description": str(row["description"]),
+        "is_favourite": row["is_favourite"],
+        "created_at": row["created_at"].isoformat(),
+        "updated_at": row["updated_at"].isoformat(),
+    }
+
+
+class BaseExporter:
+    """
+    Stream one user's notes in an export format.
+
+    Iterating an exporter yields ``bytes`` chunks of roughly ``buffer_size``.
+    Rows are read with a server-side iterator, so memory stays flat however
+    many notes the user has.
+    """
+    content_type = "application/octet-stream"
+    extension = "bin"
+    buffer_size = 64 * 1024
+
+    def __init__(self, queryset, chunk_size=None):
+        self.queryset = queryset
+        self.chunk_size = chunk_size or get_chunk_size()
+
+    @classmethod
+    def for_owner(cls, owner, **kwargs):
+        return cls(Note.objects.filter(owner=owner), **kwargs)
+
+    def rows(self):
+        queryset = self.queryset.order_by("-updated_at", "-id").values(*EXPORT_FIELDS)
+        for row in queryset.iterator(chunk_size=self.chunk_size):
+            yield serialize(row)
+
+    def chunks(self):
+        raise NotImplementedError
+
+    def __iter__(self):
+        # Coalesce per-row output so the server is not handed tiny writes.
+        buffer = bytearray()
+        for chunk in self.chunks():
+            buffer += chunk
+            if len(buffer) >= self.buffer_size:
+                yield bytes(buffer)
+                buffer.clear()
+        if buffer:
+            yield bytes(buffer)
+
+
+class NDJSONExporter(BaseExporter):
+    content_type = "application/x-ndjson"
+    extension = "ndjson"
+
+    def chunks(self):
+        for row in self.rows():
+            yield json.dumps(row, ensure_ascii=False).encode() + b"\n"
+
+
+class _Echo:
+    """
+    File-like object whose ``write`` hands the value back, for ``csv.writer``.
+    """
+
+    def write(self, value):
+        return value
+
+
+class CSVExporter(BaseExporter):
+    content_type = "text/csv"
+    extension = "csv"
+
+    def chunks(self):
+        writer = csv.writer(_Echo())
+        yield writer.writerow(EXPORT_FIELDS).encode()
+        for row in self.rows():
+            yield writer.writerow([row[field] for field in EXPORT_FIELDS]).encode()
+
+
+class _ZipStream(io.RawIOBase):
+    """
+    Unseekable sink that collects what ``zipfile`` writes until drained.
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+class MarkdownZipExporter(BaseExporter):
+    """
+    One Markdown file per note, zipped on the fly.
+
+    The front matter holds the remaining fields as JSON values, so an export
+    can be imported again without loss.
+    """
+    content_type = "application/zip"
+    extension = "zip"
+
+    @staticmethod
+    def filename(row):
+        slug = slugify(row["title"])[:50] or "note"
+        return f"{slug}-{row['id']}.md"
+
+    @staticmethod
+    def render(row):
+        front_matter = "\n".join(
+            f"{field}: {json.dumps(row[field], ensure_ascii=False)}"
+            for field in EXPORT_FIELDS
+            if field != "description"
+        )
+        return f"---\n{front_matter}\n---\n\n{row['description']}\n"
+
+    def chunks(self):
+        stream = _ZipStream()
+        # An unseekable target makes zipfile write data descriptors, so each
+        # member can be sent as soon as it is written.
+        with zipfile.ZipFile(stream, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+            for row in self.rows():
+                updated_at = datetime.fromisoformat(row["updated_at"])
+                info = zipfile.ZipInfo(self.filename(row), date_time=updated_at.timetuple()[:6])
+                info.compress_type = zipfile.ZIP_DEFLATED
+                with archive.open(info, "w") as member:
+                    member.write(self.render(row).encode())
+                yield stream.drain()
+        yield stream.drain()
+
+
+EXPORTERS = {
+    "ndjson": NDJSONExporter,
+    "csv": CSVExporter,
+    "markdown": MarkdownZipExporter,
+}
+
+
+def get_exporter(name):
+    """
+    Return the exporter class for ``name``; raises ``KeyError`` if unknown.
+    """
+    return EXPORTERS[name]
@@ -0,0 +1,168 @@
+"""
+A text field that stores long values compressed.
+
+Values of at least ``NOTE_COMPRESSION_MIN_LENGTH`` characters are compressed
+with zstd when the ``zstandard`` package is installed, and with zlib
+otherwise, and stored base64-encoded after a format marker. The column stays
+a text column, so short values, the ones SQL functions and ``LIKE`` lookups
+still see, are stored as they are.
+
+A loaded value is decompressed when the attribute is first read, so rows
+whose body is never looked at never pay for it. ``values()`` and
+``values_list()`` return a ``CompressedText`` for compressed values; ``str()``
+decompresses it.
+"""
+import base64
+import zlib
+
+from django.conf import settings
+from django.db import models
+from django.db.models.query_utils import DeferredAttribute
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+# Starts every stored value that is not plain text; the next character names
+# its format. Plain text that happens to start with it is stored as PLAIN.
+MARKER = "\x01"
+
+PLAIN = "p"
+ZLIB = "z"
+ZSTD = "s"
+
+CODECS = {
+    ZLIB: "zlib",
+    ZSTD: "zstd",
+}
+
+
+def get_codec():
+    """
+    The format new values are compressed with: ``NOTE_COMPRESSION_CODEC``,
+    or zstd when available and zlib otherwise.
+    """
+    name = getattr(settings, "NOTE_COMPRESSION_CODEC", None)
+    if name is None:
+        return ZSTD if zstandard is not None else ZLIB
+    for codec, codec_name in CODECS.items():
+        if codec_name == name:
+            if codec == ZSTD and zstandard is None:
+                raise ValueError("NOTE_COMPRESSION_CODEC is 'zstd' but zstandard is not installed.")
+            return codec
+    raise ValueError(f"Unknown NOTE_COMPRESSION_CODEC {name!r}; expected one of {sorted(CODECS.values())}.")
+
+
+def compress(value, min_length=None, codec=None):
+    """
+    The stored form of ``value``: compressed if it is long enough and
+    compression makes it shorter, otherwise ``value`` itself.
+    """
+    if min_length is None:
+        min_length = getattr(settings, "NOTE_COMPRESSION_MIN_LENGTH", 2048)
+
+    if len(value) >= min_length:
+        codec = codec or get_codec()
+        data = value.encode()
+        if codec == ZSTD:
+            data = zstandard.ZstdCompressor().compress(data)
+        else:
+            data = zlib.compress(data)
+        stored = MARKER + codec + base64.b64encode(data).decode("ascii")
+        if len(stored) < len(value):
+            return stored
+
+    if value.startswith(MARKER):
+        return MARKER + PLAIN + value
+    return value
+
+
+def decompress(stored):
+    """
+    The text stored as ``stored`` by ``compress()``.
+    """
+    if not stored.startswith(MARKER):
+        return stored
+
+    codec, payload = stored[1:2], stored[2:]
+    if codec == PLAIN:
+        return payload
+    data = base64.b64decode(payload)
+    if codec == ZLIB:
+        return zlib.decompress(data).decode()
+    if codec == ZSTD:
+        if zstandard is None:
+            raise ValueError("Value is zstd-compressed but zstandard is not installed.")
+        return zstandard.ZstdDecompressor().decompress(data).decode()
+    raise ValueError(f"Unknown compressed text format {codec!r}.")
+
+
+class CompressedText:
+    """
+    A stored value that has not been decompressed yet.
+    """
+    __slots__ = ("stored",)
+
+    def __init__(self, stored):
+        self.stored = stored
+
+    def __str__(self):
+        return decompress(self.stored)
+
+    def __repr__(self):
+        return f"<CompressedText: {CODECS.get(self.stored[1:2], 'plain')}, {len(self.stored)} chars>"
+
+
+class CompressedTextDescriptor(DeferredAttribute):
+    """
+    Decompress the loaded value on first access and keep the result.
+    """
+
+    def __get__(self, instance, cls=None):
+        if instance is None:
+            return self
+        value = super().__get__(instance, cls)
+        if isinstance(value, CompressedText):
+            value = instance.__dict__[self.field.attname] = str(value)
+        return value
+
+    def __set__(self, instance, value):
+        # Being a data descriptor puts __get__ before the instance __dict__.
+        instance.__dict__[self.field.attname] = value
+
+
+class CompressedTextField(models.TextField):
+    """
+    ``TextField`` storing long values compressed; see the module docstring.
+
+    Lookups compare against the stored text, so they only match values
+    short enough to be stored as they are.
+    """
+    descriptor_class = CompressedTextDescriptor
+
+    def from_db_value(self, value, expression, connection):
+        if value is not None and value.startswith(MARKER):
+            return CompressedText(value)
+        return value
+
+    def to_python(self, value):
+        if isinstance(value, CompressedText):
+            return str(value)
+        return super().to_python(value)
+
+    def pre_save(self, model_instance, add):
+        # A value never read is still compressed; write it back as it is.
+        value = model_instance.__dict__.get(self.attname)
+        if isinstance(value, CompressedText):
+            return value
+        return super().pre_save(model_instance, add)
+
+    def get_db_prep_save(self, value, connection):
+        if isinstance(value, CompressedText):
+            return value.stored
+        value = super().get_db_prep_save(value, connection)
+        if value is None or hasattr(value, "as_sql"):
+            return value
+        return compress(value)
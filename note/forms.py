@@ -1,4 +1,8 @@
+import uuid
+
 from django import forms
+from django.conf import settings
+from django.core.exceptions import ValidationError
 from django.utils.translation import gettext_lazy as _
 
 from .models import Note
@@ -35,4 +39,89 @@ class NoteForm(forms.ModelForm):
                 current_classes = field.widget.attrs.get("class", "")
                 new_classes = current_classes.replace("form-control", "form-control is-invalid")
                 field.widget.attrs["class"] = new_classes
-        
\ No newline at end of file
+        
+
+class MultipleUUIDField(forms.Field):
+    """
+    A list of UUIDs posted under one name, e.g. repeated checkbox values.
+    """
+    widget = forms.MultipleHiddenInput
+    default_error_messages = {
+        "invalid": _("Enter a list of valid note ids."),
+        "max_items": _("Select at most %(max)d notes at a time."),
+    }
+
+    def __init__(self, *, max_items=None, **kwargs):
+        self.max_items = max_items
+        super().__init__(**kwargs)
+
+    def to_python(self, value):
+        if not value:
+            return []
+        if not isinstance(value, (list, tuple)):
+            raise ValidationError(self.error_messages["invalid"], code="invalid")
+        try:
+            # Drop duplicates but keep the posted order.
+            return list(dict.fromkeys(uuid.UUID(str(item)) for item in value))
+        except ValueError:
+            raise ValidationError(self.error_messages["invalid"], code="invalid")
+
+    def validate(self, value):
+        super().validate(value)
+        if self.max_items and len(value) > self.max_items:
+            raise ValidationError(
+                self.error_messages["max_items"],
+                code="max_items",
+                params={"max": self.max_items},
+            )
+
+
+class NoteBulkActionForm(forms.Form):
+    DELETE = "delete"
+    FAVOURITE = "favourite"
+    UNFAVOURITE = "unfavourite"
+
+    ACTION_CHOICES = [
+        (DELETE, _("Delete")),
+        (FAVOURITE, _("Favourite")),
+        (UNFAVOURITE, _("Unfavourite")),
+    ]
+
+    action = forms.ChoiceField(choices=ACTION_CHOICES)
+    note_ids = MultipleUUIDField(
+        error_messages={"required": _("Select at least one note.")},
+    )
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields["note_ids"].max_items = getattr(settings, "NOTE_BULK_MAX_NOTES", 500)
+
+
+class NoteImportForm(forms.Form):
+    FORMAT_CHOICES = [
+        ("", _("Detect from file name")),
+        ("ndjson", _("NDJSON")),
+        ("csv", _("CSV")),
+        ("markdown", _("Markdown (.md or .zip)")),
+    ]
+
+    file = forms.FileField()
+    format = forms.ChoiceField(choices=FORMAT_CHOICES, required=False)
+    resume_from = forms.IntegerField(
+        min_value=0,
+        required=False,
+        help_text=_("Skip rows already imported by a failed run."),
+    )
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        self.fields["file"].widget.attrs.update({
+            "class": "form-control form-control-sm",
+            "accept": ".ndjson,.jsonl,.csv,.md,.zip",
+        })
+
+        self.fields["resume_from"].widget.attrs.update({
+            "class": "form-control form-control-sm mt-2",
+            "placeholder": _("Resume from row (optional)"),
+        })
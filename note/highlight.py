@@ -0,0 +1,115 @@
+import re
+
+from django.conf import settings
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+
+ELLIPSIS = "…"
+
+
+class Highlighter:
+    """
+    Mark search terms in note text and cut long bodies down to snippets.
+
+    The pattern for all terms is compiled once, so a search request builds
+    one ``Highlighter`` and reuses it for every hit it renders. Text outside
+    the matches is HTML-escaped; only the ``<mark>`` tags are trusted.
+    """
+
+    def __init__(self, terms, window=None, max_snippets=None):
+        self.window = window or getattr(settings, "NOTE_SEARCH_SNIPPET_CHARS", 80)
+        self.max_snippets = max_snippets or getattr(settings, "NOTE_SEARCH_MAX_SNIPPETS", 3)
+
+        # Longest first, so "meeting" wins over "meet" at the same position.
+        alternatives = sorted({re.escape(term) for term in terms if term}, key=len, reverse=True)
+        if alternatives:
+            # Terms match as word prefixes, like the full-text backends do.
+            self.pattern = re.compile(rf"\b(?:{'|'.join(alternatives)})\w*", re.IGNORECASE)
+        else:
+            self.pattern = None
+
+    def _render(self, text, start, end):
+        """
+        Escape ``text[start:end]`` with every match wrapped in ``<mark>``.
+        """
+        parts = []
+        position = start
+        for match in self.pattern.finditer(text, start, end):
+            parts.append(escape(text[position:match.start()]))
+            parts.append(f"<mark>{escape(match.group(0))}</mark>")
+            position = match.end()
+        parts.append(escape(text[position:end]))
+        return "".join(parts)
+
+    def highlight(self, text):
+        """
+        Return the whole of ``text`` with the matches marked.
+        """
+        if self.pattern is None:
+            return text
+        return mark_safe(self._render(text, 0, len(text)))
+
+    def _snap(self, text, index, backwards):
+        """
+        Move a window edge to the nearest whitespace so words stay whole.
+        """
+        if backwards:
+            space = text.rfind(" ", max(index - 15, 0), index)
+            return index if space == -1 else space + 1
+        space = text.find(" ", index, index + 15)
+        return index if space == -1 else space
+
+    def windows(self, text):
+        """
+        Return merged ``(start, end)`` context windows around the matches.
+        """
+        windows = []
+        for match in self.pattern.finditer(text):
+            start = max(match.start() - self.window, 0)
+            end = min(match.end() + self.window, len(text))
+
+            if windows and start <= windows[-1][1]:
+                windows[-1] = (windows[-1][0], end)
+                continue
+            if len(windows) == self.max_snippets:
+                break
+            windows.append((start, end))
+
+        return [
+            (
+                self._snap(text, start, backwards=True) if start else 0,
+                self._snap(text, end, backwards=False) if end < len(text) else end,
+            )
+            for start, end in windows
+        ]
+
+    def snippets(self, text, offset=0, length=None):
+        """
+        Return only the context windows around the matches in ``text``.
+
+        The output size depends on the number of matches and the window, not
+        on the length of ``text``. Text without matches yields its opening.
+        ``text`` may be an excerpt starting ``offset`` characters into a text
+        of ``length`` characters; the ellipses then mark what was cut off.
+        """
+        if length is None:
+            length = offset + len(text)
+
+        if self.pattern is None:
+            return text
+
+        windows = self.windows(text)
+        if not windows:
+            end = 2 * self.window
+            windows = [(0, self._snap(text, end, backwards=False) if end < len(text) else len(text))]
+
+        parts = []
+        for start, end in windows:
+            snippet = self._render(text, start, end)
+            if offset + start > 0:
+                snippet = ELLIPSIS + snippet
+            if offset + end < length:
+                snippet += ELLIPSIS
+            parts.append(snippet)
+        return mark_safe(" ".join(parts))
@@ -0,0 +1,245 @@
+import io
+import csv
+import json
+import zipfile
+from pathlib import PurePath
+
+from django.conf import settings
+from django.utils import timezone
+from django.db import DatabaseError, transaction
+
+from . import stats
+from .forms import NoteForm
+from .models import Note
+from .search import get_search_backend
+from .cache import get_search_cache
+
+
+IMPORT_FIELDS = ("title", "description", "is_favourite")
+
+
+class ImportFailed(Exception):
+    """
+    A batch could not be written; rows before ``report.resume_from`` are in.
+    """
+
+    def __init__(self, report, error):
+        self.report = report
+        self.error = error
+        super().__init__(f"Import stopped at row {report.resume_from}: {error}")
+
+
+class ImportReport:
+    """
+    Running totals of an import, handed to the progress callback per batch.
+
+    ``resume_from`` is the number of source rows whose fate is settled:
+    passing it back as ``start`` continues after the last committed batch.
+    """
+    max_errors = 100
+
+    def __init__(self, start=0):
+        self.resume_from = start
+        self.imported = 0
+        self.invalid = 0
+        self.errors = []
+
+    def add_error(self, row_number, messages):
+        self.invalid += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append((row_number, messages))
+
+    def as_dict(self):
+        return {
+            "resume_from": self.resume_from,
+            "imported": self.imported,
+            "invalid": self.invalid,
+            "errors": [
+                {"row": row_number, "messages": messages}
+                for row_number, messages in self.errors
+            ],
+        }
+
+
+def _text(stream):
+    return io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+
+
+def parse_ndjson(stream, name=None):
+    for line in _text(stream):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield {"__error__": f"Invalid JSON: {e.msg}."}
+            continue
+        yield row if isinstance(row, dict) else {"__error__": "Expected a JSON object."}
+
+
+def parse_csv(stream, name=None):
+    yield from csv.DictReader(_text(stream))
+
+
+def parse_markdown_document(text, name=None):
+    """
+    Read one note from Markdown, with or without the export's front matter.
+    """
+    row = {}
+    if text.startswith("---\n"):
+        header, separator, body = text[4:].partition("\n---\n")
+        if separator:
+            for line in header.splitlines():
+                key, _, value = line.partition(":")
+                try:
+                    row[key.strip()] = json.loads(value)
+                except json.JSONDecodeError:
+                    row[key.strip()] = value.strip()
+            text = body
+
+    text = text.strip("\n")
+    if "title" not in row:
+        first_line, _, rest = text.partition("\n")
+        if first_line.startswith("# "):
+            row["title"], text = first_line[2:].strip(), rest.strip("\n")
+        else:
+            row["title"] = PurePath(name).stem if name else ""
+
+    row["description"] = text
+    return row
+
+
+def parse_markdown(stream, name=None):
+    """
+    Parse a single ``.md`` file or a zip of them, one member at a time.
+    """
+    if name and name.lower().endswith(".zip"):
+        with zipfile.ZipFile(stream) as archive:
+            for info in archive.infolist():
+                if info.is_dir() or not info.filename.lower().endswith(".md"):
+                    continue
+                with archive.open(info) as member:
+                    text = member.read().decode("utf-8-sig")
+                yield parse_markdown_document(text, info.filename)
+        return
+
+    yield parse_markdown_document(stream.read().decode("utf-8-sig"), name)
+
+
+PARSERS = {
+    "ndjson": parse_ndjson,
+    "csv": parse_csv,
+    "markdown": parse_markdown,
+}
+
+EXTENSIONS = {
+    ".ndjson": "ndjson",
+    ".jsonl": "ndjson",
+    ".csv": "csv",
+    ".md": "markdown",
+    ".zip": "markdown",
+}
+
+
+def detect_format(name):
+    """
+    Guess the import format from a file name; raises ``KeyError`` if unknown.
+    """
+    return EXTENSIONS[PurePath(name).suffix.lower()]
+
+
+class NoteImporter:
+    """
+    Validate parsed rows with the ``NoteForm`` rules and insert them in batches.
+
+    Each batch is one ``bulk_create`` in its own transaction, so a failure
+    only loses the batch in flight. ``bulk_create`` bypasses the note
+    signals; the new notes are indexed and the search cache and stats are
+    rebuilt once when the run ends, successful or not. Like notes created
+    one at a time they start without revisions; their first edit keeps the
+    imported content as revision 1.
+    """
+
+    def __init__(self, owner, batch_size=None, progress=None):
+        self.owner = owner
+        self.batch_size = batch_size or getattr(settings, "NOTE_IMPORT_BATCH_SIZE", 500)
+        self.progress = progress
+
+    def build(self, row):
+        form = NoteForm(data={field: row.get(field) for field in IMPORT_FIELDS})
+        if not form.is_valid():
+            return None, [
+                f"{field}: {message}" if field != "__all__" else message
+                for field, messages in form.errors.items()
+                for message in messages
+            ]
+        note = form.save(commit=False)
+        note.owner = self.owner
+        return note, None
+
+    def run(self, rows, start=0):
+        """
+        Import ``rows``, skipping the first ``start``; returns the report.
+
+        Raises ``ImportFailed`` if a batch cannot be written.
+        """
+        report = ImportReport(start)
+        started_at = timezone.now()
+        batch = []
+        last_row = start
+
+        try:
+            for row_number, row in enumerate(rows, start=1):
+                if row_number <= start:
+                    continue
+                last_row = row_number
+
+                if "__error__" in row:
+                    note, errors = None, [row["__error__"]]
+                else:
+                    note, errors = self.build(row)
+
+                if errors:
+                    report.add_error(row_number, errors)
+                else:
+                    batch.append(note)
+
+                if len(batch) >= self.batch_size:
+                    self.flush(batch, report, row_number)
+                    batch = []
+
+            self.flush(batch, report, last_row)
+        finally:
+            self.finish(started_at)
+
+        return report
+
+    def flush(self, batch, report, row_number):
+        if batch:
+            try:
+                with transaction.atomic():
+                    Note.objects.bulk_create(batch)
+            except DatabaseError as e:
+                raise ImportFailed(report, e) from e
+
+        report.imported += len(batch)
+        report.resume_from = row_number
+        if self.progress:
+            self.progress(report)
+
+    def finish(self, started_at):
+        # Index only what this run can have added; re-indexing a note that
+        # was saved meanwhile through the UI is harmless.
+        get_search_backend().rebuild(
+            Note.objects.filter(owner=self.owner, created_at__gte=started_at)
+        )
+        stats.rebuild_note_stats(self.owner.pk)
+        get_search_cache().invalidate(self.owner.pk)
+
+
+def import_notes(owner, stream, format, name=None, start=0, batch_size=None, progress=None):
+    """
+    Parse ``stream`` as ``format`` and import its notes for ``owner``.
+    """
+    rows = PARSERS[format](stream, name)
+    return NoteImporter(owner, batch_size, progress).run(rows, start)
@@ -0,0 +1,261 @@
+import asyncio
+import threading
+import importlib
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.test import Client
+from django.urls import clear_url_caches, reverse
+from django.test.utils import override_settings
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management.base import BaseCommand, CommandError
+
+from note.models import Note
+from note.seed import seed_notes
+from notes_app.benchmark import benchmark_database, environment, summarize, write_report
+
+
+# URLconf modules that pick the sync or async views when imported.
+SWITCHED_URLCONFS = ("note.urls", "dashboard.urls", settings.ROOT_URLCONF)
+
+SCENARIOS = {
+    "note_list": ("GET", lambda: reverse("note:note_list"), None),
+    "note_search": ("GET", lambda: reverse("note:note_search") + "?search=meeting", None),
+    "favourites": ("GET", lambda: reverse("note:note_favorite_list", args=[1]), None),
+    "dashboard": ("GET", lambda: reverse("dashboard:dashboard"), None),
+    "note_create": ("POST", lambda: reverse("note:note_create"), b"title=Benchmark+note&description=" + b"x" * 4000),
+}
+
+
+@contextmanager
+def serving(async_views):
+    """
+    Serve the sync or async views, re-importing the URLconfs that choose them.
+    """
+    def reload():
+        for name in SWITCHED_URLCONFS:
+            importlib.reload(importlib.import_module(name))
+        clear_url_caches()
+
+    with override_settings(NOTE_ASYNC_VIEWS=async_views):
+        reload()
+    try:
+        yield
+    finally:
+        reload()
+
+
+class SlowClient:
+    """
+    Drive an ASGI application directly, sending the request body and reading
+    the response in chunks with a pause between each, like a client on a
+    slow connection.
+    """
+
+    def __init__(self, application, cookies, csrf_token, chunk_size, delay):
+        self.application = application
+        self.cookies = cookies
+        self.csrf_token = csrf_token
+        self.chunk_size = chunk_size
+        self.delay = delay
+
+    async def request(self, method, url, body=None):
+        url = urlsplit(url)
+        body = body or b""
+        headers = [
+            (b"host", b"testserver"),
+            (b"cookie", self.cookies.encode()),
+        ]
+        if method == "POST":
+            headers += [
+                (b"content-type", b"application/x-www-form-urlencoded"),
+                (b"content-length", str(len(body)).encode()),
+                (b"x-csrftoken", self.csrf_token.encode()),
+            ]
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": method,
+            "scheme": "http",
+            "path": url.path,
+            "raw_path": url.path.encode(),
+            "query_string": url.query.encode(),
+            "root_path": "",
+            "headers": headers,
+            "client": ("127.0.0.1", 50000),
+            "server": ("testserver", 80),
+        }
+
+        chunks = [body[i:i + self.chunk_size] for i in range(0, len(body), self.chunk_size)] or [b""]
+        received = asyncio.Event()
+
+        async def receive():
+            if chunks:
+                chunk = chunks.pop(0)
+                if self.delay:
+                    await asyncio.sleep(self.delay)
+                return {"type": "http.request", "body": chunk, "more_body": bool(chunks)}
+            # The client stays connected until the response has been read.
+            await received.wait()
+            return {"type": "http.disconnect"}
+
+        status = None
+
+        async def send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                return
+            # A slow reader takes a while over every chunk of the body.
+            if self.delay:
+                await asyncio.sleep(self.delay)
+            if not message.get("more_body", False):
+                received.set()
+
+        await self.application(scope, receive, send)
+        return status
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the sync and async note views under many concurrent slow clients, "
+        "driving the ASGI application in-process, and report throughput, latency "
+        "percentiles and thread counts as JSON. Runs against a throwaway test database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--concurrency",
+            default="1,10,50",
+            help="Comma-separated numbers of concurrent clients (default: 1,10,50).",
+        )
+        parser.add_argument(
+            "--requests",
+            type=int,
+            default=10,
+            help="Requests each client makes per scenario (default: 10).",
+        )
+        parser.add_argument(
+            "--delay",
+            type=float,
+            default=0.05,
+            help="Seconds a client pauses per body chunk sent or received (default: 0.05).",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=1024,
+            help="Request body bytes per chunk sent by a client (default: 1024).",
+        )
+        parser.add_argument(
+            "--notes",
+            type=int,
+            default=500,
+            help="Notes seeded for the benchmark user (default: 500).",
+        )
+        parser.add_argument(
+            "--only",
+            help="Only run scenarios whose name contains this text.",
+        )
+        parser.add_argument(
+            "--output",
+            default="-",
+            help="Write the JSON report to this file instead of stdout.",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            levels = [int(level) for level in options["concurrency"].split(",")]
+        except ValueError:
+            raise CommandError("--concurrency must be a comma-separated list of integers.")
+        if options["requests"] < 1 or min(levels) < 1:
+            raise CommandError("--requests and --concurrency must be at least 1.")
+
+        scenarios = {
+            name: scenario for name, scenario in SCENARIOS.items()
+            if not options["only"] or options["only"] in name
+        }
+
+        # Concurrent writers need an SQLite database that waits on locks.
+        with benchmark_database(on_disk=True):
+            owner, = seed_notes(1, options["notes"], seed=0)
+            cookies, csrf_token = self.login(owner)
+            report = {
+                **environment(),
+                "requests": options["requests"],
+                "delay": options["delay"],
+                "results": [],
+            }
+
+            for async_views in (False, True):
+                with serving(async_views):
+                    application = ASGIHandler()
+                    for name, (method, url, body) in scenarios.items():
+                        for level in levels:
+                            result = asyncio.run(self.run_scenario(
+                                SlowClient(application, cookies, csrf_token, options["chunk_size"], options["delay"]),
+                                method, url(), body, level, options["requests"],
+                            ))
+                            # Keep the data size fixed for the next run.
+                            Note.objects.filter(owner=owner, title__startswith="Benchmark").delete()
+                            report["results"].append({
+                                "views": "async" if async_views else "sync",
+                                "name": name,
+                                "concurrency": level,
+                                **result,
+                            })
+                            if options["verbosity"] > 1:
+                                self.stderr.write(
+                                    f"{'async' if async_views else 'sync':<6} {name:<12} x{level:<4} "
+                                    f"{result['requests_per_second']} req/s"
+                                )
+
+        write_report(report, options["output"], self.stdout)
+
+    @staticmethod
+    def login(owner):
+        client = Client()
+        client.force_login(owner)
+        # Rendering a page with a form sets the CSRF cookie.
+        client.get(reverse("note:note_list"))
+
+        header = "; ".join(
+            f"{name}={client.cookies[name].value}"
+            for name in (settings.SESSION_COOKIE_NAME, settings.CSRF_COOKIE_NAME)
+        )
+        return header, client.cookies[settings.CSRF_COOKIE_NAME].value
+
+    async def run_scenario(self, client, method, url, body, concurrency, requests):
+        latencies, statuses = [], {}
+        peak_threads = threading.active_count()
+        done = asyncio.Event()
+
+        async def watch_threads():
+            nonlocal peak_threads
+            while not done.is_set():
+                peak_threads = max(peak_threads, threading.active_count())
+                await asyncio.sleep(0.005)
+
+        async def worker():
+            for _ in range(requests):
+                start = time.perf_counter()
+                status = await client.request(method, url, body)
+                latencies.append((time.perf_counter() - start) * 1000)
+                statuses[status] = statuses.get(status, 0) + 1
+
+        watcher = asyncio.create_task(watch_threads())
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+        done.set()
+        await watcher
+
+        return {
+            "status": {str(status): count for status, count in sorted(statuses.items())},
+            "requests_per_second": round(len(latencies) / elapsed, 1),
+            "latency_ms": summarize(latencies),
+            "peak_threads": peak_threads,
+        }
@@ -0,0 +1,149 @@
+import sys
+import time
+import random
+
+from django.test.utils import override_settings
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.models import User
+from note import fields
+from note.models import Note
+from note.seed import sentence
+from notes_app.benchmark import benchmark_database, environment, summarize, write_report
+
+
+def body(rng, chars):
+    """
+    Note text of ``chars`` characters, made of the seed vocabulary.
+    """
+    parts, length = [], 0
+    while length < chars:
+        part = sentence(rng, 4, 16) + "."
+        parts.append(part)
+        length += len(part) + 1
+    return " ".join(parts)[:chars]
+
+
+def codecs():
+    """
+    ``(name, settings)`` for storing descriptions plain and with each codec.
+    """
+    yield "plain", {"NOTE_COMPRESSION_MIN_LENGTH": sys.maxsize}
+    for name in fields.CODECS.values():
+        if name == "zstd" and fields.zstandard is None:
+            continue
+        yield name, {"NOTE_COMPRESSION_MIN_LENGTH": 0, "NOTE_COMPRESSION_CODEC": name}
+
+
+def timed(function, repeat):
+    """
+    Microseconds per call of ``function`` over ``repeat`` calls.
+    """
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        latencies.append((time.perf_counter() - start) * 1_000_000)
+    return summarize(latencies, digits=1)
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare storing note descriptions plain, zlib- and zstd-compressed (when "
+        "zstandard is installed): stored size, compression and decompression time "
+        "per body, and the time to write and read notes against a throwaway test "
+        "database, as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            default="1000,4000,16000,64000",
+            help="Comma-separated description lengths in characters (default: 1000,4000,16000,64000).",
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=200,
+            help="Timed calls per codec and size (default: 200).",
+        )
+        parser.add_argument(
+            "--notes",
+            type=int,
+            default=50,
+            help="Notes written and read per timed database round (default: 50).",
+        )
+        parser.add_argument(
+            "--seed",
+            type=int,
+            default=0,
+            help="Random seed for the note text (default: 0).",
+        )
+        parser.add_argument(
+            "--output",
+            default="-",
+            help="Write the JSON report to this file instead of stdout.",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(size) for size in options["sizes"].split(",")]
+        except ValueError:
+            raise CommandError("--sizes must be a comma-separated list of integers.")
+        if any(size < 1 for size in sizes) or options["repeat"] < 1 or options["notes"] < 1:
+            raise CommandError("--sizes, --repeat and --notes must be positive.")
+
+        rng = random.Random(options["seed"])
+        bodies = {size: body(rng, size) for size in sizes}
+
+        report = {
+            **environment(),
+            "repeat": options["repeat"],
+            "notes": options["notes"],
+            "results": [],
+        }
+        with benchmark_database(verbosity=options["verbosity"]):
+            owner = User.objects.create_user("benchmark@example.com", "benchmark-pass")
+            for size, text in bodies.items():
+                for codec, codec_settings in codecs():
+                    with override_settings(**codec_settings):
+                        result = self.run_case(owner, text, options["repeat"], options["notes"])
+                    report["results"].append({"chars": size, "codec": codec, **result})
+
+        write_report(report, options["output"], self.stdout)
+
+    def run_case(self, owner, text, repeat, count):
+        stored = fields.compress(text)
+        result = {
+            "stored_chars": len(stored),
+            "ratio": round(len(stored) / len(text), 3),
+            "compress_us": timed(lambda: fields.compress(text), repeat),
+            "decompress_us": timed(lambda: fields.decompress(stored), repeat),
+        }
+
+        # Database rounds: bulk-write the notes, load them, then read their
+        # descriptions, which is when compressed ones are decompressed.
+        rounds = max(repeat // 10, 1)
+        write, load, read = [], [], []
+        for _ in range(rounds):
+            notes = [Note(owner=owner, title="Benchmark", description=text) for _ in range(count)]
+            start = time.perf_counter()
+            Note.objects.bulk_create(notes)
+            write.append((time.perf_counter() - start) * 1000)
+
+            queryset = Note.objects.filter(pk__in=[note.pk for note in notes])
+            start = time.perf_counter()
+            loaded = list(queryset)
+            load.append((time.perf_counter() - start) * 1000)
+
+            start = time.perf_counter()
+            for note in loaded:
+                note.description
+            read.append((time.perf_counter() - start) * 1000)
+
+            queryset.delete()
+
+        result["write_ms"] = summarize(write)
+        result["load_ms"] = summarize(load)
+        result["read_ms"] = summarize(read)
+        return result
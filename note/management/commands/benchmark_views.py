@@ -0,0 +1,322 @@
+import json
+import time
+import itertools
+
+from django.db import connection
+from django.urls import reverse
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.models import User
+from note.models import Note, NoteRevision
+from note.cache import get_search_cache
+from note.pagination import KeysetPaginator
+from note.seed import SEED_PASSWORD, seed_notes
+from notes_app.benchmark import benchmark_database, environment, summarize, write_report
+
+
+class Scenario:
+    """
+    One request to time. ``prepare(bench)`` runs untimed before every request
+    and returns ``(client, url, data)``; ``cleanup(bench)`` runs untimed after.
+    """
+
+    def __init__(self, name, method, prepare, cleanup=None):
+        self.name = name
+        self.method = method
+        self.prepare = prepare
+        self.cleanup = cleanup
+
+
+class Bench:
+    """
+    Fixture for one data size: a seeded owner, a logged-in client and helpers.
+    """
+
+    def __init__(self, owner):
+        self.owner = owner
+        self.client = self.login()
+        self.note = Note.objects.filter(owner=owner).order_by("-updated_at").first()
+        self.sample_ids = list(
+            Note.objects.filter(owner=owner).order_by("-updated_at").values_list("pk", flat=True)[:50]
+        )
+        self.counter = itertools.count()
+
+    def login(self):
+        client = Client(raise_request_exception=False)
+        client.force_login(self.owner)
+        return client
+
+    def anonymous(self):
+        return Client(raise_request_exception=False)
+
+    def scratch_note(self):
+        return Note.objects.create(owner=self.owner, title="Benchmark scratch", description="Scratch")
+
+    def revise(self, note, revisions):
+        """
+        Save ``revisions`` more versions of ``note``'s description.
+        """
+        description = note.description
+        for number in range(revisions):
+            note.description = f"{description}\n\nBenchmark revision {number}."
+            note.save(update_fields=["description"])
+        return note
+
+
+def _get(name, *args, query=""):
+    return lambda bench: (bench.client, reverse(name, args=args) + query, None)
+
+
+def _next_page(bench):
+    page = KeysetPaginator(Note.objects.filter(owner=bench.owner)).page(
+        base_url=reverse("note:note_list")
+    )
+    return bench.client, page.next_url or reverse("note:note_list"), None
+
+
+def _uncached_search(bench):
+    get_search_cache().invalidate(bench.owner.pk)
+    return bench.client, reverse("note:note_search") + "?search=meeting", None
+
+
+def _create(bench):
+    data = {"title": "Benchmark note", "description": "Created by the benchmark."}
+    return bench.client, reverse("note:note_create"), data
+
+
+def _edit(bench):
+    data = {"title": bench.note.title, "description": bench.note.description}
+    return bench.client, reverse("note:note_edit", args=[bench.note.pk]), data
+
+
+def _delete(bench):
+    return bench.client, reverse("note:note_delete", args=[bench.scratch_note().pk]), None
+
+
+def _history(bench):
+    # Enough versions for an "Older versions" link, once per data size.
+    if not NoteRevision.objects.filter(note=bench.note).exists():
+        bench.revise(bench.note, 15)
+    return bench.client, reverse("note:note_history", args=[bench.note.pk]), None
+
+
+def _restore(bench):
+    note = bench.revise(bench.scratch_note(), 1)
+    return bench.client, reverse("note:note_restore", args=[note.pk, 1]), None
+
+
+def _bulk(bench):
+    action = "favourite" if next(bench.counter) % 2 else "unfavourite"
+    data = {"action": action, "note_ids": [str(pk) for pk in bench.sample_ids]}
+    return bench.client, reverse("note:note_bulk"), data
+
+
+def _import(bench):
+    rows = "".join(
+        json.dumps({"title": f"Benchmark import {i}", "description": "Imported by the benchmark."}) + "\n"
+        for i in range(50)
+    )
+    data = {"file": SimpleUploadedFile("benchmark.ndjson", rows.encode())}
+    return bench.client, reverse("note:note_import"), data
+
+
+def _remove_benchmark_notes(bench):
+    # Keep the data size fixed across iterations of writing scenarios.
+    Note.objects.filter(owner=bench.owner, title__startswith="Benchmark").delete()
+
+
+def _register(bench):
+    data = {
+        "email": f"benchmark-{next(bench.counter)}@example.com",
+        "password1": "Bench-mark-pass-1",
+        "password2": "Bench-mark-pass-1",
+    }
+    return bench.anonymous(), reverse("accounts:register"), data
+
+
+def _login_page(bench):
+    return bench.anonymous(), reverse("accounts:login"), None
+
+
+def _login(bench):
+    data = {"username": bench.owner.email, "password": SEED_PASSWORD}
+    return bench.anonymous(), reverse("accounts:login"), data
+
+
+def _logout(bench):
+    return bench.login(), reverse("accounts:logout"), None
+
+
+def _update_user(bench):
+    data = {"email": bench.owner.email, "first_name": "Bench", "last_name": str(next(bench.counter))}
+    return bench.client, reverse("accounts:update"), data
+
+
+def _remove_registered_users(bench):
+    User.objects.filter(email__startswith="benchmark-").delete()
+
+
+SCENARIOS = [
+    # note/urls.py
+    Scenario("note:note_list", "get", _get("note:note_list")),
+    Scenario("note:note_list (next page)", "get", _next_page),
+    Scenario("note:note_favorite_list (all)", "get", _get("note:note_favorite_list", 0)),
+    Scenario("note:note_favorite_list (favourites)", "get", _get("note:note_favorite_list", 1)),
+    Scenario("note:note_search (cached)", "get", _get("note:note_search", query="?search=meeting")),
+    Scenario("note:note_search (uncached)", "get", _uncached_search),
+    Scenario("note:note_detail", "get", lambda bench: (
+        bench.client, reverse("note:note_detail", args=[bench.note.pk]), None
+    )),
+    Scenario("note:note_create", "post", _create, _remove_benchmark_notes),
+    Scenario("note:note_edit (form)", "get", lambda bench: (
+        bench.client, reverse("note:note_edit", args=[bench.note.pk]), None
+    )),
+    Scenario("note:note_edit", "post", _edit),
+    Scenario("note:note_delete", "post", _delete),
+    Scenario("note:note_history", "get", _history),
+    Scenario("note:note_restore", "post", _restore, _remove_benchmark_notes),
+    # The test client is WSGI, which the event stream answers at once with
+    # 204; an open ASGI stream lasts until the client leaves.
+    Scenario("note:note_events", "get", _get("note:note_events")),
+    Scenario("note:note_favorite_toggle", "post", lambda bench: (
+        bench.client, reverse("note:note_favorite_toggle", args=[bench.note.pk]), None
+    )),
+    Scenario("note:note_bulk", "post", _bulk),
+    Scenario("note:note_export (ndjson)", "get", _get("note:note_export", query="?format=ndjson")),
+    Scenario("note:note_export (csv)", "get", _get("note:note_export", query="?format=csv")),
+    Scenario("note:note_export (markdown)", "get", _get("note:note_export", query="?format=markdown")),
+    Scenario("note:note_import", "post", _import, _remove_benchmark_notes),
+    # dashboard/urls.py
+    Scenario("dashboard:dashboard", "get", _get("dashboard:dashboard")),
+    # accounts/urls.py
+    Scenario("accounts:register (form)", "get", lambda bench: (
+        bench.anonymous(), reverse("accounts:register"), None
+    )),
+    Scenario("accounts:register", "post", _register, _remove_registered_users),
+    Scenario("accounts:login (form)", "get", _login_page),
+    Scenario("accounts:login", "post", _login),
+    Scenario("accounts:logout", "post", _logout),
+    Scenario("accounts:update (form)", "get", _get("accounts:update")),
+    Scenario("accounts:update", "post", _update_user),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Time every note, dashboard and accounts URL through the test client at "
+        "several data sizes and report latency percentiles, query counts and "
+        "response sizes as JSON. Runs against a throwaway test database, and "
+        "fails after writing the report if any scenario answered 4xx or 5xx."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            default="10,100,1000",
+            help="Comma-separated notes per user to benchmark at (default: 10,100,1000).",
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=20,
+            help="Timed requests per scenario and size (default: 20).",
+        )
+        parser.add_argument(
+            "--warmup",
+            type=int,
+            default=2,
+            help="Untimed requests per scenario before timing (default: 2).",
+        )
+        parser.add_argument(
+            "--only",
+            help="Only run scenarios whose name contains this text.",
+        )
+        parser.add_argument(
+            "--seed",
+            type=int,
+            default=0,
+            help="Random seed for the generated notes (default: 0).",
+        )
+        parser.add_argument(
+            "--output",
+            default="-",
+            help="Write the JSON report to this file instead of stdout.",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(size) for size in options["sizes"].split(",")]
+        except ValueError:
+            raise CommandError("--sizes must be a comma-separated list of integers.")
+        if options["repeat"] < 1:
+            raise CommandError("--repeat must be at least 1.")
+
+        scenarios = [
+            scenario for scenario in SCENARIOS
+            if not options["only"] or options["only"] in scenario.name
+        ]
+
+        failed = []
+        with benchmark_database():
+            report = {**environment(), "repeat": options["repeat"], "results": []}
+
+            for number, size in enumerate(sizes, start=1):
+                owner, = seed_notes(1, size, seed=options["seed"], first_user=number)
+                bench = Bench(owner)
+
+                for scenario in scenarios:
+                    result = self.run_scenario(bench, scenario, options["warmup"], options["repeat"])
+                    report["results"].append({"size": size, **result})
+                    errors = [status for status in result["status"] if status >= 400]
+                    if errors:
+                        failed.append(f"{scenario.name} at {size} notes ({', '.join(map(str, errors))})")
+                        self.stderr.write(self.style.ERROR(
+                            f"{scenario.name} answered {', '.join(map(str, errors))} at {size} notes; "
+                            "its timings measure the error, not the view."
+                        ))
+                    if options["verbosity"] > 1:
+                        self.stderr.write(
+                            f"{size:>6} {scenario.name:<40} p50 {result['latency_ms']['p50']} ms"
+                        )
+
+        write_report(report, options["output"], self.stdout)
+        if failed:
+            raise CommandError("Scenarios answered with errors: " + "; ".join(failed) + ".")
+
+    def run_scenario(self, bench, scenario, warmup, repeat):
+        latencies, queries, sizes, statuses = [], [], [], set()
+
+        for iteration in range(warmup + repeat):
+            client, url, data = scenario.prepare(bench)
+            request = getattr(client, scenario.method)
+
+            with CaptureQueriesContext(connection) as ctx:
+                start = time.perf_counter()
+                response = request(url, data) if data is not None else request(url)
+                if response.streaming:
+                    size = sum(len(chunk) for chunk in response.streaming_content)
+                else:
+                    size = len(response.content)
+                elapsed = (time.perf_counter() - start) * 1000
+
+            if scenario.cleanup:
+                scenario.cleanup(bench)
+            if iteration < warmup:
+                continue
+
+            latencies.append(elapsed)
+            queries.append(len(ctx.captured_queries))
+            sizes.append(size)
+            statuses.add(response.status_code)
+
+        return {
+            "name": scenario.name,
+            "method": scenario.method.upper(),
+            "status": sorted(statuses),
+            "latency_ms": summarize(latencies),
+            "queries": summarize(queries, digits=1),
+            "bytes": summarize(sizes, digits=0),
+        }
@@ -0,0 +1,101 @@
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+from django.core.management.base import BaseCommand, CommandError
+
+from note.models import NoteRevision
+from note.revisions import build_revisions, replay
+
+
+def thin(versions, cutoff):
+    """
+    Keep every version from ``cutoff`` on, and the last of each day before it.
+    """
+    kept = []
+    for index, (created_at, content) in enumerate(versions):
+        if created_at < cutoff and index + 1 < len(versions):
+            next_created_at = versions[index + 1][0]
+            if timezone.localdate(next_created_at) == timezone.localdate(created_at):
+                continue
+        kept.append((created_at, content))
+    return kept
+
+
+def data_size(revisions):
+    return sum(len(json.dumps(revision.data)) for revision in revisions)
+
+
+class Command(BaseCommand):
+    help = (
+        "Thin out note revisions older than --older-than days to the last one of "
+        "each day, and rewrite the compacted histories as a snapshot every "
+        "NOTE_REVISION_SNAPSHOT_INTERVAL revisions with diffs in between."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--older-than",
+            type=int,
+            default=getattr(settings, "NOTE_REVISION_COMPACT_AFTER_DAYS", 30),
+            help="Only thin out revisions older than this many days (default: NOTE_REVISION_COMPACT_AFTER_DAYS).",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Notes looked up per query (default: 500).",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report what would be compacted.",
+        )
+
+    def handle(self, *args, **options):
+        if options["older_than"] < 0 or options["batch_size"] < 1:
+            raise CommandError("--older-than must not be negative and --batch-size must be positive.")
+
+        cutoff = timezone.now() - timedelta(days=options["older_than"])
+        dry_run = options["dry_run"]
+
+        # Only notes with two or more old revisions can lose any.
+        note_ids = (
+            NoteRevision.objects.filter(created_at__lt=cutoff)
+            .values("note_id").annotate(old=Count("id")).filter(old__gt=1)
+            .order_by("note_id").values_list("note_id", flat=True)
+        )
+
+        notes = before = after = size_before = size_after = 0
+        for note_id in note_ids.iterator(chunk_size=options["batch_size"]):
+            with transaction.atomic():
+                revisions = list(
+                    NoteRevision.objects.select_for_update()
+                    .filter(note_id=note_id).order_by("number")
+                )
+                versions = [(revision.created_at, content) for revision, content in replay(revisions)]
+                kept = thin(versions, cutoff)
+                if len(kept) == len(versions):
+                    continue
+
+                compacted = build_revisions(note_id, kept)
+                if not dry_run:
+                    NoteRevision.objects.filter(note_id=note_id).delete()
+                    NoteRevision.objects.bulk_create(compacted)
+
+            notes += 1
+            before += len(revisions)
+            after += len(compacted)
+            size_before += data_size(revisions)
+            size_after += data_size(compacted)
+            if options["verbosity"] > 1:
+                self.stdout.write(f"{note_id}: {len(revisions)} -> {len(compacted)} revisions")
+
+        verb = "Would compact" if dry_run else "Compacted"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {notes} notes: {before} -> {after} revisions, "
+            f"{size_before} -> {size_after} bytes of revision data."
+        ))
@@ -0,0 +1,98 @@
+import sys
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.db import connections
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.models import User
+from note.export import EXPORTERS, get_exporter
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream a user's notes to a file (or stdout) as NDJSON, CSV or a Markdown zip, "
+        "or export every user into a directory in parallel."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--user",
+            dest="email",
+            help="Export the notes of this email address.",
+        )
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Export every user, one file per user, into --output.",
+        )
+        parser.add_argument(
+            "--format",
+            default="ndjson",
+            choices=sorted(EXPORTERS),
+            help="Export format (default: ndjson).",
+        )
+        parser.add_argument(
+            "--output",
+            default="-",
+            help="Output file for --user ('-' for stdout), or output directory for --all.",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=4,
+            help="Users exported concurrently with --all (default: 4).",
+        )
+
+    def handle(self, *args, **options):
+        exporter_class = get_exporter(options["format"])
+
+        if options["all"] == bool(options["email"]):
+            raise CommandError("Pass exactly one of --user or --all.")
+
+        if options["email"]:
+            try:
+                user = User.objects.get(email=options["email"])
+            except User.DoesNotExist:
+                raise CommandError(f"No user with email {options['email']!r}.")
+
+            if options["output"] == "-":
+                self.write(exporter_class.for_owner(user), sys.stdout.buffer)
+            else:
+                with open(options["output"], "wb") as output:
+                    self.write(exporter_class.for_owner(user), output)
+                self.stdout.write(self.style.SUCCESS(f"Exported notes to {options['output']}."))
+            return
+
+        if options["output"] == "-":
+            raise CommandError("--all needs an output directory.")
+        directory = Path(options["output"])
+        directory.mkdir(parents=True, exist_ok=True)
+
+        user_ids = list(User.objects.order_by("pk").values_list("pk", flat=True))
+        with ThreadPoolExecutor(max_workers=max(options["workers"], 1)) as executor:
+            futures = {
+                executor.submit(self.export_user, exporter_class, user_id, directory): user_id
+                for user_id in user_ids
+            }
+            for future in as_completed(futures):
+                path = future.result()
+                if options["verbosity"] > 1:
+                    self.stdout.write(f"Exported user {futures[future]} to {path}.")
+
+        self.stdout.write(self.style.SUCCESS(f"Exported notes of {len(user_ids)} users to {directory}."))
+
+    def write(self, exporter, output):
+        for chunk in exporter:
+            output.write(chunk)
+
+    def export_user(self, exporter_class, user_id, directory):
+        path = directory / f"user-{user_id}.{exporter_class.extension}"
+        try:
+            exporter = exporter_class.for_owner(user_id)
+            with open(path, "wb") as output:
+                self.write(exporter, output)
+        finally:
+            # Worker threads get their own connections; don't leak them.
+            connections.close_all()
+        return path
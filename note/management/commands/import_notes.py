@@ -0,0 +1,88 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.models import User
+from note.importer import PARSERS, ImportFailed, detect_format, import_notes
+
+
+class Command(BaseCommand):
+    help = "Import notes for a user from an NDJSON, CSV or Markdown (.md or .zip) file."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "path",
+            help="File to import, or '-' to read NDJSON or CSV from stdin.",
+        )
+        parser.add_argument(
+            "--user",
+            dest="email",
+            required=True,
+            help="Email address of the user who will own the notes.",
+        )
+        parser.add_argument(
+            "--format",
+            choices=sorted(PARSERS),
+            help="Input format (default: detected from the file name).",
+        )
+        parser.add_argument(
+            "--resume-from",
+            type=int,
+            default=0,
+            help="Skip this many rows, as reported by a failed run.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            help="Notes written per transaction (default: NOTE_IMPORT_BATCH_SIZE).",
+        )
+
+    def handle(self, *args, **options):
+        self.verbosity = options["verbosity"]
+
+        try:
+            user = User.objects.get(email=options["email"])
+        except User.DoesNotExist:
+            raise CommandError(f"No user with email {options['email']!r}.")
+
+        path = options["path"]
+        format = options["format"]
+        if not format:
+            if path == "-":
+                raise CommandError("Pass --format when reading from stdin.")
+            try:
+                format = detect_format(path)
+            except KeyError:
+                raise CommandError(f"Cannot tell the format of {path!r}; pass --format.")
+
+        stream = sys.stdin.buffer if path == "-" else open(path, "rb")
+        try:
+            report = import_notes(
+                user,
+                stream,
+                format,
+                name=None if path == "-" else path,
+                start=options["resume_from"],
+                batch_size=options["batch_size"],
+                progress=self.progress,
+            )
+        except ImportFailed as e:
+            raise CommandError(
+                f"{e.error}\nRows up to {e.report.resume_from} were imported; "
+                f"rerun with --resume-from {e.report.resume_from} to continue."
+            )
+        finally:
+            if stream is not sys.stdin.buffer:
+                stream.close()
+
+        for error in report.errors:
+            self.stderr.write(f"Row {error[0]}: {'; '.join(error[1])}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {report.imported} notes for {user.email}, "
+            f"skipped {report.invalid} invalid rows."
+        ))
+
+    def progress(self, report):
+        if self.verbosity > 0:
+            self.stdout.write(f"Row {report.resume_from}: {report.imported} notes imported.")
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.models import User
+from note.stats import rebuild_note_stats
+
+
+class Command(BaseCommand):
+    help = "Rebuild the per-user note statistics used by the dashboard from scratch."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--user",
+            dest="email",
+            help="Only rebuild the statistics of this email address.",
+        )
+
+    def handle(self, *args, **options):
+        users = User.objects.all()
+
+        if options["email"]:
+            users = users.filter(email=options["email"])
+            if not users.exists():
+                raise CommandError(f"No user with email {options['email']!r}.")
+
+        count = 0
+        for user_id in users.values_list("pk", flat=True).iterator():
+            rebuild_note_stats(user_id)
+            count += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt note statistics for {count} users."))
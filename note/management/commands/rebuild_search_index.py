@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.models import User
+from note.models import Note
+from note.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search index for notes."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--user",
+            dest="email",
+            help="Only re-index the notes owned by this email address.",
+        )
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        notes = Note.objects.all()
+        owner = None
+
+        if options["email"]:
+            try:
+                owner = User.objects.get(email=options["email"])
+            except User.DoesNotExist:
+                raise CommandError(f"No user with email {options['email']!r}.")
+            notes = notes.filter(owner=owner)
+
+        backend.clear(owner)
+        count = backend.rebuild(notes)
+        self.stdout.write(
+            self.style.SUCCESS(f"Indexed {count} notes with {type(backend).__name__}.")
+        )
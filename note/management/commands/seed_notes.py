@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from note.seed import SEED_PASSWORD, seed_notes
+
+
+class Command(BaseCommand):
+    help = (
+        "Create N users with M notes each, with realistic text sizes and timestamps "
+        "spread over the past days, for development and benchmarking."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--users",
+            type=int,
+            default=10,
+            help="Number of seed users to create or reuse (default: 10).",
+        )
+        parser.add_argument(
+            "--notes",
+            type=int,
+            default=100,
+            help="Notes created per user (default: 100).",
+        )
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=365,
+            help="Spread creation times over this many past days (default: 365).",
+        )
+        parser.add_argument(
+            "--first-user",
+            type=int,
+            default=1,
+            help="Number of the first seed user, seed-<n>@example.com (default: 1).",
+        )
+        parser.add_argument(
+            "--seed",
+            type=int,
+            help="Random seed, for reproducible data.",
+        )
+
+    def handle(self, *args, **options):
+        if options["users"] < 1 or options["notes"] < 0 or options["days"] < 1:
+            raise CommandError("--users and --days must be positive and --notes not negative.")
+
+        owners = seed_notes(
+            options["users"],
+            options["notes"],
+            days=options["days"],
+            seed=options["seed"],
+            first_user=options["first_user"],
+        )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {options['notes']} notes for each of {len(owners)} users "
+            f"(password {SEED_PASSWORD!r})."
+        ))
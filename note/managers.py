@@ -0,0 +1,181 @@
+import sqlite3
+
+from asgiref.sync import sync_to_async
+
+from django.db import connections, models, transaction
+from django.db.models import F, sql
+from django.db.models.signals import post_save
+from django.utils import timezone
+
+
+def can_update_returning(connection):
+    """
+    Whether ``connection`` can return the updated rows from an ``UPDATE``.
+    """
+    if connection.vendor == "postgresql":
+        return True
+    if connection.vendor == "sqlite":
+        return sqlite3.sqlite_version_info >= (3, 35)
+    return False
+
+
+def changes_content(field_names):
+    # The models module imports this one.
+    from .models import REVISIONED_FIELDS
+
+    return not set(REVISIONED_FIELDS).isdisjoint(field_names)
+
+
+class NoteQuerySet(models.QuerySet):
+    """
+    Bulk writes that change a note's title or description keep the change
+    as a revision, refresh the preview and search index and move the
+    owner's rollup, as ``save()`` does; the other post_save hooks are still
+    bypassed.
+    """
+
+    def bulk_create(self, objs, *args, **kwargs):
+        # save() is bypassed, so the previews are filled in here.
+        objs = list(objs)
+        for obj in objs:
+            obj.update_preview()
+        return super().bulk_create(objs, *args, **kwargs)
+
+    def update(self, **kwargs):
+        # bulk_update() runs its batches through here too.
+        if not changes_content(kwargs):
+            return super().update(**kwargs)
+        return len(self._update_locked(kwargs))
+
+    def for_cards(self):
+        """
+        Leave out the full description, which the note cards replace with
+        the stored preview. Accessing it later costs a query per note.
+        """
+        return self.defer("description")
+
+    def update_returning(self, **changes):
+        """
+        Apply ``changes`` to the notes in this queryset and return them as
+        they are afterwards.
+
+        One ``UPDATE ... RETURNING`` statement where the database supports
+        it; otherwise the rows are locked, updated and read back in a
+        transaction, as they are when the title or description changes, so
+        the change can be kept as a revision. Like ``update()``, no signals
+        are sent.
+        """
+        self._not_support_combined_queries("update_returning")
+        if self.query.is_sliced:
+            raise TypeError("Cannot update a query once a slice has been taken.")
+        self._for_write = True
+        connection = connections[self.db]
+
+        if changes_content(changes) or not can_update_returning(connection):
+            return self._update_locked(changes)
+
+        query = self.query.chain(sql.UpdateQuery)
+        query.add_update_values(changes)
+        query.clear_ordering(force=True)
+        compiler = query.get_compiler(self.db)
+        update_sql, params = compiler.as_sql()
+        if not update_sql:
+            return []
+
+        opts = self.model._meta
+        fields = opts.concrete_fields
+        cols = [field.get_col(opts.db_table) for field in fields]
+        returning = ", ".join(connection.ops.quote_name(field.column) for field in fields)
+
+        with connection.cursor() as cursor:
+            cursor.execute(f"{update_sql} RETURNING {returning}", params)
+            rows = cursor.fetchall()
+
+        field_names = [field.attname for field in fields]
+        rows = compiler.apply_converters(rows, compiler.get_converters(cols))
+        return [self.model.from_db(self.db, field_names, row) for row in rows]
+
+    def _update_locked(self, changes):
+        """
+        Lock the notes, update them and read them back in one transaction,
+        recording a revision for each note whose content changed and
+        bringing its preview and index entry up to date.
+        """
+        # The models module imports this one.
+        from . import stats
+        from .cache import get_search_cache
+        from .revisions import record_revision
+        from .search import get_search_backend
+
+        self._for_write = True
+        content_changed = changes_content(changes)
+        if content_changed:
+            # As save() would; it also dates the revisions.
+            changes = {"updated_at": timezone.now(), **changes}
+
+        with transaction.atomic(using=self.db):
+            locked = self.order_by().select_for_update()
+            if content_changed:
+                before = {note.pk: note for note in locked.defer(None)}
+                pks = list(before)
+            else:
+                pks = list(locked.values_list("pk", flat=True))
+
+            base = self.model._base_manager.using(self.db).filter(pk__in=pks)
+            base.update(**changes)
+            notes = list(base)
+
+            if content_changed:
+                if "description" in changes:
+                    for note in notes:
+                        note.update_preview()
+                    self.model._base_manager.using(self.db).bulk_update(notes, ["preview"])
+
+                backend = get_search_backend(self.db)
+                for note in notes:
+                    previous = before[note.pk]
+                    note._stored_updated_at = previous.updated_at
+                    record_revision(note, previous.get_content(decompress=False), using=self.db)
+                    backend.index(note)
+
+                for owner_id in {note.owner_id for note in notes}:
+                    stats.notes_updated(owner_id, [note for note in notes if note.owner_id == owner_id])
+                    get_search_cache().invalidate(owner_id)
+        return notes
+
+    async def aupdate_returning(self, **changes):
+        return await sync_to_async(self.update_returning)(**changes)
+
+    def toggle(self, field_name):
+        """
+        Flip the boolean ``field_name`` on the notes in this queryset in one
+        statement, and return them as they are afterwards.
+
+        Concurrent toggles each flip the stored value, so none is lost to a
+        read-modify-write race. ``updated_at`` is left alone, and the
+        ``post_save`` hooks (index, caches, statistics, live events) run for
+        every note as for ``save(update_fields=[field_name])``.
+        """
+        self._for_write = True
+        with transaction.atomic(using=self.db):
+            notes = self.update_returning(**{field_name: ~F(field_name)})
+            for note in notes:
+                # What the statistics hooks compare against to count the change.
+                if field_name == "is_favourite":
+                    note._stored_is_favourite = not note.is_favourite
+                post_save.send(
+                    sender=self.model,
+                    instance=note,
+                    created=False,
+                    update_fields=frozenset([field_name]),
+                    raw=False,
+                    using=self.db,
+                )
+                note._stored_is_favourite = note.is_favourite
+        return notes
+
+    async def atoggle(self, field_name):
+        return await sync_to_async(self.toggle)(field_name)
+
+
+NoteManager = models.Manager.from_queryset(NoteQuerySet)
@@ -0,0 +1,57 @@
+from django.db import migrations
+
+
+SQLITE_CREATE = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS note_note_fts USING fts5("
+    "title, description, note_id UNINDEXED, owner_id UNINDEXED, "
+    "tokenize = 'unicode61 remove_diacritics 2')"
+)
+
+POSTGRES_CREATE = [
+    "CREATE TABLE IF NOT EXISTS note_note_search ("
+    "note_id uuid PRIMARY KEY REFERENCES note_note (id) "
+    "ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, "
+    "owner_id bigint NOT NULL, "
+    "document tsvector NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS note_note_search_document_gin "
+    "ON note_note_search USING GIN (document)",
+    "CREATE INDEX IF NOT EXISTS note_note_search_owner_id "
+    "ON note_note_search (owner_id)",
+]
+
+
+def create_search_index(apps, schema_editor):
+    from note.search import SQLiteFTSBackend, PostgresSearchBackend
+
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        schema_editor.execute(SQLITE_CREATE)
+        backend = SQLiteFTSBackend(using=schema_editor.connection.alias)
+    elif vendor == "postgresql":
+        for statement in POSTGRES_CREATE:
+            schema_editor.execute(statement)
+        backend = PostgresSearchBackend(using=schema_editor.connection.alias)
+    else:
+        return
+
+    Note = apps.get_model("note", "Note")
+    backend.rebuild(Note.objects.using(schema_editor.connection.alias).all())
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        schema_editor.execute("DROP TABLE IF EXISTS note_note_fts")
+    elif vendor == "postgresql":
+        schema_editor.execute("DROP TABLE IF EXISTS note_note_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('note', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.2 on 2026-10-18 16:39
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('note', '0002_note_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='note',
+            index=models.Index(fields=['owner', '-updated_at', '-id'], name='note_owner_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='note',
+            index=models.Index(fields=['owner', 'is_favourite', '-updated_at', '-id'], name='note_owner_fav_updated_idx'),
+        ),
+        migrations.AlterField(
+            model_name='note',
+            name='owner',
+            field=models.ForeignKey(db_index=False, help_text='The user who owns this note.', on_delete=django.db.models.deletion.CASCADE, related_name='notes', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
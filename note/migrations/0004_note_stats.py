@@ -0,0 +1,46 @@
+# Generated by Django 5.2.2 on 2026-10-18 16:43
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_remove_user_gender'),
+        ('note', '0003_note_owner_composite_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NoteStats',
+            fields=[
+                ('owner', models.OneToOneField(help_text='The user these statistics belong to.', on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='note_stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('total_notes', models.PositiveIntegerField(default=0, verbose_name='Total Notes')),
+                ('favourite_notes', models.PositiveIntegerField(default=0, verbose_name='Favourite Notes')),
+                ('last_updated_at', models.DateTimeField(blank=True, null=True, verbose_name='Last Updated At')),
+                ('last_updated', models.ForeignKey(blank=True, help_text="The user's most recently updated note.", null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='note.note')),
+            ],
+            options={
+                'verbose_name': 'Note statistics',
+                'verbose_name_plural': 'Note statistics',
+            },
+        ),
+        migrations.CreateModel(
+            name='NoteDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='Day')),
+                ('created', models.PositiveIntegerField(default=0, verbose_name='Notes Created')),
+                ('owner', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='note_daily_stats', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Daily note statistics',
+                'verbose_name_plural': 'Daily note statistics',
+                'ordering': ['day'],
+                'constraints': [models.UniqueConstraint(fields=('owner', 'day'), name='note_daily_stats_owner_day_uniq')],
+            },
+        ),
+    ]
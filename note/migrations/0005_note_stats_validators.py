@@ -0,0 +1,23 @@
+# Generated by Django 5.2.2 on 2026-10-18 16:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('note', '0004_note_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notestats',
+            name='deleted_notes',
+            field=models.PositiveIntegerField(default=0, help_text='Running count of deleted notes, used to validate cached pages.', verbose_name='Deleted Notes'),
+        ),
+        migrations.AddField(
+            model_name='notestats',
+            name='modified_at',
+            field=models.DateTimeField(blank=True, help_text='Time of the latest note write of any kind, including favourite toggles.', null=True, verbose_name='Modified At'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.2 on 2026-10-18 17:22
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('note', '0005_note_stats_validators'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NoteRevision',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.PositiveIntegerField(help_text="Position of the revision in the note's history, from 1.", verbose_name='Number')),
+                ('is_snapshot', models.BooleanField(default=False, help_text='Whether data holds the full content rather than a diff.', verbose_name='Is Snapshot')),
+                ('data', models.JSONField(help_text='The content, or the diff from the previous revision.', verbose_name='Data')),
+                ('created_at', models.DateTimeField(help_text='When the note was saved with this content.', verbose_name='Created At')),
+                ('note', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='revisions', to='note.note')),
+            ],
+            options={
+                'verbose_name': 'Note revision',
+                'verbose_name_plural': 'Note revisions',
+                'ordering': ['note', 'number'],
+                'constraints': [models.UniqueConstraint(fields=('note', 'number'), name='note_revision_note_number_uniq')],
+            },
+        ),
+    ]
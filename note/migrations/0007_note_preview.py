@@ -0,0 +1,40 @@
+# Generated by Django 5.2.2 on 2026-10-18 17:26
+
+from django.db import migrations, models
+
+
+BATCH_SIZE = 1000
+
+
+def backfill_previews(apps, schema_editor):
+    from note.models import make_preview
+
+    Note = apps.get_model("note", "Note")
+    notes = Note.objects.using(schema_editor.connection.alias).only("id", "description").order_by("id")
+
+    # Seek on the primary key so each batch holds at most BATCH_SIZE bodies.
+    last_id = None
+    while True:
+        batch = list((notes.filter(id__gt=last_id) if last_id else notes)[:BATCH_SIZE])
+        if not batch:
+            break
+        for note in batch:
+            note.preview = make_preview(note.description)
+        Note.objects.using(schema_editor.connection.alias).bulk_update(batch, ["preview"])
+        last_id = batch[-1].id
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('note', '0006_note_revision'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='note',
+            name='preview',
+            field=models.CharField(blank=True, editable=False, help_text='The opening of the description, shown on note cards.', max_length=300, verbose_name='Preview'),
+        ),
+        migrations.RunPython(backfill_previews, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 5.2.2 on 2026-10-18 17:30
+
+import note.fields
+from django.conf import settings
+from django.db import migrations
+from django.db.models import Q, Value
+from django.db.models.functions import Length
+
+
+BATCH_SIZE = 500
+
+
+def batches(queryset):
+    """
+    Seek through ``queryset`` on the primary key, BATCH_SIZE notes at a time.
+    """
+    queryset = queryset.only("id", "description").order_by("id")
+    last_id = None
+    while True:
+        batch = list((queryset.filter(id__gt=last_id) if last_id else queryset)[:BATCH_SIZE])
+        if not batch:
+            return
+        yield batch
+        last_id = batch[-1].id
+
+
+def compress_descriptions(apps, schema_editor):
+    Note = apps.get_model("note", "Note")
+    notes = Note.objects.using(schema_editor.connection.alias)
+    min_length = getattr(settings, "NOTE_COMPRESSION_MIN_LENGTH", 2048)
+
+    # Plain text that starts with the marker has to be escaped, however short.
+    candidates = notes.alias(length=Length("description")).filter(
+        Q(length__gte=min_length) | Q(description__startswith=note.fields.MARKER)
+    )
+    for batch in batches(candidates):
+        for instance in batch:
+            text = instance.__dict__["description"]
+            if isinstance(text, note.fields.CompressedText):
+                text = text.stored  # Not compressed yet, only read as if it were.
+            # A Value() is written as it is, bypassing the field's own compression.
+            instance.description = Value(note.fields.compress(text, min_length))
+        notes.bulk_update(batch, ["description"])
+
+
+def decompress_descriptions(apps, schema_editor):
+    Note = apps.get_model("note", "Note")
+    notes = Note.objects.using(schema_editor.connection.alias)
+
+    for batch in batches(notes.filter(description__startswith=note.fields.MARKER)):
+        for instance in batch:
+            # A Value() is written as it is, bypassing the field's compression.
+            instance.description = Value(str(instance.__dict__["description"]))
+        notes.bulk_update(batch, ["description"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('note', '0007_note_preview'),
+    ]
+
+    operations = [
+        # The column stays text; only the field class changes, so SQLite need
+        # not rebuild the table.
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name='note',
+                    name='description',
+                    field=note.fields.CompressedTextField(blank=True, help_text='Enter the detailed content of the note.', verbose_name='Description'),
+                ),
+            ],
+        ),
+        migrations.RunPython(compress_descriptions, decompress_descriptions),
+    ]
@@ -1,10 +1,29 @@
 import uuid
 
-from django.db import models
+from django.db import models, router, transaction
 from django.urls import reverse
 from django.conf import settings
+from django.utils.text import Truncator
 from django.utils.translation import gettext_lazy as _
 
+from .fields import CompressedText, CompressedTextField
+from .managers import NoteManager
+
+
+# Fields whose changes are kept as NoteRevisions.
+REVISIONED_FIELDS = ("title", "description")
+
+# Characters of the description kept in Note.preview for the note cards.
+PREVIEW_LENGTH = 300
+
+
+def make_preview(description):
+    """
+    The opening of ``description``, cut on a word boundary to at most
+    ``PREVIEW_LENGTH`` characters.
+    """
+    return Truncator(" ".join(description.split())).chars(PREVIEW_LENGTH)
+
 
 class Note(models.Model):
     
@@ -20,6 +39,7 @@ class Note(models.Model):
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
         related_name="notes",
+        db_index=False,  # Covered by the owner-prefixed composite indexes below.
         help_text=_("The user who owns this note."),
     )
 
@@ -29,12 +49,20 @@ class Note(models.Model):
         help_text=_("Enter a short, descriptive title for the note.")
     )
 
-    description = models.TextField(
+    description = CompressedTextField(
         _("Description"),
         blank=True,
         help_text=_("Enter the detailed content of the note.")
     )
 
+    preview = models.CharField(
+        _("Preview"),
+        max_length=PREVIEW_LENGTH,
+        blank=True,
+        editable=False,
+        help_text=_("The opening of the description, shown on note cards."),
+    )
+
     is_favourite = models.BooleanField(
         _("Is Favourite"),
         default=False,
@@ -53,13 +81,218 @@ class Note(models.Model):
         help_text=_("The date and time when the note was last modified.")
     )
 
+    objects = NoteManager()
+
     class Meta:
         ordering = ['-updated_at']
         verbose_name = _("Note")
         verbose_name_plural = _("Notes")
+        indexes = [
+            # Note lists, keyset pagination and recent-activity counts
+            models.Index(
+                fields=["owner", "-updated_at", "-id"],
+                name="note_owner_updated_idx",
+            ),
+            # Favourites list and favourite counts
+            models.Index(
+                fields=["owner", "is_favourite", "-updated_at", "-id"],
+                name="note_owner_fav_updated_idx",
+            ),
+        ]
 
     def __str__(self):
         return self.title
 
     def get_absolute_url(self):
-        return reverse("notes:detail", kwargs={"pk": self.pk})
\ No newline at end of file
+        return reverse("notes:detail", kwargs={"pk": self.pk})
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored flag so the stats hooks can tell a toggle apart
+        instance._stored_is_favourite = instance.__dict__.get("is_favourite")
+        # And the stored content and its time, which the next revision diffs
+        # from; a compressed description is only decompressed if it has to.
+        instance._stored_content = instance.get_content(decompress=False)
+        instance._stored_updated_at = instance.__dict__.get("updated_at")
+        return instance
+
+    def get_content(self, decompress=True):
+        """
+        The revisioned fields, or ``None`` if any of them was not loaded.
+
+        With ``decompress=False``, values not read yet may be left as
+        ``CompressedText``.
+        """
+        content = {name: self.__dict__.get(name) for name in REVISIONED_FIELDS}
+        if None in content.values():
+            return None
+        if decompress:
+            content = {name: getattr(self, name) for name in content}
+        return content
+
+    def update_preview(self):
+        self.preview = make_preview(self.description)
+
+    def save(self, *args, **kwargs):
+        """
+        Save the note together with the rows derived from it.
+
+        The post_save hooks (search index, statistics) run inside the same
+        transaction, so a failure in any of them rolls back the whole write.
+        The preview follows the description whenever that is loaded.
+        """
+        update_fields = kwargs.get("update_fields")
+        description = self.__dict__.get("description")
+        # Not loaded, or still compressed and so never read, let alone changed.
+        if description is not None and not isinstance(description, CompressedText):
+            self.update_preview()
+            if update_fields is not None and "description" in update_fields:
+                kwargs["update_fields"] = {*update_fields, "preview"}
+
+        using = kwargs.get("using") or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using):
+            super().save(*args, **kwargs)
+        self._stored_is_favourite = self.is_favourite
+        self._stored_content = self.get_content(decompress=False)
+        self._stored_updated_at = self.updated_at
+
+
+class NoteStats(models.Model):
+    """
+    Per-user rollup of note counts, maintained incrementally by the Note hooks.
+    """
+
+    owner = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="note_stats",
+        help_text=_("The user these statistics belong to."),
+    )
+
+    total_notes = models.PositiveIntegerField(
+        _("Total Notes"),
+        default=0,
+    )
+
+    favourite_notes = models.PositiveIntegerField(
+        _("Favourite Notes"),
+        default=0,
+    )
+
+    last_updated = models.ForeignKey(
+        Note,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+",
+        help_text=_("The user's most recently updated note."),
+    )
+
+    last_updated_at = models.DateTimeField(
+        _("Last Updated At"),
+        null=True,
+        blank=True,
+    )
+
+    deleted_notes = models.PositiveIntegerField(
+        _("Deleted Notes"),
+        default=0,
+        help_text=_("Running count of deleted notes, used to validate cached pages."),
+    )
+
+    modified_at = models.DateTimeField(
+        _("Modified At"),
+        null=True,
+        blank=True,
+        help_text=_("Time of the latest note write of any kind, including favourite toggles."),
+    )
+
+    class Meta:
+        verbose_name = _("Note statistics")
+        verbose_name_plural = _("Note statistics")
+
+    def __str__(self):
+        return f"{self.owner_id}: {self.total_notes} notes"
+
+
+class NoteDailyStats(models.Model):
+    """
+    Number of a user's notes created on a given day.
+    """
+
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="note_daily_stats",
+        db_index=False,  # Covered by the (owner, day) unique constraint.
+    )
+
+    day = models.DateField(_("Day"))
+
+    created = models.PositiveIntegerField(
+        _("Notes Created"),
+        default=0,
+    )
+
+    class Meta:
+        ordering = ["day"]
+        verbose_name = _("Daily note statistics")
+        verbose_name_plural = _("Daily note statistics")
+        constraints = [
+            models.UniqueConstraint(fields=["owner", "day"], name="note_daily_stats_owner_day_uniq"),
+        ]
+
+    def __str__(self):
+        return f"{self.owner_id} {self.day}: {self.created}"
+
+
+class NoteRevision(models.Model):
+    """
+    One version of a note's title and description.
+
+    Every ``NOTE_REVISION_SNAPSHOT_INTERVAL``-th revision stores the full
+    content; the ones in between store a diff from the revision before them
+    (see note/revisions.py), so rebuilding any version replays at most one
+    snapshot and the diffs after it.
+    """
+
+    note = models.ForeignKey(
+        Note,
+        on_delete=models.CASCADE,
+        related_name="revisions",
+        db_index=False,  # Covered by the (note, number) unique constraint.
+    )
+
+    number = models.PositiveIntegerField(
+        _("Number"),
+        help_text=_("Position of the revision in the note's history, from 1."),
+    )
+
+    is_snapshot = models.BooleanField(
+        _("Is Snapshot"),
+        default=False,
+        help_text=_("Whether data holds the full content rather than a diff."),
+    )
+
+    data = models.JSONField(
+        _("Data"),
+        help_text=_("The content, or the diff from the previous revision."),
+    )
+
+    created_at = models.DateTimeField(
+        _("Created At"),
+        help_text=_("When the note was saved with this content."),
+    )
+
+    class Meta:
+        ordering = ["note", "number"]
+        verbose_name = _("Note revision")
+        verbose_name_plural = _("Note revisions")
+        constraints = [
+            models.UniqueConstraint(fields=["note", "number"], name="note_revision_note_number_uniq"),
+        ]
+
+    def __str__(self):
+        return f"{self.note_id} #{self.number}"
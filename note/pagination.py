@@ -0,0 +1,170 @@
+import json
+import base64
+import binascii
+import uuid
+from datetime import datetime
+
+from django.conf import settings
+from django.db.models import Q
+from django.http import QueryDict
+
+
+def get_page_size():
+    return getattr(settings, "NOTE_PAGE_SIZE", 24)
+
+
+def encode_cursor(values):
+    """
+    Pack the sort key of the last row on a page into an opaque token.
+    """
+    raw = json.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """
+    Reverse ``encode_cursor``; raises ``ValueError`` on a malformed token.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (binascii.Error, UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise ValueError("Invalid cursor.") from e
+
+    if not isinstance(values, list) or len(values) != 2:
+        raise ValueError("Invalid cursor.")
+    return values
+
+
+class KeysetPage:
+    """
+    One page of notes plus the cursor that continues after it.
+    """
+
+    def __init__(self, object_list, next_cursor, base_url, params=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.base_url = base_url
+        self.params = params or {}
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def next_url(self):
+        if not self.has_next:
+            return None
+        query = QueryDict(mutable=True)
+        query.update({key: value for key, value in self.params.items() if value})
+        query["cursor"] = self.next_cursor
+        return f"{self.base_url}?{query.urlencode()}"
+
+
+class KeysetPaginator:
+    """
+    Paginate a note queryset on ``(updated_at, id)``, newest first.
+
+    Each page seeks past the previous page's last row instead of using an
+    OFFSET, so fetching page 500 costs the same as fetching page 1.
+    """
+
+    ordering = ("-updated_at", "-id")
+
+    def __init__(self, queryset, per_page=None):
+        self.queryset = queryset.order_by(*self.ordering)
+        self.per_page = per_page or get_page_size()
+
+    @staticmethod
+    def cursor_for(note):
+        return encode_cursor([note.updated_at.isoformat(), note.pk.hex])
+
+    def seek(self, cursor):
+        updated_at, pk = decode_cursor(cursor)
+        try:
+            updated_at = datetime.fromisoformat(updated_at)
+            pk = uuid.UUID(pk)
+        except (TypeError, ValueError) as e:
+            raise ValueError("Invalid cursor.") from e
+
+        return self.queryset.filter(
+            Q(updated_at__lt=updated_at) | Q(updated_at=updated_at, id__lt=pk)
+        )
+
+    def rows(self, cursor=None):
+        queryset = self.seek(cursor) if cursor else self.queryset
+        # Fetch one extra row to learn whether another page exists.
+        return queryset[:self.per_page + 1]
+
+    def make_page(self, rows, base_url="", params=None):
+        object_list = rows[:self.per_page]
+
+        next_cursor = None
+        if len(rows) > self.per_page:
+            next_cursor = self.cursor_for(object_list[-1])
+
+        return KeysetPage(object_list, next_cursor, base_url, params)
+
+    def page(self, cursor=None, base_url="", params=None):
+        return self.make_page(list(self.rows(cursor)), base_url, params)
+
+    async def apage(self, cursor=None, base_url="", params=None):
+        rows = [note async for note in self.rows(cursor)]
+        return self.make_page(rows, base_url, params)
+
+
+class RankedPaginator:
+    """
+    Paginate ranked search hits on ``(score, id)``, best match first.
+
+    ``search`` ranks the hits a page at a time: ``search.hits(after, limit)``
+    returns at most ``limit`` ``(note_id, score)`` pairs ranked below the
+    ``(score, note_id)`` key ``after`` (``ahits`` is its async twin). Only
+    the notes on the requested page are loaded from ``queryset``.
+    """
+
+    def __init__(self, queryset, search, per_page=None):
+        self.queryset = queryset
+        self.search = search
+        self.per_page = per_page or get_page_size()
+
+    @staticmethod
+    def seek_key(cursor):
+        score, pk = decode_cursor(cursor)
+        try:
+            return float(score), uuid.UUID(pk)
+        except (TypeError, ValueError) as e:
+            raise ValueError("Invalid cursor.") from e
+
+    def make_page(self, hits, notes, base_url="", params=None):
+        page_hits = hits[:self.per_page]
+
+        ranking = {note_id: position for position, (note_id, score) in enumerate(page_hits)}
+        object_list = sorted(notes, key=lambda note: ranking[note.pk])
+
+        next_cursor = None
+        if len(hits) > self.per_page:
+            note_id, score = page_hits[-1]
+            next_cursor = encode_cursor([score, note_id.hex])
+
+        return KeysetPage(object_list, next_cursor, base_url, params)
+
+    def notes(self, hits):
+        return self.queryset.filter(pk__in=[note_id for note_id, score in hits[:self.per_page]])
+
+    def page(self, cursor=None, base_url="", params=None):
+        after = self.seek_key(cursor) if cursor else None
+        # Fetch one extra hit to learn whether another page exists.
+        hits = self.search.hits(after, self.per_page + 1)
+        return self.make_page(hits, list(self.notes(hits)), base_url, params)
+
+    async def apage(self, cursor=None, base_url="", params=None):
+        after = self.seek_key(cursor) if cursor else None
+        hits = await self.search.ahits(after, self.per_page + 1)
+        return self.make_page(hits, [note async for note in self.notes(hits)], base_url, params)
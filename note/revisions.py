@@ -0,0 +1,208 @@
+"""
+Note revision history, stored as periodic snapshots and diffs.
+
+A revision's ``data`` is either the full content (``{"title": ...,
+"description": ...}``) or, per changed field, a list of edit operations
+against the previous revision, over word tokens:
+
+* a positive ``int`` keeps that many tokens of the previous text,
+* a negative ``int`` skips that many,
+* a ``str`` inserts itself.
+
+A note gets its first revisions on its first edit: the content it had,
+then the edited content. Notes never edited keep no history.
+"""
+import re
+from difflib import SequenceMatcher
+
+from django.conf import settings
+from django.db.models import Subquery
+from django.utils import timezone
+
+from .models import REVISIONED_FIELDS, NoteRevision
+
+
+TOKEN_RE = re.compile(r"\S+\s*|\s+")
+
+
+def get_snapshot_interval():
+    return max(getattr(settings, "NOTE_REVISION_SNAPSHOT_INTERVAL", 10), 1)
+
+
+def is_snapshot_number(number, interval=None):
+    return (number - 1) % (interval or get_snapshot_interval()) == 0
+
+
+def diff_text(old, new):
+    """
+    Edit operations turning ``old`` into ``new``.
+    """
+    a, b = TOKEN_RE.findall(old), TOKEN_RE.findall(new)
+    ops = []
+    for tag, i1, i2, j1, j2 in SequenceMatcher(None, a, b).get_opcodes():
+        if tag == "equal":
+            ops.append(i2 - i1)
+            continue
+        if i2 > i1:
+            ops.append(i1 - i2)
+        if j2 > j1:
+            ops.append("".join(b[j1:j2]))
+    return ops
+
+
+def patch_text(old, ops):
+    """
+    Apply the edit operations from ``diff_text()`` to ``old``.
+    """
+    tokens = TOKEN_RE.findall(old)
+    parts, position = [], 0
+    for op in ops:
+        if isinstance(op, str):
+            parts.append(op)
+        elif op > 0:
+            parts.extend(tokens[position:position + op])
+            position += op
+        else:
+            position -= op
+    return "".join(parts)
+
+
+def diff_content(old, new):
+    return {
+        name: diff_text(old[name], new[name])
+        for name in REVISIONED_FIELDS
+        if old[name] != new[name]
+    }
+
+
+def patch_content(old, diff):
+    return {
+        name: patch_text(old[name], diff[name]) if name in diff else old[name]
+        for name in REVISIONED_FIELDS
+    }
+
+
+def replay(revisions):
+    """
+    Yield ``(revision, content)`` for consecutive ``revisions`` of one note,
+    oldest first. The first must be a snapshot.
+    """
+    content = None
+    for revision in revisions:
+        if revision.is_snapshot:
+            content = dict(revision.data)
+        else:
+            content = patch_content(content, revision.data)
+        yield revision, content
+
+
+def build_revisions(note_id, versions, interval=None):
+    """
+    Unsaved revisions of note ``note_id`` numbered from 1 for ``versions``,
+    a list of ``(created_at, content)`` pairs, oldest first.
+    """
+    revisions, previous = [], None
+    for number, (created_at, content) in enumerate(versions, start=1):
+        snapshot = previous is None or is_snapshot_number(number, interval)
+        revisions.append(NoteRevision(
+            note_id=note_id,
+            number=number,
+            is_snapshot=snapshot,
+            data=content if snapshot else diff_content(previous, content),
+            created_at=created_at,
+        ))
+        previous = content
+    return revisions
+
+
+def record_revision(note, previous, using=None):
+    """
+    Store the content ``note`` was just saved with as its next revision.
+
+    ``previous`` is the content it had before, possibly still compressed, or
+    ``None`` if that was not loaded; a snapshot is stored then, since there
+    is nothing to diff from.
+    Returns the revisions created.
+    """
+    content = note.get_content()
+    if content is None:
+        return []
+    if previous is not None:
+        previous = {name: str(value) for name, value in previous.items()}
+    if content == previous:
+        return []
+
+    revisions = NoteRevision.objects.using(using).filter(note=note)
+    last = revisions.order_by("-number").values_list("number", flat=True).first()
+
+    new = []
+    if last is None:
+        last = 0
+        if previous is not None:
+            # The content before the first edit, as of the last save before it.
+            new.append(NoteRevision(
+                note=note, number=1, is_snapshot=True, data=previous,
+                created_at=getattr(note, "_stored_updated_at", None) or note.created_at,
+            ))
+            last = 1
+
+    number = last + 1
+    snapshot = previous is None or is_snapshot_number(number)
+    new.append(NoteRevision(
+        note=note,
+        number=number,
+        is_snapshot=snapshot,
+        data=content if snapshot else diff_content(previous, content),
+        created_at=note.updated_at or timezone.now(),
+    ))
+    return NoteRevision.objects.using(using).bulk_create(new)
+
+
+def get_revision_content(note, number):
+    """
+    The content of ``note`` as of revision ``number``, or ``None`` if there
+    is no such revision. Reads the nearest snapshot and the diffs after it
+    in one query.
+    """
+    revisions = NoteRevision.objects.filter(note=note)
+    snapshot = (
+        revisions.filter(number__lte=number, is_snapshot=True)
+        .order_by("-number").values("number")[:1]
+    )
+    chain = revisions.filter(number__gte=Subquery(snapshot), number__lte=number).order_by("number")
+
+    revision = content = None
+    for revision, content in replay(chain):
+        pass
+    if revision is None or revision.number != number:
+        return None
+    return content
+
+
+def get_history(note, before=None, limit=None):
+    """
+    ``(revision, content)`` for the revisions of ``note`` numbered below
+    ``before``, newest first, at most ``limit`` of them.
+
+    Only the shown revisions are replayed, from the nearest snapshot at or
+    before the oldest of them, so a page costs at most one snapshot interval
+    of extra diffs however long the history is.
+    """
+    revisions = NoteRevision.objects.filter(note=note)
+    window = revisions.order_by("-number")
+    if before is not None:
+        window = window.filter(number__lt=before)
+    numbers = list(window.values_list("number", flat=True)[:limit])
+    if not numbers:
+        return []
+
+    newest, oldest = numbers[0], numbers[-1]
+    snapshot = (
+        revisions.filter(number__lte=oldest, is_snapshot=True)
+        .order_by("-number").values("number")[:1]
+    )
+    chain = revisions.filter(number__gte=Subquery(snapshot), number__lte=newest).order_by("number")
+    return [
+        (revision, content) for revision, content in replay(chain)
+        if revision.number >= oldest
+    ][::-1]
@@ -0,0 +1,439 @@
+import re
+import uuid
+import unicodedata
+
+from django.conf import settings
+from django.db import connections, router
+from django.db.models import Case, F, Q, TextField, Value, When
+from django.db.models.functions import (
+    Coalesce, Concat, Greatest, Least, Length, Lower, NullIf, Replace, StrIndex, Substr,
+)
+from django.utils.module_loading import import_string
+
+from .fields import MARKER, decompress
+from .models import Note
+
+
+TERM_RE = re.compile(r"\w+", re.UNICODE)
+
+# What commonly ends the text before a word. SQL has no word boundaries, so
+# excerpts look for a term after a space once these are read as spaces.
+WORD_SEPARATORS = "\n\r\t\"'([{<-/.,;:*#"
+
+
+def parse_terms(query):
+    """
+    Split a raw search string into lower-cased word terms.
+
+    Only word characters survive, so the terms are safe to embed in the
+    MATCH / tsquery syntax of the full-text backends.
+    """
+    return [term.lower() for term in TERM_RE.findall(query or "")]
+
+
+def fold_term(term):
+    """
+    ``term`` without its diacritics, as the FTS5 ``unicode61
+    remove_diacritics 2`` tokenizer indexes and matches it: ``café`` is
+    ``cafe``.
+    """
+    return "".join(
+        char for char in unicodedata.normalize("NFD", term)
+        if not unicodedata.combining(char)
+    )
+
+
+def with_excerpts(notes, terms):
+    """
+    Annotate ``notes`` with the ``excerpt`` of their description around the
+    earliest of ``terms`` that starts a word, as ``Highlighter`` marks them,
+    so search results need not load whole bodies.
+
+    ``excerpt_start`` (1-based) and ``description_length`` locate it in the
+    description. Notes without such a match get its opening; compressed ones
+    get no excerpt (``None``), since the database cannot read into them,
+    until ``add_compressed_excerpts()`` fills it in.
+    """
+    window, length = get_excerpt_size()
+
+    start = Value(1)
+    if terms:
+        missing = Value(2 ** 31 - 1)
+        # With a space in front, " term" at position p is the term at p.
+        words = Lower("description")
+        for separator in WORD_SEPARATORS:
+            words = Replace(words, Value(separator), Value(" "))
+        words = Concat(Value(" "), words, output_field=TextField())
+        positions = [
+            Coalesce(NullIf(StrIndex(words, Value(f" {term}")), Value(0)), missing)
+            for term in terms
+        ]
+        first = NullIf(Least(*positions) if len(positions) > 1 else positions[0], missing)
+        # Start a whole window early, so the snippet around the match can
+        # still be cut back to a word boundary.
+        start = Coalesce(Greatest(first - Value(2 * window), Value(1)), Value(1))
+
+    return notes.for_cards().annotate(
+        excerpt_start=start,
+        excerpt=Case(
+            When(description__startswith=MARKER, then=Value(None)),
+            default=Substr("description", F("excerpt_start"), length),
+            output_field=TextField(),
+        ),
+        description_length=Length("description"),
+    )
+
+
+def get_excerpt_size():
+    """
+    ``(window, length)``: characters of context around a match, and of an excerpt.
+    """
+    return (
+        getattr(settings, "NOTE_SEARCH_SNIPPET_CHARS", 80),
+        getattr(settings, "NOTE_SEARCH_EXCERPT_CHARS", 2000),
+    )
+
+
+def add_compressed_excerpts(notes, terms):
+    """
+    Fill in the excerpts ``with_excerpts()`` left out of ``notes``, cut here
+    the same way from their decompressed descriptions, read in one query.
+    """
+    missing = {note.pk: note for note in notes if note.excerpt is None}
+    if not missing:
+        return
+
+    window, length = get_excerpt_size()
+    patterns = [re.compile(rf"\b{re.escape(term)}", re.IGNORECASE) for term in terms]
+    descriptions = Note.objects.filter(pk__in=missing).values_list("id", "description")
+    for note_id, description in descriptions:
+        text = str(description)
+        matches = [match for match in (pattern.search(text) for pattern in patterns) if match]
+        start = max(min(match.start() for match in matches) - 2 * window, 0) if matches else 0
+
+        note = missing[note_id]
+        note.excerpt = text[start:start + length]
+        note.excerpt_start = start + 1
+        note.description_length = len(text)
+
+
+class BaseSearchBackend:
+    """
+    Interface for the full-text index behind the note search endpoint.
+
+    Backends receive every note write through ``index()`` / ``remove()`` and
+    answer ``search()`` with ``(note_id, score)`` pairs, best match first.
+    Ties are broken on the note id, so ``(score, note_id)`` is a keyset the
+    results can be paged on.
+    """
+
+    def __init__(self, using="default"):
+        self.using = using
+
+    @property
+    def connection(self):
+        return connections[self.using]
+
+    def index(self, note):
+        raise NotImplementedError
+
+    def remove(self, note):
+        raise NotImplementedError
+
+    def remove_many(self, notes):
+        """
+        Drop several notes at once; backends may do it in one statement.
+        """
+        for note in notes:
+            self.remove(note)
+
+    def search(self, owner, query, limit=None, after=None, note_ids=None):
+        """
+        Rank ``owner``'s notes matching ``query``.
+
+        ``after`` is the ``(score, note_id)`` of the last hit already seen;
+        only hits ranked below it are returned, at most ``limit`` of them.
+        ``note_ids`` restricts the search to those notes.
+        """
+        raise NotImplementedError
+
+    def clear(self, owner=None):
+        """
+        Drop every index entry, or only those belonging to ``owner``.
+        """
+        raise NotImplementedError
+
+    def rebuild(self, queryset=None):
+        """
+        Re-index ``queryset`` (every note by default) and return the count.
+        """
+        if queryset is None:
+            queryset = Note.objects.using(self.using).all()
+
+        count = 0
+        for note in queryset.order_by().iterator(chunk_size=500):
+            self.index(note)
+            count += 1
+        return count
+
+
+class LikeSearchBackend(BaseSearchBackend):
+    """
+    Fallback for databases without a native full-text index.
+
+    Every term must appear in the title or description. There is no
+    relevance score to rank hits by, so they all score 0.0 and come in note
+    id order. ``LIKE`` cannot see into compressed descriptions, so those
+    rows are read and matched after decompressing them.
+    """
+
+    def index(self, note):
+        pass
+
+    def remove(self, note):
+        pass
+
+    def remove_many(self, notes):
+        pass
+
+    def clear(self, owner=None):
+        pass
+
+    def rebuild(self, queryset=None):
+        return 0
+
+    def search(self, owner, query, limit=None, after=None, note_ids=None):
+        terms = parse_terms(query)
+        if not terms:
+            return []
+
+        compressed = Q(description__startswith=MARKER)
+        notes = Note.objects.using(self.using).filter(owner=owner)
+        for term in terms:
+            notes = notes.filter(Q(title__icontains=term) | Q(description__icontains=term) | compressed)
+        if note_ids is not None:
+            notes = notes.filter(pk__in=note_ids)
+        if after is not None:
+            score, note_id = after
+            if score < 0.0:
+                return []
+            if score == 0.0:
+                notes = notes.filter(pk__gt=note_id)
+
+        # Only the compressed candidates bring their description along.
+        rows = notes.annotate(
+            stored=Case(When(compressed, then=F("description")), output_field=TextField()),
+        ).order_by("id").values_list("id", "title", "stored")
+
+        hits = []
+        for note_id, title, stored in rows.iterator(chunk_size=500):
+            if stored is not None:
+                text = f"{title}\n{decompress(stored)}".lower()
+                if not all(term in text for term in terms):
+                    continue
+            hits.append((note_id, 0.0))
+            if limit is not None and len(hits) == limit:
+                break
+        return hits
+
+
+class SQLiteFTSBackend(BaseSearchBackend):
+    """
+    SQLite FTS5 index stored in the ``note_note_fts`` virtual table.
+
+    The FTS rowid is derived from the note UUID so updates and deletes hit
+    a single row instead of scanning the index for the matching note id.
+    """
+
+    table = "note_note_fts"
+
+    @staticmethod
+    def rowid(note_id):
+        # Top 63 bits of the UUID: fits a signed 64-bit rowid.
+        return note_id.int >> 65
+
+    @staticmethod
+    def match_expression(terms):
+        # Every term must match, each one as a token prefix.
+        return " ".join(f'"{term}"*' for term in terms)
+
+    def index(self, note):
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT OR REPLACE INTO {self.table} "
+                "(rowid, note_id, owner_id, title, description) "
+                "VALUES (%s, %s, %s, %s, %s)",
+                [
+                    self.rowid(note.pk),
+                    note.pk.hex,
+                    note.owner_id,
+                    note.title,
+                    note.description,
+                ],
+            )
+
+    def remove(self, note):
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {self.table} WHERE rowid = %s",
+                [self.rowid(note.pk)],
+            )
+
+    def remove_many(self, notes):
+        rowids = [self.rowid(note.pk) for note in notes]
+        if not rowids:
+            return
+        placeholders = ", ".join(["%s"] * len(rowids))
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table} WHERE rowid IN ({placeholders})", rowids)
+
+    def clear(self, owner=None):
+        with self.connection.cursor() as cursor:
+            if owner is None:
+                cursor.execute(f"DELETE FROM {self.table}")
+            else:
+                cursor.execute(f"DELETE FROM {self.table} WHERE owner_id = %s", [owner.pk])
+
+    def search(self, owner, query, limit=None, after=None, note_ids=None):
+        terms = parse_terms(query)
+        if not terms:
+            return []
+        if note_ids is not None and not note_ids:
+            return []
+
+        # bm25() is lower-is-better; title matches weigh ten times more.
+        sql = (
+            f"SELECT note_id, -bm25({self.table}, 10.0, 1.0) AS score "
+            f"FROM {self.table} "
+            f"WHERE {self.table} MATCH %s AND owner_id = %s"
+        )
+        params = [self.match_expression(terms), owner.pk]
+        if note_ids is not None:
+            sql += f" AND rowid IN ({', '.join(['%s'] * len(note_ids))})"
+            params.extend(self.rowid(note_id) for note_id in note_ids)
+
+        sql = f"SELECT note_id, score FROM ({sql})"
+        if after is not None:
+            score, note_id = after
+            sql += " WHERE score < %s OR (score = %s AND note_id > %s)"
+            params.extend([score, score, note_id.hex])
+        sql += " ORDER BY score DESC, note_id"
+        if limit is not None:
+            sql += " LIMIT %s"
+            params.append(limit)
+
+        with self.connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return [(uuid.UUID(note_id), score) for note_id, score in cursor.fetchall()]
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    """
+    PostgreSQL ``tsvector`` index stored in ``note_note_search`` (GIN).
+    """
+
+    table = "note_note_search"
+
+    @property
+    def config(self):
+        return getattr(settings, "NOTE_SEARCH_CONFIG", "english")
+
+    @staticmethod
+    def tsquery(terms):
+        return " & ".join(f"{term}:*" for term in terms)
+
+    def index(self, note):
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {self.table} (note_id, owner_id, document) "
+                "VALUES (%s, %s, "
+                "setweight(to_tsvector(%s::regconfig, %s), 'A') || "
+                "setweight(to_tsvector(%s::regconfig, %s), 'B')) "
+                "ON CONFLICT (note_id) DO UPDATE "
+                "SET owner_id = EXCLUDED.owner_id, document = EXCLUDED.document",
+                [
+                    note.pk,
+                    note.owner_id,
+                    self.config,
+                    note.title,
+                    self.config,
+                    note.description,
+                ],
+            )
+
+    def remove(self, note):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table} WHERE note_id = %s", [note.pk])
+
+    def remove_many(self, notes):
+        note_ids = [note.pk for note in notes]
+        if not note_ids:
+            return
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table} WHERE note_id = ANY(%s)", [note_ids])
+
+    def clear(self, owner=None):
+        with self.connection.cursor() as cursor:
+            if owner is None:
+                cursor.execute(f"DELETE FROM {self.table}")
+            else:
+                cursor.execute(f"DELETE FROM {self.table} WHERE owner_id = %s", [owner.pk])
+
+    def search(self, owner, query, limit=None, after=None, note_ids=None):
+        terms = parse_terms(query)
+        if not terms:
+            return []
+
+        sql = (
+            "SELECT note_id, ts_rank(document, query) AS score "
+            f"FROM {self.table}, to_tsquery(%s::regconfig, %s) AS query "
+            "WHERE owner_id = %s AND document @@ query"
+        )
+        params = [self.config, self.tsquery(terms), owner.pk]
+        if note_ids is not None:
+            sql += " AND note_id = ANY(%s)"
+            params.append(list(note_ids))
+
+        sql = f"SELECT note_id, score FROM ({sql}) AS hits"
+        if after is not None:
+            score, note_id = after
+            sql += " WHERE score < %s OR (score = %s AND note_id > %s)"
+            params.extend([score, score, note_id])
+        sql += " ORDER BY score DESC, note_id"
+        if limit is not None:
+            sql += " LIMIT %s"
+            params.append(limit)
+
+        with self.connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
+
+VENDOR_BACKENDS = {
+    "sqlite": SQLiteFTSBackend,
+    "postgresql": PostgresSearchBackend,
+}
+
+_backends = {}
+
+
+def get_search_backend(using=None):
+    """
+    Return the search backend for the database alias ``using``.
+
+    ``settings.NOTE_SEARCH_BACKEND`` may name a backend class by dotted path;
+    otherwise one is picked from the database vendor.
+    """
+    if using is None:
+        using = router.db_for_write(Note)
+
+    if using not in _backends:
+        backend_path = getattr(settings, "NOTE_SEARCH_BACKEND", None)
+        if backend_path:
+            backend_class = import_string(backend_path)
+        else:
+            vendor = connections[using].vendor
+            backend_class = VENDOR_BACKENDS.get(vendor, LikeSearchBackend)
+        _backends[using] = backend_class(using=using)
+
+    return _backends[using]
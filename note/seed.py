@@ -0,0 +1,110 @@
+import random
+from itertools import islice
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+from django.contrib.auth.hashers import make_password
+
+from accounts.models import User
+
+from . import stats
+from .models import Note
+from .search import get_search_backend
+from .cache import get_search_cache
+
+
+WORDS = (
+    "meeting agenda budget review project deadline grocery list milk eggs bread "
+    "call dentist appointment ideas draft chapter outline release notes bug fix "
+    "deploy server backup travel flight hotel booking recipe pasta garlic onion "
+    "workout plan running stretch reading book summary quote invoice payment tax "
+    "birthday gift party guest weekend trip garden plant water schedule team "
+    "retro sprint design mockup feedback client email reply follow up research "
+    "paper reference lecture exam study habit journal morning evening reminder"
+).split()
+
+SEED_EMAIL = "seed-{}@example.com"
+SEED_PASSWORD = "seed-password"
+
+
+def sentence(rng, min_words, max_words):
+    words = rng.choices(WORDS, k=rng.randint(min_words, max_words))
+    return " ".join(words).capitalize()
+
+
+def description(rng, median_chars=250, max_chars=20000):
+    """
+    A body whose length is log-normally spread around ``median_chars``:
+    mostly short notes with a long tail of long ones, like real note apps.
+    """
+    target = min(int(rng.lognormvariate(0, 1.0) * median_chars), max_chars)
+    parts = []
+    length = 0
+    while length < target:
+        part = sentence(rng, 4, 16) + "."
+        parts.append(part)
+        length += len(part) + 1
+    return " ".join(parts)
+
+
+def build_notes(owner, count, rng, days=365, favourite_ratio=0.2):
+    """
+    Yield unsaved notes for ``owner`` with timestamps spread over ``days``.
+    """
+    now = timezone.now()
+    span = timedelta(days=days).total_seconds()
+
+    for _ in range(count):
+        created_at = now - timedelta(seconds=rng.uniform(0, span))
+        updated_at = created_at + (now - created_at) * rng.random() ** 3
+        yield Note(
+            owner=owner,
+            title=sentence(rng, 2, 8),
+            description=description(rng),
+            is_favourite=rng.random() < favourite_ratio,
+            created_at=created_at,
+            updated_at=updated_at,
+        )
+
+
+def seed_notes(users, notes_per_user, days=365, seed=None, batch_size=500, first_user=1):
+    """
+    Create ``users`` users with ``notes_per_user`` notes each; return the users.
+
+    Seed users are ``seed-<n>@example.com`` with password ``SEED_PASSWORD``
+    and are reused if they already exist. Notes are written with
+    ``bulk_create``, so their owners' search index and stats are rebuilt
+    once afterwards.
+    """
+    rng = random.Random(seed)
+    password = make_password(SEED_PASSWORD)
+    emails = [SEED_EMAIL.format(n) for n in range(first_user, first_user + users)]
+
+    existing = set(User.objects.filter(email__in=emails).values_list("email", flat=True))
+    User.objects.bulk_create(
+        User(email=email, first_name=f"Seed {email.split('@')[0][5:]}", password=password)
+        for email in emails
+        if email not in existing
+    )
+    owners = list(User.objects.filter(email__in=emails).order_by("pk"))
+
+    backend = get_search_backend()
+    for owner in owners:
+        notes = build_notes(owner, notes_per_user, rng, days=days)
+
+        with transaction.atomic():
+            while batch := list(islice(notes, batch_size)):
+                stamps = [(note.created_at, note.updated_at) for note in batch]
+                Note.objects.bulk_create(batch)
+
+                # bulk_create applies auto_now(_add); put the spread timestamps back.
+                for note, (created_at, updated_at) in zip(batch, stamps):
+                    note.created_at, note.updated_at = created_at, updated_at
+                Note.objects.bulk_update(batch, ["created_at", "updated_at"])
+
+            backend.rebuild(Note.objects.filter(owner=owner))
+            stats.rebuild_note_stats(owner.pk)
+        get_search_cache().invalidate(owner.pk)
+
+    return owners
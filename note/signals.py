@@ -0,0 +1,110 @@
+from django.dispatch import receiver
+from django.core.signals import setting_changed
+from django.db.models.signals import post_save, post_delete
+
+from . import cache, events, revisions, search, stats
+from .cache import invalidate_note_item, get_search_cache
+from .models import REVISIONED_FIELDS, Note
+
+
+INDEXED_FIELDS = {"title", "description", "owner"}
+
+
+@receiver(post_save, sender=Note)
+def index_note(sender, instance, raw=False, using=None, update_fields=None, **kwargs):
+    """
+    Keep the full-text index in step with created and updated notes.
+    """
+    if raw:
+        return
+    if update_fields and not INDEXED_FIELDS.intersection(update_fields):
+        return
+    search.get_search_backend(using).index(instance)
+
+
+@receiver(post_delete, sender=Note)
+def unindex_note(sender, instance, using=None, **kwargs):
+    """
+    Drop deleted notes from the full-text index.
+    """
+    search.get_search_backend(using).remove(instance)
+
+
+@receiver(post_save, sender=Note)
+@receiver(post_delete, sender=Note)
+def invalidate_note_item_fragment(sender, instance, **kwargs):
+    """
+    Drop the card cached under the note's previous key, which the write
+    leaves unreachable.
+    """
+    invalidate_note_item(instance)
+
+
+@receiver(post_save, sender=Note)
+@receiver(post_delete, sender=Note)
+def invalidate_search_cache(sender, instance, **kwargs):
+    """
+    Any write may change which notes match, so drop the owner's cached searches.
+    """
+    get_search_cache().invalidate(instance.owner_id)
+
+
+@receiver(post_save, sender=Note)
+def update_stats_on_save(sender, instance, created, raw=False, **kwargs):
+    """
+    Fold the write into the owner's NoteStats rollup.
+    """
+    if raw:
+        return
+    stats.note_saved(instance, created)
+
+
+@receiver(post_delete, sender=Note)
+def update_stats_on_delete(sender, instance, **kwargs):
+    stats.note_deleted(instance)
+
+
+@receiver(post_save, sender=Note)
+def record_note_revision(sender, instance, created, raw=False, using=None, update_fields=None, **kwargs):
+    """
+    Keep edited content as the note's next revision, in the saving transaction.
+    """
+    if raw or created:
+        return
+    if update_fields and not set(REVISIONED_FIELDS).intersection(update_fields):
+        return
+    revisions.record_revision(instance, getattr(instance, "_stored_content", None), using=using)
+
+
+@receiver(post_save, sender=Note)
+def publish_note_saved(sender, instance, created, raw=False, using=None, **kwargs):
+    """
+    Tell the owner's open pages about the write once it commits.
+    """
+    if raw:
+        return
+    event_type = events.CREATED if created else events.UPDATED
+    events.publish_note_event(instance.owner_id, event_type, [instance.pk], using=using)
+
+
+@receiver(post_delete, sender=Note)
+def publish_note_deleted(sender, instance, using=None, **kwargs):
+    events.publish_note_event(instance.owner_id, events.DELETED, [instance.pk], using=using)
+
+
+@receiver(setting_changed)
+def reset_note_events_broker(setting, **kwargs):
+    if setting in ("NOTE_EVENTS_BROKER", "NOTE_EVENTS_MAX_QUEUED"):
+        events._brokers.clear()
+
+
+@receiver(setting_changed)
+def reset_search_backends(setting, **kwargs):
+    if setting in ("NOTE_SEARCH_BACKEND", "NOTE_SEARCH_CONFIG", "DATABASES"):
+        search._backends.clear()
+
+
+@receiver(setting_changed)
+def reset_search_cache(setting, **kwargs):
+    if setting.startswith("NOTE_SEARCH_CACHE_"):
+        cache._search_cache = None
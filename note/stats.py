@@ -0,0 +1,224 @@
+from datetime import timedelta
+from collections import Counter
+
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+from django.db import IntegrityError, connections, router, transaction
+from django.utils import timezone
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Greatest, TruncDate
+
+from .models import Note, NoteStats, NoteDailyStats
+
+
+def rebuild_note_stats(owner_id):
+    """
+    Recompute a user's rollup and daily buckets from their notes.
+    """
+    notes = Note.objects.filter(owner_id=owner_id)
+
+    with transaction.atomic():
+        totals = notes.aggregate(
+            total=Count("id"),
+            favourites=Count("id", filter=Q(is_favourite=True)),
+        )
+        latest = notes.order_by("-updated_at", "-id").only("id", "updated_at").first()
+
+        stats, _ = NoteStats.objects.update_or_create(
+            owner_id=owner_id,
+            defaults={
+                "total_notes": totals["total"],
+                "favourite_notes": totals["favourites"],
+                "last_updated": latest,
+                "last_updated_at": latest.updated_at if latest else None,
+                "modified_at": timezone.now(),
+            },
+        )
+
+        NoteDailyStats.objects.filter(owner_id=owner_id).delete()
+        NoteDailyStats.objects.bulk_create(
+            NoteDailyStats(owner_id=owner_id, day=row["day"], created=row["created"])
+            for row in (
+                notes.order_by()
+                .annotate(day=TruncDate("created_at"))
+                .values("day")
+                .annotate(created=Count("id"))
+            )
+        )
+
+    return stats
+
+
+def get_note_stats(owner):
+    """
+    Return the rollup for ``owner``, building it on first access.
+    """
+    try:
+        return NoteStats.objects.select_related("last_updated").get(owner=owner)
+    except NoteStats.DoesNotExist:
+        return rebuild_note_stats(owner.pk)
+
+
+async def aget_note_stats(owner):
+    """
+    Async ``get_note_stats``; a missing rollup is still built in a transaction
+    on a worker thread.
+    """
+    try:
+        return await NoteStats.objects.select_related("last_updated").aget(owner=owner)
+    except NoteStats.DoesNotExist:
+        return await sync_to_async(rebuild_note_stats)(owner.pk)
+
+
+def get_daily_stats(owner, days=None):
+    """
+    Return the daily creation buckets for the last ``days`` days.
+    """
+    days = days or getattr(settings, "NOTE_STATS_CHART_DAYS", 90)
+    since = timezone.localdate() - timedelta(days=days - 1)
+    return NoteDailyStats.objects.filter(owner=owner, day__gte=since).order_by("day")
+
+
+def _bump_daily(owner_id, day, delta):
+    if delta < 0:
+        NoteDailyStats.objects.filter(owner_id=owner_id, day=day).update(
+            created=Greatest(F("created") + delta, 0)
+        )
+        return
+
+    # Two first notes of the day would both miss an UPDATE and then race on
+    # the (owner, day) constraint; a single upsert cannot.
+    using = router.db_for_write(NoteDailyStats)
+    connection = connections[using]
+    if not connection.features.supports_update_conflicts_with_target:
+        try:
+            with transaction.atomic(using=using):
+                NoteDailyStats.objects.using(using).create(owner_id=owner_id, day=day, created=delta)
+        except IntegrityError:
+            NoteDailyStats.objects.using(using).filter(owner_id=owner_id, day=day).update(
+                created=F("created") + delta
+            )
+        return
+
+    opts = NoteDailyStats._meta
+    table = connection.ops.quote_name(opts.db_table)
+    owner, day_column, created = (
+        connection.ops.quote_name(opts.get_field(name).column) for name in ("owner", "day", "created")
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} ({owner}, {day_column}, {created}) VALUES (%s, %s, %s) "
+            f"ON CONFLICT ({owner}, {day_column}) "
+            f"DO UPDATE SET {created} = {table}.{created} + EXCLUDED.{created}",
+            [owner_id, connection.ops.adapt_datefield_value(day), delta],
+        )
+
+
+def note_saved(note, created):
+    """
+    Apply a single note write to its owner's rollup.
+
+    Runs inside the transaction that saved the note.
+    """
+    changes = {"modified_at": timezone.now()}
+    previous = getattr(note, "_stored_is_favourite", None)
+
+    if created:
+        changes["total_notes"] = F("total_notes") + 1
+        if note.is_favourite:
+            changes["favourite_notes"] = F("favourite_notes") + 1
+    elif previous is not None and previous != note.is_favourite:
+        delta = 1 if note.is_favourite else -1
+        changes["favourite_notes"] = Greatest(F("favourite_notes") + delta, 0)
+    elif previous is None:
+        # The stored flag was not loaded; recount instead of guessing.
+        changes["favourite_notes"] = (
+            Note.objects.filter(owner_id=note.owner_id, is_favourite=True).count()
+        )
+
+    if not NoteStats.objects.filter(owner_id=note.owner_id).update(**changes):
+        # First write since the rollup was introduced: count everything once.
+        rebuild_note_stats(note.owner_id)
+        return
+
+    if created:
+        _bump_daily(note.owner_id, timezone.localdate(note.created_at), 1)
+
+    # Move the last-updated pointer forward, never back.
+    NoteStats.objects.filter(
+        Q(last_updated_at__isnull=True) | Q(last_updated_at__lte=note.updated_at),
+        owner_id=note.owner_id,
+    ).update(last_updated=note, last_updated_at=note.updated_at)
+
+
+def notes_updated(owner_id, notes):
+    """
+    Apply a bulk content update of ``owner_id``'s ``notes`` that skipped
+    ``save()`` to their rollup.
+    """
+    if not notes:
+        return
+    if not NoteStats.objects.filter(owner_id=owner_id).update(modified_at=timezone.now()):
+        rebuild_note_stats(owner_id)
+        return
+
+    latest = max(notes, key=lambda note: (note.updated_at, note.pk))
+    NoteStats.objects.filter(
+        Q(last_updated_at__isnull=True) | Q(last_updated_at__lte=latest.updated_at),
+        owner_id=owner_id,
+    ).update(last_updated=latest, last_updated_at=latest.updated_at)
+
+
+def note_deleted(note):
+    """
+    Remove a deleted note from its owner's rollup.
+    """
+    notes_deleted(note.owner_id, [note])
+
+
+def notes_deleted(owner_id, notes):
+    """
+    Remove a batch of deleted notes from their owner's rollup.
+
+    Missing rollups are left alone: the owner may be being deleted too.
+    """
+    if not notes:
+        return
+
+    favourites = sum(1 for note in notes if note.is_favourite)
+    changes = {
+        "total_notes": Greatest(F("total_notes") - len(notes), 0),
+        "deleted_notes": F("deleted_notes") + len(notes),
+        "modified_at": timezone.now(),
+    }
+    if favourites:
+        changes["favourite_notes"] = Greatest(F("favourite_notes") - favourites, 0)
+
+    if not NoteStats.objects.filter(owner_id=owner_id).update(**changes):
+        return
+
+    days = Counter(timezone.localdate(note.created_at) for note in notes)
+    for day, count in days.items():
+        _bump_daily(owner_id, day, -count)
+
+    # Deleting the pointed-to note nulls the pointer; point at the next newest.
+    latest = Note.objects.filter(owner_id=OuterRef("owner_id")).order_by("-updated_at", "-id")
+    NoteStats.objects.filter(owner_id=owner_id, last_updated__isnull=True).update(
+        last_updated=Subquery(latest.values("id")[:1]),
+        last_updated_at=Subquery(latest.values("updated_at")[:1]),
+    )
+
+
+def favourites_changed(owner_id, delta):
+    """
+    Apply ``delta`` favourites set by a bulk update that skipped ``save()``.
+    """
+    if not delta:
+        return
+    updated = NoteStats.objects.filter(owner_id=owner_id).update(
+        favourite_notes=Greatest(F("favourite_notes") + delta, 0),
+        modified_at=timezone.now(),
+    )
+    if not updated:
+        rebuild_note_stats(owner_id)
@@ -0,0 +1,22 @@
+from django import template
+from django.template.loader import render_to_string
+
+from ..cache import NOTE_ITEM_TEMPLATE, render_note_item
+
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def note_item(context, note):
+    """
+    Render ``note_item.html`` for ``note`` through the per-note fragment cache.
+
+    Search hits carry highlighted text, so they bypass the cache.
+    """
+    if getattr(note, "is_highlighted", False):
+        return render_to_string(
+            NOTE_ITEM_TEMPLATE,
+            {"note": note, "csrf_token": context.get("csrf_token", "")},
+        )
+    return render_note_item(note, context.get("csrf_token", ""))
@@ -1,3 +1,1493 @@
-from django.test import TestCase
+import io
+import csv
+import json
+import uuid
+import asyncio
+import zipfile
+from datetime import timedelta
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import DatabaseError, connection, transaction
+from django.db.models import CASCADE, SET_NULL
+from django.db.models.signals import post_delete
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.urls import resolve, reverse
+from django.utils import timezone
+from django.test import AsyncRequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from accounts.models import User
+from dashboard.async_views import DashboardView
+
+from . import async_views, bulk, events, stats
+from .cache import (
+    UPDATED_AT_MARKER, SearchResultCache, get_fragment_cache, get_search_cache, note_item_cache_key,
+    render_note_item, search_notes,
+)
+from .export import EXPORT_FIELDS, NDJSONExporter
+from .fields import CompressedText
+from .highlight import Highlighter
+from .importer import PARSERS, ImportFailed, import_notes
+from .management.commands.benchmark_async import serving
+from .managers import NoteQuerySet
+from .models import PREVIEW_LENGTH, Note, NoteDailyStats, NoteRevision, NoteStats, make_preview
+from .revisions import (
+    diff_content, diff_text, get_history, get_revision_content, patch_content, patch_text,
+)
+from .search import get_search_backend
+from .stats import rebuild_note_stats
+from .views import NoteEventStreamView
+
+
+# The manifest storage needs collectstatic; tests render against the sources.
+TEST_STORAGES = {
+    **settings.STORAGES,
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+}
+
+
+class ClearCacheMixin:
+    """
+    Start every test with an empty default cache.
+
+    The cache is not rolled back with the database when a test ends, so
+    without this a test could pass or fail on entries an earlier one left,
+    such as the readiness of a content-addressed avatar that an identical
+    upload maps to again.
+    """
+
+    def setUp(self):
+        super().setUp()
+        caches["default"].clear()
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+@skipUnless(connection.vendor == "sqlite", "EXPLAIN QUERY PLAN is SQLite specific.")
+class NoteQueryPlanTests(TestCase):
+    """
+    Every note query issued by the views must be answered from an index.
+
+    A plan line that scans ``note_note`` or builds a temp B-tree to sort
+    means an access pattern lost its index and will degrade with note count.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("owner@example.com", "s3cret-pass!")
+        other = User.objects.create_user("other@example.com", "s3cret-pass!")
+
+        for i in range(30):
+            Note.objects.create(
+                owner=cls.user if i % 3 else other,
+                title=f"Meeting {i}",
+                description="Agenda and budget review",
+                is_favourite=bool(i % 2),
+            )
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+            return [row[-1] for row in cursor.fetchall()]
+
+    def assertIndexedNoteQueries(self, url, method="get", exclude=()):
+        with CaptureQueriesContext(connection) as ctx:
+            response = getattr(self.client, method)(url)
+        self.assertLess(response.status_code, 400)
+
+        checked = 0
+        for query in ctx.captured_queries:
+            sql = query["sql"]
+            if not sql.startswith("SELECT") or '"note_note"' not in sql:
+                continue
+            if any(marker in sql for marker in exclude):
+                continue
+
+            checked += 1
+            for detail in self.explain(sql):
+                if "note_note_fts" in detail:
+                    continue
+                with self.subTest(url=url, sql=sql):
+                    self.assertNotIn("TEMP B-TREE", detail)
+                    if "note_note" in detail:
+                        self.assertTrue(detail.startswith("SEARCH"), detail)
+
+        self.assertGreater(checked, 0, f"No note queries captured for {url}")
+
+    def test_note_list(self):
+        self.assertIndexedNoteQueries(reverse("note:note_list"))
+
+    def test_note_list_next_page(self):
+        with self.settings(NOTE_PAGE_SIZE=5):
+            response = self.client.get(reverse("note:note_list"))
+            next_url = response.context["notes"].next_url
+            self.assertIndexedNoteQueries(next_url)
+
+    def test_favourite_list(self):
+        self.assertIndexedNoteQueries(reverse("note:note_favorite_list", args=[1]))
+        self.assertIndexedNoteQueries(reverse("note:note_favorite_list", args=[0]))
+
+    def test_search(self):
+        self.assertIndexedNoteQueries(reverse("note:note_search") + "?search=meet")
+        self.assertIndexedNoteQueries(reverse("note:note_search"))
+
+    def test_dashboard(self):
+        # The per-day chart groups on an expression, which always sorts.
+        self.assertIndexedNoteQueries(
+            reverse("dashboard:dashboard"),
+            exclude=("django_datetime_cast_date",),
+        )
+
+
+@override_settings(NOTE_COMPRESSION_MIN_LENGTH=1000, NOTE_COMPRESSION_CODEC="zlib")
+class CompressedDescriptionTests(TestCase):
+    """
+    Long descriptions are stored compressed and read back unchanged, and
+    only decompressed when the attribute is read.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("owner@example.com", "s3cret-pass!")
+
+    def stored(self, note):
+        return Note.objects.filter(pk=note.pk).values_list("description", flat=True).get()
+
+    def test_long_description_round_trip(self):
+        text = "Agenda and budget review for the quarterly planning meeting. " * 50
+        note = Note.objects.create(owner=self.user, title="Long", description=text)
+
+        stored = self.stored(note)
+        self.assertIsInstance(stored, CompressedText)
+        self.assertLess(len(stored.stored), len(text) // 4)
+
+        loaded = Note.objects.get(pk=note.pk)
+        self.assertIsInstance(loaded.__dict__["description"], CompressedText)
+        self.assertEqual(loaded.preview, make_preview(text))
+        self.assertEqual(loaded.description, text)
+        self.assertEqual(loaded.__dict__["description"], text)
+
+        # Saving without reading it keeps the stored value as it was.
+        loaded = Note.objects.get(pk=note.pk)
+        loaded.title = "Renamed"
+        loaded.save()
+        self.assertEqual(self.stored(loaded).stored, stored.stored)
+
+    def test_short_description_stored_as_is(self):
+        for text in ["Milk", "\x01Not a format marker"]:
+            with self.subTest(text=text):
+                note = Note.objects.create(owner=self.user, title="Short", description=text)
+                self.assertEqual(Note.objects.get(pk=note.pk).description, text)
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class SearchIndexTests(ClearCacheMixin, TestCase):
+    """
+    The full-text index follows every note write: edited notes match their
+    new words only, and deleted notes match nothing.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("owner@example.com", "s3cret-pass!")
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+        self.note = Note.objects.create(owner=self.user, title="Groceries", description="Milk and eggs")
+
+    def matches(self, query):
+        return [note_id for note_id, score in get_search_backend().search(self.user, query)]
+
+    def test_created(self):
+        self.assertEqual(self.matches("groceries milk"), [self.note.pk])
+
+    def test_edited(self):
+        response = self.client.post(
+            reverse("note:note_edit", args=[self.note.pk]), {"title": "Hardware", "description": "Nails and glue"},
+        )
+        self.assertEqual(response.status_code, 201)
+        for query in ("groceries", "milk"):
+            self.assertEqual(self.matches(query), [])
+        self.assertEqual(self.matches("hardware nails"), [self.note.pk])
+
+        self.note.refresh_from_db()
+        self.note.title = "Workshop"
+        self.note.save(update_fields=["title"])
+        self.assertEqual(self.matches("hardware"), [])
+        self.assertEqual(self.matches("workshop glue"), [self.note.pk])
+
+    def test_deleted(self):
+        other = Note.objects.create(owner=self.user, title="Groceries for the party")
+
+        response = self.client.post(reverse("note:note_delete", args=[self.note.pk]))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.matches("groceries"), [other.pk])
+        self.assertEqual(self.matches("milk"), [])
+
+        other.delete()
+        self.assertEqual(self.matches("groceries"), [])
+
+
+@override_settings(STORAGES=TEST_STORAGES, NOTE_PAGE_SIZE=4)
+class RankedSearchPaginationTests(ClearCacheMixin, TestCase):
+    """
+    Search results page on ``(score, id)``: every match is listed once, in
+    rank order, and each page asks the backend for one page of hits only.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("owner@example.com", "s3cret-pass!")
+        for i in range(11):
+            # Repeating the term in some titles spreads the scores out.
+            Note.objects.create(owner=cls.user, title="meeting " * (i % 3 + 1), description=f"Agenda {i}")
+        Note.objects.create(owner=cls.user, title="Groceries", description="Milk")
+
+    def setUp(self):
+        super().setUp()
+        get_search_cache().invalidate(self.user.pk)
+        self.client.force_login(self.user)
+
+    def search_pages(self, query):
+        url = reverse("note:note_search") + f"?search={query}"
+        pages, statuses = [], []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            pages.append([note.pk for note in response.context["notes"]])
+            statuses.append(response["X-Search-Cache"])
+            url = response.context["notes"].next_url
+        return pages, statuses
+
+    def expected(self, query):
+        return [note_id for note_id, score in get_search_backend().search(self.user, query)]
+
+    def test_pages_from_the_cache(self):
+        pages, statuses = self.search_pages("meet")
+        self.assertEqual([len(page) for page in pages], [4, 4, 3])
+        self.assertEqual(sum(pages, []), self.expected("meet"))
+        self.assertEqual(statuses, ["miss", "hit", "hit"])
+
+    @override_settings(NOTE_SEARCH_CACHE_MAX_HITS=5)
+    def test_pages_from_the_backend(self):
+        pages, statuses = self.search_pages("meet")
+        self.assertEqual(sum(pages, []), self.expected("meet"))
+        self.assertEqual(set(statuses), {"miss"})
+
+    @override_settings(NOTE_SEARCH_CACHE_MAX_HITS=5)
+    def test_later_pages_are_bounded(self):
+        hits = get_search_backend().search(self.user, "meet", limit=5)
+        with CaptureQueriesContext(connection) as ctx:
+            page = get_search_backend().search(self.user, "meet", limit=5, after=hits[3][::-1])
+        self.assertEqual(page[0], hits[4])
+        self.assertIn("LIMIT", ctx.captured_queries[-1]["sql"])
+        self.assertEqual(len(page), 5)
+
+
+class HighlighterTests(SimpleTestCase):
+    """
+    Search terms are marked as word prefixes in escaped text, and long
+    bodies are cut down to windows around the matches.
+    """
+
+    def test_highlight_marks_prefixes_and_escapes(self):
+        highlighter = Highlighter(["meet", "meeting", "b"])
+        self.assertEqual(
+            highlighter.highlight("Meetings <b>about</b> budgets"),
+            "<mark>Meetings</mark> &lt;<mark>b</mark>&gt;about&lt;/<mark>b</mark>&gt; <mark>budgets</mark>",
+        )
+        self.assertEqual(highlighter.highlight("ameet"), "ameet")
+
+    def test_highlight_without_terms(self):
+        self.assertEqual(Highlighter([]).highlight("<b>"), "<b>")
+
+    def test_snippets_follow_matches_not_length(self):
+        highlighter = Highlighter(["budget"], window=20, max_snippets=2)
+        filler = "lorem ipsum " * 500
+        text = f"{filler}budget one {filler}budget two {filler}budget three {filler}"
+
+        snippets = highlighter.snippets(text)
+        self.assertEqual(snippets.count("<mark>budget</mark>"), 2)
+        self.assertNotIn("three", snippets)
+        self.assertEqual(snippets.count("…"), 4)
+        self.assertLess(len(snippets), 200)
+
+    def test_snippets_merge_close_matches(self):
+        highlighter = Highlighter(["a"], window=10)
+        self.assertEqual(highlighter.snippets("an apple"), "<mark>an</mark> <mark>apple</mark>")
+
+    def test_snippets_without_matches_give_the_opening(self):
+        highlighter = Highlighter(["budget"], window=5)
+        self.assertEqual(highlighter.snippets("plain words and more words"), "plain words…")
+
+    def test_snippets_of_an_excerpt(self):
+        highlighter = Highlighter(["budget"], window=50)
+        self.assertEqual(
+            highlighter.snippets("the budget", offset=100, length=200),
+            "…the <mark>budget</mark>…",
+        )
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class NoteDeltaResponseTests(ClearCacheMixin, TestCase):
+    """
+    Create, update and delete answer with the changed card only, plus the
+    out-of-band swaps for the empty-state placeholder.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("owner@example.com", "s3cret-pass!")
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+
+    def create(self, title):
+        return self.client.post(reverse("note:note_create"), {"title": title, "description": "Milk"})
+
+    def test_create(self):
+        response = self.create("Groceries")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response["HX-Reswap"], "afterbegin")
+        self.assertEqual(response["HX-Retarget"], "#note-list")
+        note = Note.objects.get(owner=self.user)
+        self.assertContains(response, f'id="note-{note.pk}"', status_code=201)
+        self.assertContains(response, 'id="note-list-empty" hx-swap-oob="delete"', status_code=201)
+
+        response = self.create("Chores")
+        self.assertNotContains(response, "note-list-empty", status_code=201)
+        self.assertEqual(response.content.count(b'class="note-item'), 1)
+
+    def test_invalid_create(self):
+        response = self.client.post(reverse("note:note_create"), {"title": ""})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response["HX-Retarget"], "#note-create-form")
+
+    def test_update(self):
+        note = Note.objects.create(owner=self.user, title="Groceries", description="Milk")
+        response = self.client.post(
+            reverse("note:note_edit", args=[note.pk]), {"title": "Shopping", "description": "Milk"},
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response["HX-Reswap"], "outerHTML")
+        self.assertEqual(response["HX-Retarget"], f"#note-{note.pk}")
+        self.assertContains(response, "Shopping", status_code=201)
+
+    def test_delete(self):
+        first, last = [Note.objects.create(owner=self.user, title=title) for title in ["One", "Two"]]
+
+        response = self.client.post(reverse("note:note_delete", args=[first.pk]))
+        self.assertContains(response, f'id="note-{first.pk}" hx-swap-oob="delete"', status_code=201)
+        self.assertNotContains(response, "note-list-empty", status_code=201)
+
+        response = self.client.post(reverse("note:note_delete", args=[last.pk]))
+        self.assertContains(response, 'hx-swap-oob="beforeend:#note-list"', status_code=201)
+        self.assertContains(response, 'id="note-list-empty"', status_code=201)
+        self.assertFalse(Note.objects.filter(owner=self.user).exists())
+
+    def test_other_owners_note(self):
+        other = User.objects.create_user("other@example.com", "s3cret-pass!")
+        note = Note.objects.create(owner=other, title="Private")
+        self.assertEqual(self.client.post(reverse("note:note_delete", args=[note.pk])).status_code, 404)
+        self.assertTrue(Note.objects.filter(pk=note.pk).exists())
+
+
+class NoteItemCacheTests(TestCase):
+    """
+    Cached cards are keyed on everything they render, so a write made in
+    another process is never served from a stale entry.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("owner@example.com", "s3cret-pass!")
+
+    def setUp(self):
+        get_fragment_cache().clear()
+
+    def render(self, note):
+        return render_note_item(Note.objects.for_cards().get(pk=note.pk))
+
+    def test_favourite_toggle_without_invalidation(self):
+        note = Note.objects.create(owner=self.user, title="Groceries")
+        self.assertNotIn("note-fav", self.render(note))
+
+        # A plain UPDATE, as if toggled in another process: nothing is deleted.
+        Note.objects.filter(pk=note.pk).update(is_favourite=True)
+        self.assertIn("note-fav", self.render(note))
+        Note.objects.filter(pk=note.pk).update(is_favourite=False)
+        self.assertNotIn("note-fav", self.render(note))
+
+    def test_edit(self):
+        note = Note.objects.create(owner=self.user, title="Groceries")
+        self.render(note)
+        note.title = "Shopping"
+        note.save()
+        self.assertIn("Shopping", self.render(note))
+
+    def test_writes_evict_the_previous_entry(self):
+        note = Note.objects.create(owner=self.user, title="Groceries")
+        cache = get_fragment_cache()
+
+        for write in (
+            lambda note: Note.objects.filter(pk=note.pk).toggle("is_favourite"),
+            lambda note: note.save(),
+            lambda note: note.delete(),
+        ):
+            self.render(note)
+            loaded = Note.objects.get(pk=note.pk)
+            key = note_item_cache_key(loaded)
+            self.assertIsNotNone(cache.get(key))
+            write(loaded)
+            self.assertIsNone(cache.get(key))
+
+    def test_markers_are_filled_per_request(self):
+        note = Note.objects.create(owner=self.user, title="Groceries")
+        loaded = Note.objects.for_cards().get(pk=note.pk)
+        render_note_item(loaded, "first-token")
+        html = render_note_item(loaded, "second-token")
+        self.assertIn("second-token", html)
+        self.assertNotIn("first-token", html)
+        self.assertNotIn(UPDATED_AT_MARKER, html)
+
+
+class NoteStatsTests(TestCase):
+    """
+    The incrementally maintained rollup always equals a full recount.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("owner@example.com", "s3cret-pass!")
+
+    def rollup(self):
+        stats = NoteStats.objects.get(owner=self.user)
+        days = NoteDailyStats.objects.filter(owner=self.user).exclude(created=0)
+        return (
+            stats.total_notes,
+            stats.favourite_notes,
+            stats.last_updated_id,
+            list(days.values_list("day", "created")),
+        )
+
+    def assertMatchesRebuild(self):
+        incremental = self.rollup()
+        rebuild_note_stats(self.user.pk)
+        self.assertEqual(incremental, self.rollup())
+        return incremental
+
+    def test_create(self):
+        first = Note.objects.create(owner=self.user, title="One", is_favourite=True)
+        last = Note.objects.create(owner=self.user, title="Two")
+        total, favourites, last_updated_id, days = self.assertMatchesRebuild()
+        self.assertEqual((total, favourites, last_updated_id), (2, 1, last.pk))
+        self.assertEqual(days, [(timezone.localdate(first.created_at), 2)])
+
+    def test_edit_and_favourite_toggle(self):
+        first, last = [Note.objects.create(owner=self.user, title=title) for title in ["One", "Two"]]
+        first.title = "Edited"
+        first.save()
+        self.assertEqual(self.assertMatchesRebuild()[2], first.pk)
+
+        Note.objects.filter(pk=last.pk).toggle("is_favourite")
+        self.assertEqual(self.assertMatchesRebuild()[1], 1)
+        Note.objects.filter(pk=last.pk).toggle("is_favourite")
+        self.assertEqual(self.assertMatchesRebuild()[1], 0)
+
+    def test_delete(self):
+        notes = [Note.objects.create(owner=self.user, title=str(i), is_favourite=True) for i in range(3)]
+        notes[-1].delete()
+        total, favourites, last_updated_id, days = self.assertMatchesRebuild()
+        self.assertEqual((total, favourites, last_updated_id), (2, 2, notes[1].pk))
+
+    def test_bulk_operations(self):
+        notes = [Note.objects.create(owner=self.user, title=str(i)) for i in range(4)]
+        bulk.bulk_set_favourite(self.user, [note.pk for note in notes[:3]], True)
+        self.assertEqual(self.assertMatchesRebuild()[1], 3)
+        bulk.bulk_delete(self.user, [note.pk for note in notes[1:]])
+        self.assertEqual(self.assertMatchesRebuild()[:2], (1, 1))
+
+    def test_daily_bucket_upsert(self):
+        for upsert in [True, False]:
+            with self.subTest(upsert=upsert), mock.patch.object(
+                connection.features, "supports_update_conflicts_with_target", upsert,
+            ):
+                NoteDailyStats.objects.all().delete()
+                today = timezone.localdate()
+                stats._bump_daily(self.user.pk, today, 1)
+                # As if a concurrent first note of the day inserted it meanwhile.
+                stats._bump_daily(self.user.pk, today, 2)
+                stats._bump_daily(self.user.pk, today, -5)
+                stats._bump_daily(self.user.pk, today, 1)
+                self.assertEqual(NoteDailyStats.objects.get(owner=self.user, day=today).created, 1)
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class ConditionalGetTests(ClearCacheMixin, TestCase):
+    """
+    Note pages answer ``304 Not Modified`` until the notes or the user
+    rendered in the page chrome change.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("owner@example.com", "s3cret-pass!")
+        cls.note = Note.objects.create(owner=cls.user, title="Groceries", description="Milk")
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+        self.url = reverse("note:note_list")
+        # The first page sets the CSRF cookie, whose secret the ETag covers.
+        self.get()
+
+    def get(self, etag=None, **headers):
+        if etag:
+            headers["If-None-Match"] = etag
+        return self.client.get(self.url, headers=headers)
+
+    def test_not_modified(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("HX-Request", response["Vary"])
+        self.assertEqual(self.get(response["ETag"]).status_code, 304)
+
+    def test_note_change(self):
+        etag = self.get()["ETag"]
+        Note.objects.filter(pk=self.note.pk).toggle("is_favourite")
+        self.assertEqual(self.get(etag).status_code, 200)
+
+    def test_profile_change(self):
+        etag = self.get()["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.first_name = "Ada"
+            self.user.save()
+        response = self.get(etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Ada")
+
+    def test_htmx_partial_is_another_representation(self):
+        full = self.get()
+        partial = self.get(HX_Request="true")
+        self.assertNotEqual(full["ETag"], partial["ETag"])
+        self.assertEqual(self.get(full["ETag"], HX_Request="true").status_code, 200)
+        self.assertEqual(self.get(partial["ETag"], HX_Request="true").status_code, 304)
+
+    def test_last_modified_only_for_partials(self):
+        self.assertFalse(self.get().has_header("Last-Modified"))
+        partial = self.get(HX_Request="true")
+        response = self.get(HX_Request="true", If_Modified_Since=partial["Last-Modified"])
+        self.assertEqual(response.status_code, 304)
+
+
+class SearchResultCacheTests(TestCase):
+    """
+    Search results are cached per user, refined for extended prefixes and
+    retired by a write made through any process.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("owner@example.com", "s3cret-pass!")
+        for i in range(6):
+            Note.objects.create(owner=cls.user, title="meeting " * (i % 3 + 1), description=f"Agenda {i}")
+        Note.objects.create(owner=cls.user, title="Meetup", description="Bring snacks meeting")
+        Note.objects.create(owner=cls.user, title="Groceries", description="Milk")
+
+    def setUp(self):
+        get_search_cache().invalidate(self.user.pk)
+
+    def test_hit(self):
+        hits, status = search_notes(self.user, "meet")
+        self.assertEqual(status, "miss")
+        self.assertEqual(search_notes(self.user, "MEET")[0:2], (hits, "hit"))
+
+    def test_prefix_refinement_is_ranked_for_the_new_terms(self):
+        search_notes(self.user, "meet")
+        with CaptureQueriesContext(connection) as ctx:
+            hits, status = search_notes(self.user, "meeting agenda")
+        self.assertEqual(status, "refine")
+        self.assertEqual(hits, get_search_backend().search(self.user, "meeting agenda"))
+        self.assertEqual(len(hits), 6)
+        # The backend ranks the candidates; no documents are loaded again.
+        self.assertFalse(any('"note_note"."description"' in query["sql"] for query in ctx.captured_queries))
+        self.assertEqual(search_notes(self.user, "meeting agenda")[1], "hit")
+
+    def test_refinement_folds_diacritics_as_the_index_does(self):
+        cafe = Note.objects.create(owner=self.user, title="Café plans")
+        plain = Note.objects.create(owner=self.user, title="Cafe menu")
+        for query, refined in (("caf", "cafe"), ("caf", "café")):
+            get_search_cache().invalidate(self.user.pk)
+            search_notes(self.user, query)
+            hits, status = search_notes(self.user, refined)
+            self.assertEqual(status, "refine")
+            self.assertEqual({note_id for note_id, score in hits}, {cafe.pk, plain.pk})
+            self.assertEqual(hits, get_search_backend().search(self.user, refined))
+
+    def test_unrelated_terms_miss(self):
+        search_notes(self.user, "meeting")
+        self.assertEqual(search_notes(self.user, "meet")[1], "miss")
+        self.assertEqual(search_notes(self.user, "milk")[1], "miss")
+
+    def test_write_in_another_process(self):
+        other = SearchResultCache()
+        generation = other.generation(self.user.pk)
+        other.store(self.user.pk, ["milk"], generation, [], {})
+        self.assertEqual(other.lookup(self.user.pk, ["milk"], other.generation(self.user.pk))[1], "hit")
+
+        # Saving only drops this process's entries; the generation moves for all.
+        Note.objects.create(owner=self.user, title="Milk")
+        self.assertEqual(other.lookup(self.user.pk, ["milk"], other.generation(self.user.pk))[1], "miss")
+
+    def test_lru_eviction(self):
+        cache = SearchResultCache(max_users=2, max_entries=2)
+        generation = cache.generation(self.user.pk)
+        for terms in (["a"], ["b"], ["c"]):
+            cache.store(self.user.pk, terms, generation, [], {})
+        cache.lookup(self.user.pk, ["b"], generation)
+        cache.store(self.user.pk, ["d"], generation, [], {})
+        self.assertEqual(list(cache._users[self.user.pk]), [("b",), ("d",)])
+
+        cache.store("second", ["a"], generation, [], {})
+        cache.store("third", ["a"], generation, [], {})
+        self.assertEqual(list(cache._users), ["second", "third"])
+        self.assertEqual(cache.stats()["entries"], 2)
+
+    def test_large_results_are_not_cached(self):
+        with self.settings(NOTE_SEARCH_CACHE_MAX_HITS=3):
+            hits, status = search_notes(self.user, "meet")
+            self.assertEqual(len(hits), 7)
+            self.assertEqual(search_notes(self.user, "meet")[1], "miss")
+            self.assertEqual(get_search_cache().stats()["entries"], 0)
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class BulkActionTests(ClearCacheMixin, TestCase):
+    """
+    Bulk delete and favourite write in one statement and apply the index,
+    rollup, cache and event side effects once for the batch.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("owner@example.com", "s3cret-pass!")
+        cls.other = User.objects.create_user("other@example.com", "s3cret-pass!")
+        cls.notes = [
+            Note.objects.create(owner=cls.user, title=f"Meeting {i}", is_favourite=i == 0)
+            for i in range(5)
+        ]
+        cls.foreign = Note.objects.create(owner=cls.other, title="Meeting elsewhere")
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+
+    def post(self, action, notes):
+        return self.client.post(
+            reverse("note:note_bulk"), {"action": action, "note_ids": [note.pk for note in notes]},
+        )
+
+    def test_related_models_are_handled(self):
+        # bulk_delete does on_delete's work itself for exactly these.
+        self.assertEqual(
+            {
+                (field.related_model, field.on_delete)
+                for field in Note._meta.get_fields(include_hidden=True)
+                if field.auto_created and not field.concrete
+            },
+            {(NoteRevision, CASCADE), (NoteStats, SET_NULL)},
+        )
+
+    def test_delete(self):
+        edited = self.notes[4]
+        edited.title = "Meeting renamed"
+        edited.save()  # Leaves a revision, and becomes the last updated note.
+        for note in self.notes:
+            render_note_item(Note.objects.for_cards().get(pk=note.pk))
+        search_notes(self.user, "meeting")
+
+        doomed = self.notes[2:] + [self.foreign]
+        receiver = mock.Mock()
+        post_delete.connect(receiver, sender=Note)
+        self.addCleanup(post_delete.disconnect, receiver, sender=Note)
+        with mock.patch("note.events.publish_note_event") as publish:
+            response = self.post("delete", doomed)
+        self.assertEqual(response.status_code, 201)
+
+        deleted = {note.pk for note in self.notes[2:]}
+        receiver.assert_not_called()
+        publish.assert_called_once()
+        self.assertEqual(set(publish.call_args.args[2]), deleted)
+        self.assertFalse(Note.objects.filter(pk__in=deleted).exists())
+        self.assertTrue(Note.objects.filter(pk=self.foreign.pk).exists())
+        self.assertFalse(NoteRevision.objects.filter(note_id__in=deleted).exists())
+        for note_id in deleted:
+            self.assertContains(response, f'id="note-{note_id}" hx-swap-oob="delete"', status_code=201)
+
+        hits, status = search_notes(self.user, "meeting")
+        self.assertEqual(status, "miss")
+        self.assertEqual({note_id for note_id, score in hits}, {note.pk for note in self.notes[:2]})
+        self.assertEqual(get_search_backend().search(self.other, "meeting")[0][0], self.foreign.pk)
+        for note in self.notes[2:]:
+            self.assertIsNone(get_fragment_cache().get(note_item_cache_key(note)))
+
+        rollup = NoteStats.objects.get(owner=self.user)
+        self.assertEqual((rollup.total_notes, rollup.favourite_notes, rollup.deleted_notes), (2, 1, 3))
+        self.assertEqual(rollup.last_updated_id, self.notes[1].pk)
+
+    def test_delete_queries_do_not_grow_with_the_batch(self):
+        def queries(notes):
+            with CaptureQueriesContext(connection) as ctx:
+                bulk.bulk_delete(self.user, [note.pk for note in notes])
+            return len(ctx.captured_queries)
+
+        self.assertEqual(queries(self.notes[:1]), queries(self.notes[1:]))
+
+    def test_favourite(self):
+        search_notes(self.user, "meeting")
+        with mock.patch("note.events.publish_note_event") as publish:
+            response = self.post("favourite", self.notes[:3] + [self.foreign])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(json.loads(response["HX-Trigger"])["noteBulkAction"]["count"], 3)
+        publish.assert_called_once()
+        # The first note was a favourite already.
+        self.assertEqual(set(publish.call_args.args[2]), {note.pk for note in self.notes[1:3]})
+
+        self.assertEqual(Note.objects.filter(owner=self.user, is_favourite=True).count(), 3)
+        self.assertFalse(Note.objects.get(pk=self.foreign.pk).is_favourite)
+        self.assertEqual(NoteStats.objects.get(owner=self.user).favourite_notes, 3)
+        self.assertEqual(search_notes(self.user, "meeting")[1], "miss")
+        self.assertContains(response, "note-fav", count=3, status_code=201)
+
+        response = self.post("unfavourite", self.notes)
+        self.assertEqual(NoteStats.objects.get(owner=self.user).favourite_notes, 0)
+
+        with mock.patch("note.events.publish_note_event") as publish:
+            self.post("unfavourite", self.notes)
+        publish.assert_not_called()
+
+    def test_invalid(self):
+        response = self.client.post(reverse("note:note_bulk"), {"action": "delete"})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("noteBulkAction", response["HX-Trigger"])
+
+
+@override_settings(NOTE_COMPRESSION_MIN_LENGTH=1000, NOTE_COMPRESSION_CODEC="zlib")
+class ExportTests(ClearCacheMixin, TestCase):
+    """
+    Exports stream every note of the user, and only theirs, in a form the
+    matching parser reads back unchanged.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("owner@example.com", "s3cret-pass!")
+        other = User.objects.create_user("other@example.com", "s3cret-pass!")
+        cls.long_text = "Agenda, \"budget\" and review;\nnext line. " * 60
+        cls.notes = [
+            Note.objects.create(owner=cls.user, title="Groceries", description="Milk, eggs", is_favourite=True),
+            Note.objects.create(owner=cls.user, title="Long, quoted", description=cls.long_text),
+        ]
+        Note.objects.create(owner=other, title="Private", description="Not exported")
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+
+    def export(self, format):
+        response = self.client.get(reverse("note:note_export"), {"format": format})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertIn("attachment;", response["Content-Disposition"])
+        return b"".join(response.streaming_content)
+
+    def assertExported(self, rows):
+        rows = sorted(rows, key=lambda row: row["title"])
+        self.assertEqual([row["title"] for row in rows], ["Groceries", "Long, quoted"])
+        self.assertEqual(rows[0]["description"], "Milk, eggs")
+        self.assertEqual(rows[1]["description"], self.long_text)
+        self.assertEqual(rows[1]["id"], str(self.notes[1].pk))
+
+    def test_ndjson(self):
+        rows = [json.loads(line) for line in self.export("ndjson").decode().splitlines()]
+        self.assertExported(rows)
+        self.assertEqual([row["is_favourite"] for row in rows], [False, True])
+
+    def test_csv(self):
+        content = self.export("csv").decode()
+        rows = list(csv.DictReader(io.StringIO(content, newline="")))
+        self.assertExported(rows)
+        self.assertEqual(list(rows[0]), list(EXPORT_FIELDS))
+
+    def test_markdown_zip(self):
+        with zipfile.ZipFile(io.BytesIO(self.export("markdown"))) as archive:
+            self.assertEqual(len(archive.namelist()), 2)
+            self.assertIsNone(archive.testzip())
+        rows = list(PARSERS["markdown"](io.BytesIO(self.export("markdown")), "notes.zip"))
+        self.assertExported(rows)
+
+    def test_chunks_are_coalesced(self):
+        exporter = NDJSONExporter.for_owner(self.user)
+        exporter.buffer_size = 1000
+        chunks = list(exporter)
+        self.assertGreater(len(chunks), 1)
+        self.assertTrue(all(len(chunk) >= 1000 for chunk in chunks[:-1]))
+
+    def test_unknown_format(self):
+        response = self.client.get(reverse("note:note_export"), {"format": "xml"})
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class ImportTests(ClearCacheMixin, TestCase):
+    """
+    Imports validate each row, write in batches, resume after the last
+    committed batch and index only the notes they added.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("owner@example.com", "s3cret-pass!")
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+
+    @staticmethod
+    def ndjson(*rows):
+        return io.BytesIO("\n".join(row if isinstance(row, str) else json.dumps(row) for row in rows).encode())
+
+    def rows(self, count):
+        return [{"title": f"Meeting {i}", "description": "Agenda"} for i in range(1, count + 1)]
+
+    def titles(self):
+        return sorted(Note.objects.filter(owner=self.user).values_list("title", flat=True))
+
+    def test_bad_rows(self):
+        stream = self.ndjson(
+            {"title": "Meeting 1", "is_favourite": True},
+            "{not json",
+            "[1, 2]",
+            {"title": "", "description": "No title"},
+            {"title": "Meeting 2"},
+        )
+        report = import_notes(self.user, stream, "ndjson")
+        self.assertEqual((report.imported, report.invalid, report.resume_from), (2, 3, 5))
+        self.assertEqual([row for row, messages in report.errors], [2, 3, 4])
+        self.assertIn("title", report.errors[2][1][0])
+        self.assertEqual(self.titles(), ["Meeting 1", "Meeting 2"])
+
+        rollup = NoteStats.objects.get(owner=self.user)
+        self.assertEqual((rollup.total_notes, rollup.favourite_notes), (2, 1))
+        self.assertEqual(len(get_search_backend().search(self.user, "meeting")), 2)
+
+    def test_resume_from(self):
+        report = import_notes(self.user, self.ndjson(*self.rows(5)), "ndjson", start=3)
+        self.assertEqual((report.imported, report.resume_from), (2, 5))
+        self.assertEqual(self.titles(), ["Meeting 4", "Meeting 5"])
+
+    def test_only_new_notes_are_indexed(self):
+        existing = Note.objects.create(owner=self.user, title="Meeting 0")
+        get_search_backend().remove(existing)
+        import_notes(self.user, self.ndjson(*self.rows(2)), "ndjson")
+        hits = {note_id for note_id, score in get_search_backend().search(self.user, "meeting")}
+        self.assertEqual(len(hits), 2)
+        self.assertNotIn(existing.pk, hits)
+
+    def test_batch_failure_and_resume(self):
+        bulk_create = NoteQuerySet.bulk_create
+        calls = []
+
+        def failing_second_batch(queryset, objs, *args, **kwargs):
+            calls.append(objs)
+            if len(calls) == 2:
+                raise DatabaseError("disk I/O error")
+            return bulk_create(queryset, objs, *args, **kwargs)
+
+        with mock.patch.object(NoteQuerySet, "bulk_create", failing_second_batch):
+            with self.assertRaises(ImportFailed) as failure:
+                import_notes(self.user, self.ndjson(*self.rows(5)), "ndjson", batch_size=2)
+        self.assertIsInstance(failure.exception.__cause__, DatabaseError)
+        self.assertEqual(failure.exception.report.resume_from, 2)
+        self.assertEqual(self.titles(), ["Meeting 1", "Meeting 2"])
+        # The run still ends by rebuilding the rollup and the index.
+        self.assertEqual(NoteStats.objects.get(owner=self.user).total_notes, 2)
+        self.assertEqual(len(get_search_backend().search(self.user, "meeting")), 2)
+
+        import_notes(self.user, self.ndjson(*self.rows(5)), "ndjson", start=2, batch_size=2)
+        self.assertEqual(self.titles(), [f"Meeting {i}" for i in range(1, 6)])
+
+    def post(self, content, name="notes.ndjson", **data):
+        upload = SimpleUploadedFile(name, content)
+        return self.client.post(reverse("note:note_import"), {"file": upload, **data})
+
+    def test_view(self):
+        response = self.post(self.ndjson(*self.rows(3)).getvalue(), resume_from=1)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(json.loads(response["HX-Trigger"])["notesImported"]["imported"], 2)
+
+    def test_view_batch_failure(self):
+        with mock.patch.object(NoteQuerySet, "bulk_create", side_effect=DatabaseError("disk I/O error")):
+            with self.assertLogs("note.views", "ERROR") as logs:
+                response = self.post(self.ndjson(*self.rows(3)).getvalue())
+        self.assertEqual(response.status_code, 422)
+        self.assertContains(response, "resume from", status_code=422)
+        self.assertIn("disk I/O error", logs.output[0])
+
+    def test_view_unsupported_file(self):
+        self.assertEqual(self.post(b"data", name="notes.txt").status_code, 400)
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class AsyncViewTests(ClearCacheMixin, TestCase):
+    """
+    With ``NOTE_ASYNC_VIEWS`` on, the URLconfs serve the async views, which
+    answer like the sync ones.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.enterClassContext(serving(async_views=True))
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("owner@example.com", "s3cret-pass!")
+        cls.note = Note.objects.create(owner=cls.user, title="Groceries", description="Milk and eggs")
+
+    def setUp(self):
+        super().setUp()
+        get_search_cache().invalidate(self.user.pk)
+
+    def test_switch(self):
+        for name, view_class in [
+            ("note:note_list", async_views.NoteListView),
+            ("note:note_search", async_views.NoteSearchView),
+            ("dashboard:dashboard", DashboardView),
+        ]:
+            with self.subTest(name=name):
+                view = resolve(reverse(name)).func
+                self.assertIs(view.view_class, view_class)
+                self.assertTrue(asyncio.iscoroutinefunction(view))
+
+    async def test_read(self):
+        await self.async_client.aforce_login(self.user)
+        for url, text in [
+            (reverse("note:note_list"), "Groceries"),
+            (reverse("note:note_favorite_list", args=[0]), "Groceries"),
+            (reverse("note:note_search") + "?search=eggs", "Groceries"),
+        ]:
+            with self.subTest(url=url):
+                self.assertContains(await self.async_client.get(url), text)
+
+        response = await self.async_client.get(reverse("dashboard:dashboard"))
+        self.assertEqual(response.context["stats"]["total_notes"], 1)
+
+    async def test_write(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.post(
+            reverse("note:note_create"), {"title": "Chores", "description": "Dishes"},
+        )
+        self.assertEqual(response.status_code, 201)
+        note = await Note.objects.aget(owner=self.user, title="Chores")
+
+        response = await self.async_client.post(
+            reverse("note:note_edit", args=[note.pk]), {"title": "Housework", "description": "Dishes"},
+        )
+        self.assertContains(response, "Housework", status_code=201)
+
+        response = await self.async_client.post(reverse("note:note_favorite_toggle", args=[note.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue((await Note.objects.aget(pk=note.pk)).is_favourite)
+
+        response = await self.async_client.post(reverse("note:note_delete", args=[note.pk]))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(await Note.objects.filter(owner=self.user).acount(), 1)
+
+    async def test_login_required(self):
+        response = await self.async_client.get(reverse("note:note_list"))
+        self.assertEqual(response.status_code, 302)
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class NoteEventTests(ClearCacheMixin, TestCase):
+    """
+    Committed note writes are published on the owner's channel and relayed
+    by the event stream as out-of-band swaps.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("owner@example.com", "s3cret-pass!")
+        cls.note = Note.objects.create(owner=cls.user, title="Groceries")
+
+    def setUp(self):
+        super().setUp()
+        self.channel = events.note_channel(self.user.pk)
+
+    def test_wsgi_answers_no_content(self):
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(reverse("note:note_events")).status_code, 204)
+
+    def test_published_on_commit(self):
+        with mock.patch.object(events, "get_broker") as get_broker:
+            publish = get_broker.return_value.publish
+            with self.captureOnCommitCallbacks(execute=True):
+                note = Note.objects.create(owner=self.user, title="Chores")
+                note.title = "Housework"
+                note.save()
+                note_id = str(note.pk)
+                note.delete()
+
+                # Rolled back: never published.
+                with self.assertRaises(DatabaseError), transaction.atomic():
+                    Note.objects.create(owner=self.user, title="Draft")
+                    raise DatabaseError
+
+        self.assertEqual(publish.call_args_list, [
+            mock.call(self.channel, events.NoteEvent(events.CREATED, [note_id])),
+            mock.call(self.channel, events.NoteEvent(events.UPDATED, [note_id])),
+            mock.call(self.channel, events.NoteEvent(events.DELETED, [note_id])),
+        ])
+
+    async def test_stream(self):
+        request = AsyncRequestFactory().get(reverse("note:note_events"))
+        request.user = self.user
+        stream = NoteEventStreamView().stream(request)
+        self.assertEqual(await anext(stream), "retry: 15000\n\n")
+
+        broker = events.get_broker()
+        broker.publish(self.channel, events.NoteEvent(events.UPDATED, [str(self.note.pk)]))
+        chunk = await anext(stream)
+        self.assertTrue(chunk.startswith("event: note-updated\ndata: "))
+        self.assertIn(f'id="note-{self.note.pk}"', chunk)
+        self.assertTrue(chunk.endswith("\n\n"))
+
+        broker.publish(self.channel, events.NoteEvent(events.DELETED, [str(uuid.uuid4())]))
+        self.assertTrue((await anext(stream)).startswith("event: note-deleted\n"))
+
+        await stream.aclose()
+        self.assertNotIn(self.channel, broker._channels)
+
+    async def test_overflow_asks_for_resync(self):
+        broker = events.InProcessBroker(max_queued=1)
+        async with broker.subscribe(self.channel) as subscription:
+            for _ in range(2):
+                broker.publish(self.channel, events.NoteEvent(events.UPDATED, [str(self.note.pk)]))
+            await asyncio.sleep(0)  # Let the loop deliver them.
+            self.assertIsNone(await subscription.get())
+        self.assertEqual(broker._channels, {})
+
+
+class NoteToggleTests(TestCase):
+    """
+    ``toggle()`` flips the stored value in one statement, with
+    ``UPDATE ... RETURNING`` or, where that is missing, a locked
+    select-update-reload, and runs the ``post_save`` hooks for each note.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("owner@example.com", "s3cret-pass!")
+
+    def setUp(self):
+        self.notes = [Note.objects.create(owner=self.user, title=title) for title in ["One", "Two"]]
+
+    def implementation(self, returning):
+        return mock.patch("note.managers.can_update_returning", return_value=returning)
+
+    def favourites(self):
+        return NoteStats.objects.get(owner=self.user).favourite_notes
+
+    def test_toggle(self):
+        note = self.notes[0]
+        updated_at = Note.objects.get(pk=note.pk).updated_at
+        for returning in (True, False):
+            with self.subTest(returning=returning), self.implementation(returning):
+                expected = not Note.objects.get(pk=note.pk).is_favourite
+                stored = []
+                with CaptureQueriesContext(connection) as ctx, \
+                        mock.patch("note.signals.stats.note_saved") as note_saved:
+                    # The hooks see the value from before the toggle as the stored one.
+                    note_saved.side_effect = lambda note, created: stored.append(note._stored_is_favourite)
+                    toggled = Note.objects.filter(pk=note.pk).toggle("is_favourite")
+
+                self.assertEqual([(n.pk, n.is_favourite, n.title) for n in toggled], [(note.pk, expected, "One")])
+                self.assertEqual(stored, [not expected])
+                note.refresh_from_db()
+                self.assertEqual((note.is_favourite, note.updated_at), (expected, updated_at))
+
+                updates = [q["sql"] for q in ctx.captured_queries if q["sql"].startswith('UPDATE "note_note"')]
+                self.assertEqual(len(updates), 1)
+                self.assertEqual("RETURNING" in updates[0], returning)
+
+    def test_statistics_without_revisions(self):
+        for returning in (True, False):
+            with self.subTest(returning=returning), self.implementation(returning):
+                Note.objects.filter(owner=self.user).toggle("is_favourite")
+                self.assertEqual(self.favourites(), 2)
+                Note.objects.filter(pk=self.notes[0].pk).toggle("is_favourite")
+                self.assertEqual(self.favourites(), 1)
+                Note.objects.filter(pk=self.notes[1].pk).toggle("is_favourite")
+                self.assertEqual(self.favourites(), 0)
+                self.assertFalse(NoteRevision.objects.filter(note__owner=self.user).exists())
+
+    def test_double_toggle(self):
+        # Two requests that both saw is_favourite=False toggle the same note.
+        # Each flips what is stored, so the second undoes the first, where a
+        # read-modify-write of the value both saw would set True twice.
+        note = self.notes[0]
+        for returning in (True, False):
+            with self.subTest(returning=returning), self.implementation(returning):
+                first = Note.objects.filter(pk=note.pk, owner=self.user)
+                second = Note.objects.filter(pk=note.pk, owner=self.user)
+                self.assertTrue(first.toggle("is_favourite")[0].is_favourite)
+                self.assertFalse(second.toggle("is_favourite")[0].is_favourite)
+                self.assertFalse(Note.objects.get(pk=note.pk).is_favourite)
+                self.assertEqual(self.favourites(), 0)
+
+    def test_no_match(self):
+        for returning in (True, False):
+            with self.subTest(returning=returning), self.implementation(returning), \
+                    mock.patch("note.signals.stats.note_saved") as note_saved:
+                self.assertEqual(Note.objects.filter(pk=uuid.uuid4()).toggle("is_favourite"), [])
+                note_saved.assert_not_called()
+
+
+class RevisionDiffTests(SimpleTestCase):
+
+    def test_round_trip(self):
+        texts = [
+            "",
+            "Milk",
+            "Milk, eggs and bread.",
+            "Eggs, milk and bread.\n\nAnd butter.",
+            "  leading and trailing  ",
+            "Crème brûlée, 3 × 🍮",
+            "Milk",
+        ]
+        for old, new in zip(texts, texts[1:]):
+            with self.subTest(old=old, new=new):
+                self.assertEqual(patch_text(old, diff_text(old, new)), new)
+
+    def test_unchanged_words_are_kept_not_stored(self):
+        ops = diff_text("buy milk and eggs today", "buy milk and bread today")
+        self.assertEqual(ops, [3, -1, "bread ", 1])
+
+    def test_content(self):
+        old = {"title": "Groceries", "description": "Milk and eggs"}
+        new = {"title": "Groceries", "description": "Milk, eggs and bread"}
+        diff = diff_content(old, new)
+        self.assertEqual(list(diff), ["description"])
+        self.assertEqual(patch_content(old, diff), new)
+
+
+@override_settings(STORAGES=TEST_STORAGES, NOTE_REVISION_SNAPSHOT_INTERVAL=3, NOTE_REVISION_HISTORY_PAGE_SIZE=3)
+class NoteRevisionTests(ClearCacheMixin, TestCase):
+    """
+    Every content change leaves a revision, stored as a snapshot every
+    ``NOTE_REVISION_SNAPSHOT_INTERVAL`` revisions and diffs in between.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("owner@example.com", "s3cret-pass!")
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+
+    def edited_note(self, edits):
+        """
+        A note saved with ``edits + 1`` descriptions, and those descriptions.
+        """
+        descriptions = [f"Version {i}: " + "milk and eggs " * i for i in range(1, edits + 2)]
+        note = Note.objects.create(owner=self.user, title="Groceries", description=descriptions[0])
+        for description in descriptions[1:]:
+            note.description = description
+            note.save()
+        return note, descriptions
+
+    def revisions(self, note):
+        return list(NoteRevision.objects.filter(note=note).order_by("number").values_list("number", "is_snapshot"))
+
+    def test_edits(self):
+        note, descriptions = self.edited_note(4)
+        self.assertEqual(self.revisions(note), [(1, True), (2, False), (3, False), (4, True), (5, False)])
+        for number, description in enumerate(descriptions, start=1):
+            content = get_revision_content(note, number)
+            self.assertEqual(content, {"title": "Groceries", "description": description})
+        self.assertIsNone(get_revision_content(note, 6))
+
+        # Saves that leave the content alone add nothing.
+        note.is_favourite = True
+        note.save()
+        note.save()
+        self.assertEqual(len(self.revisions(note)), 5)
+
+    def test_history_is_replayed_per_window(self):
+        note, descriptions = self.edited_note(7)
+
+        with CaptureQueriesContext(connection) as ctx:
+            history = get_history(note, before=7, limit=2)
+        self.assertEqual([(revision.number, content["description"]) for revision, content in history], [
+            (6, descriptions[5]), (5, descriptions[4]),
+        ])
+        self.assertEqual(len(ctx.captured_queries), 2)
+        # Replayed from snapshot 4, not from revision 1.
+        self.assertIn(">= (SELECT", ctx.captured_queries[1]["sql"].replace('"', ""))
+
+        self.assertEqual([revision.number for revision, _ in get_history(note)], list(range(8, 0, -1)))
+        self.assertEqual(get_history(note, before=1), [])
+
+    def test_history_view(self):
+        note, descriptions = self.edited_note(4)
+        url = reverse("note:note_history", args=[note.pk])
+
+        response = self.client.get(url)
+        self.assertEqual([v["revision"].number for v in response.context["versions"]], [5, 4, 3])
+        self.assertTrue(response.context["versions"][0]["is_current"])
+        self.assertEqual(response.context["older_url"], f"{url}?before=3")
+        self.assertContains(response, f'hx-get="{url}?before=3"')
+
+        response = self.client.get(f"{url}?before=3")
+        self.assertTemplateUsed(response, "note/partials/note_history_page.html")
+        self.assertTemplateNotUsed(response, "note/partials/note_history.html")
+        self.assertEqual([v["revision"].number for v in response.context["versions"]], [2, 1])
+        self.assertIsNone(response.context["older_url"])
+
+    def test_restore(self):
+        note, descriptions = self.edited_note(2)
+        response = self.client.post(reverse("note:note_restore", args=[note.pk, 1]))
+        self.assertEqual(response.status_code, 201)
+        note.refresh_from_db()
+        self.assertEqual(note.description, descriptions[0])
+        self.assertEqual(self.revisions(note)[-1], (4, True))
+        self.assertEqual(get_revision_content(note, 4)["description"], descriptions[0])
+
+        response = self.client.post(reverse("note:note_restore", args=[note.pk, 9]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_bulk_writes(self):
+        note = Note.objects.create(owner=self.user, title="Groceries", description="Milk")
+        before = Note.objects.get(pk=note.pk).updated_at
+
+        Note.objects.filter(pk=note.pk).update(title="Shopping")
+        [updated] = Note.objects.filter(pk=note.pk).update_returning(description="Milk and eggs")
+        self.assertEqual(updated.description, "Milk and eggs")
+        self.assertGreater(updated.updated_at, before)
+        updated.title = "Weekly shopping"
+        Note.objects.bulk_update([updated], ["title"])
+
+        history = [(revision.number, content) for revision, content in get_history(note)][::-1]
+        self.assertEqual(history, [
+            (1, {"title": "Groceries", "description": "Milk"}),
+            (2, {"title": "Shopping", "description": "Milk"}),
+            (3, {"title": "Shopping", "description": "Milk and eggs"}),
+            (4, {"title": "Weekly shopping", "description": "Milk and eggs"}),
+        ])
+
+        # Other fields are still updated in one statement, without revisions.
+        with self.assertNumQueries(1):
+            Note.objects.filter(pk=note.pk).update(is_favourite=True)
+
+    def test_bulk_writes_refresh_the_preview_and_search(self):
+        note = Note.objects.create(owner=self.user, title="Groceries", description="Old body")
+        self.assertEqual([note_id for note_id, score in search_notes(self.user, "old")[0]], [note.pk])
+
+        Note.objects.filter(pk=note.pk).update(description="New body text")
+        self.assertEqual(Note.objects.get(pk=note.pk).preview, "New body text")
+        self.assertEqual(search_notes(self.user, "old")[0], [])
+        self.assertEqual([note_id for note_id, score in search_notes(self.user, "new")[0]], [note.pk])
+
+        note.description = "Final body"
+        Note.objects.bulk_update([note], ["description"])
+        self.assertEqual(Note.objects.get(pk=note.pk).preview, "Final body")
+        self.assertEqual(search_notes(self.user, "new")[0], [])
+        self.assertEqual(NoteStats.objects.get(owner=self.user).last_updated_id, note.pk)
+
+        Note.objects.filter(pk=note.pk).update_returning(title="Shopping")
+        self.assertEqual([note_id for note_id, score in search_notes(self.user, "shopping")[0]], [note.pk])
+
+    def test_imported_notes_start_their_history_on_first_edit(self):
+        stream = io.BytesIO(json.dumps({"title": "Groceries", "description": "Milk"}).encode())
+        import_notes(self.user, stream, "ndjson")
+        note = Note.objects.get(owner=self.user)
+        self.assertEqual(self.revisions(note), [])
+
+        note.description = "Milk and eggs"
+        note.save()
+        self.assertEqual(get_revision_content(note, 1), {"title": "Groceries", "description": "Milk"})
+
+    def test_compact(self):
+        note, descriptions = self.edited_note(5)
+        # Revisions 1-4 two per day, 40 and 39 days ago; 5 and 6 recent.
+        now = timezone.now()
+        for number in range(1, 5):
+            NoteRevision.objects.filter(note=note, number=number).update(
+                created_at=now - timedelta(days=41 - (number + 1) // 2, hours=4 - number)
+            )
+
+        out = io.StringIO()
+        call_command("compact_note_revisions", "--dry-run", stdout=out)
+        self.assertIn("Would compact 1 notes: 6 -> 4 revisions", out.getvalue())
+        self.assertEqual(len(self.revisions(note)), 6)
+
+        call_command("compact_note_revisions", stdout=io.StringIO())
+        self.assertEqual(self.revisions(note), [(1, True), (2, False), (3, False), (4, True)])
+        self.assertEqual(
+            [content["description"] for _, content in get_history(note)][::-1],
+            [descriptions[1], descriptions[3], descriptions[4], descriptions[5]],
+        )
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class NotePreviewTests(ClearCacheMixin, TestCase):
+    """
+    Note cards render a stored preview; list and search queries never load
+    the full description, which only the edit form reads.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("owner@example.com", "s3cret-pass!")
+        cls.body = "Agenda for the planning meeting.\n\n" + "Budget line items and owners. " * 200 + "Closing remarks."
+        cls.note = Note.objects.create(owner=cls.user, title="Meeting", description=cls.body, is_favourite=True)
+
+    def setUp(self):
+        super().setUp()
+        get_search_cache().invalidate(self.user.pk)
+        self.client.force_login(self.user)
+
+    def test_make_preview(self):
+        preview = make_preview(self.body)
+        self.assertLessEqual(len(preview), PREVIEW_LENGTH)
+        self.assertTrue(preview.startswith("Agenda for the planning meeting. Budget line"))
+        self.assertTrue(preview.endswith("…"))
+        self.assertTrue(self.body.replace("\n\n", " ").startswith(preview[:-1].rstrip()))
+        self.assertEqual(make_preview("  Milk\n and   eggs "), "Milk and eggs")
+
+    def test_kept_up_to_date(self):
+        self.assertEqual(self.note.preview, make_preview(self.body))
+
+        note = Note.objects.get(pk=self.note.pk)
+        note.description = "Cancelled."
+        note.save(update_fields=["description"])
+        self.assertEqual(Note.objects.get(pk=note.pk).preview, "Cancelled.")
+
+        [created] = Note.objects.bulk_create([Note(owner=self.user, title="Bulk", description="Milk\nand eggs")])
+        self.assertEqual(Note.objects.get(pk=created.pk).preview, "Milk and eggs")
+
+    def test_lists_defer_the_description(self):
+        for url in [
+            reverse("note:note_list"),
+            reverse("note:note_favorite_list", args=[1]),
+            reverse("note:note_search") + "?search=meeting",
+        ]:
+            with self.subTest(url=url):
+                with CaptureQueriesContext(connection) as ctx:
+                    response = self.client.get(url)
+                [note] = response.context["notes"]
+                self.assertIn("description", note.get_deferred_fields())
+                self.assertContains(response, "Agenda for the planning")
+                self.assertNotContains(response, "Closing remarks")
+
+                # The card queries; the search cache reads bodies for its token index.
+                selects = [q["sql"] for q in ctx.captured_queries if '"note_note"."preview"' in q["sql"]]
+                self.assertTrue(selects)
+                for sql in selects:
+                    # As a column, not inside the excerpt expressions.
+                    self.assertNotRegex(sql, r'(SELECT |, )"note_note"\."description"(,| AS | FROM )')
+
+    def test_edit_form_loads_the_whole_note(self):
+        response = self.client.get(reverse("note:note_edit", args=[self.note.pk]))
+        self.assertContains(response, "Closing remarks")
+
+
+@override_settings(STORAGES=TEST_STORAGES, NOTE_COMPRESSION_MIN_LENGTH=1000, NOTE_COMPRESSION_CODEC="zlib")
+class CompressedNoteSearchTests(ClearCacheMixin, TestCase):
+    """
+    Long notes are stored compressed, out of reach of ``LIKE`` and SQL
+    string functions, and are still found and excerpted around the match.
+    """
+
+    BACKENDS = ["note.search.SQLiteFTSBackend", "note.search.LikeSearchBackend"]
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("owner@example.com", "s3cret-pass!")
+        cls.long = Note.objects.create(
+            owner=cls.user,
+            title="Safari log",
+            description="Lions at the waterhole. " * 200 + "A lone giraffe crossed by the zebra herd.",
+        )
+        cls.short = Note.objects.create(owner=cls.user, title="Crossing", description="Zebra crossing on Elm St.")
+        Note.objects.create(owner=cls.user, title="Other", description="Elephants. " * 200)
+
+    def setUp(self):
+        super().setUp()
+        get_search_cache().invalidate(self.user.pk)
+        self.client.force_login(self.user)
+
+    def backends(self):
+        if connection.vendor == "sqlite":
+            return self.BACKENDS
+        return self.BACKENDS[1:]
+
+    def use(self, path):
+        self.enterContext(override_settings(NOTE_SEARCH_BACKEND=path))
+        backend = get_search_backend()
+        backend.rebuild()
+        return backend
+
+    def test_stored_compressed(self):
+        stored = Note.objects.filter(pk=self.long.pk).values_list("description", flat=True).get()
+        self.assertIsInstance(stored, CompressedText)
+
+    def test_found(self):
+        for path in self.backends():
+            with self.subTest(backend=path):
+                backend = self.use(path)
+                hits = backend.search(self.user, "zebra")
+                self.assertEqual({note_id for note_id, score in hits}, {self.long.pk, self.short.pk})
+                self.assertEqual([note_id for note_id, score in backend.search(self.user, "giraffe zebra")], [self.long.pk])
+                self.assertEqual([note_id for note_id, score in backend.search(self.user, "lions")], [self.long.pk])
+                self.assertEqual(backend.search(self.user, "zebra", limit=1), hits[:1])
+                note_id, score = hits[0]
+                self.assertEqual(backend.search(self.user, "zebra", after=(score, note_id)), hits[1:])
+
+    def test_excerpt(self):
+        for path in self.backends():
+            with self.subTest(backend=path):
+                self.use(path)
+                get_search_cache().invalidate(self.user.pk)
+                response = self.client.get(reverse("note:note_search"), {"search": "giraffe"})
+                [note] = response.context["notes"]
+                self.assertEqual(note.pk, self.long.pk)
+                self.assertIn("<mark>giraffe</mark> crossed by the zebra herd.", note.preview)
+                self.assertTrue(note.preview.startswith("…"))
+
+    @override_settings(NOTE_SEARCH_EXCERPT_CHARS=300)
+    def test_excerpt_starts_at_a_word(self):
+        # "Submarine" holds the term first, but only "Marine" is highlighted.
+        notes = {
+            Note.objects.create(
+                owner=self.user,
+                title="Dive log",
+                description="Submarine gear. " + "Lions at the waterhole. " * repeat + "(Marine biology.)",
+            ).pk: repeat
+            for repeat in (30, 200)
+        }
+        response = self.client.get(reverse("note:note_search"), {"search": "marine"})
+        found = {note.pk: note for note in response.context["notes"]}
+        self.assertEqual(set(found), set(notes))
+        for note_id in notes:
+            with self.subTest(repeat=notes[note_id]):
+                self.assertIn("(<mark>Marine</mark> biology.)", found[note_id].preview)
@@ -1,27 +1,29 @@
+from django.conf import settings
 from django.urls import path
 
-from .views import (
-    NoteListView,
-    NoteDetailView,
-    NoteCreateView,
-    NoteUpdateView,
-    NoteDeleteView,
-    NoteSearchView,
-    NoteFavoriteToggleView,
-    FavouriteNoteListView,
-)
+from . import async_views, views
 
 app_name = "note"
 
+# The same views, implemented with coroutines and the async ORM.
+if getattr(settings, "NOTE_ASYNC_VIEWS", False):
+    views = async_views
+
 
 urlpatterns = [
-    path("", NoteListView.as_view(), name="note_list"),
-    path("create/", NoteCreateView.as_view(), name="note_create"),
-    path("<uuid:pk>/", NoteDetailView.as_view(), name="note_detail"),
-    path("<uuid:pk>/edit/", NoteUpdateView.as_view(), name="note_edit"),
-    path("<uuid:pk>/delete/", NoteDeleteView.as_view(), name="note_delete"),
-    path("search/", NoteSearchView.as_view(), name="note_search"),
+    path("", views.NoteListView.as_view(), name="note_list"),
+    path("create/", views.NoteCreateView.as_view(), name="note_create"),
+    path("<uuid:pk>/", views.NoteDetailView.as_view(), name="note_detail"),
+    path("<uuid:pk>/edit/", views.NoteUpdateView.as_view(), name="note_edit"),
+    path("<uuid:pk>/delete/", views.NoteDeleteView.as_view(), name="note_delete"),
+    path("<uuid:pk>/history/", views.NoteHistoryView.as_view(), name="note_history"),
+    path("<uuid:pk>/history/<int:number>/restore/", views.NoteRestoreView.as_view(), name="note_restore"),
+    path("bulk/", views.NoteBulkActionView.as_view(), name="note_bulk"),
+    path("export/", views.NoteExportView.as_view(), name="note_export"),
+    path("import/", views.NoteImportView.as_view(), name="note_import"),
+    path("search/", views.NoteSearchView.as_view(), name="note_search"),
+    path("events/", views.NoteEventStreamView.as_view(), name="note_events"),
     
-    path("<uuid:pk>/favorite/", NoteFavoriteToggleView.as_view(), name="note_favorite_toggle"),
-    path("favourite/<int:is_favourite>", FavouriteNoteListView.as_view(), name="note_favorite_list"),
+    path("<uuid:pk>/favorite/", views.NoteFavoriteToggleView.as_view(), name="note_favorite_toggle"),
+    path("favourite/<int:is_favourite>", views.FavouriteNoteListView.as_view(), name="note_favorite_list"),
 ]
\ No newline at end of file
@@ -1,32 +1,99 @@
-import re
 import json
+import asyncio
+import logging
 
+from django.conf import settings
+from django.urls import reverse
 from django.views import View
-from django.db.models import Q
-from django.http import JsonResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.core.exceptions import BadRequest
 from django.utils.timezone import now
-from django.utils.safestring import mark_safe
-from django.utils.translation import gettext_lazy as _
+from django.utils.html import format_html
+from django.utils.translation import gettext_lazy as _, ngettext
+from django.utils.decorators import method_decorator
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.shortcuts import render, get_object_or_404, redirect
+from django.template.loader import render_to_string
 
+from accounts.mixins import AsyncLoginRequiredMixin
+
+from . import events
 from .models import Note
-from .forms import NoteForm
+from .forms import NoteForm, NoteBulkActionForm, NoteImportForm
+from .bulk import bulk_delete, bulk_set_favourite
+from .export import get_exporter
+from .importer import ImportFailed, detect_format, import_notes
+from .highlight import Highlighter
+from .revisions import get_history, get_revision_content
+from .search import add_compressed_excerpts, parse_terms, with_excerpts
+from .cache import NoteSearch
+from .pagination import KeysetPaginator, RankedPaginator
+from .conditional import conditional_notes
+
+
+logger = logging.getLogger(__name__)
 
 
-class NoteListView(LoginRequiredMixin, View):
+class NotePaginationMixin:
+    """
+    Serve note lists one keyset page at a time.
+
+    Requests carrying a ``cursor`` come from the load-more sentinel and only
+    get the next page fragment back.
+    """
+    page_template_name = "note/partials/note_page.html"
+
+    def paginate(self, request, notes, base_url=None, params=None, search=None):
+        try:
+            return self.get_paginator(notes, search).page(
+                request.GET.get("cursor"),
+                base_url=base_url or request.path,
+                params=params,
+            )
+        except ValueError:
+            raise BadRequest(_("Invalid cursor."))
+
+    async def apaginate(self, request, notes, base_url=None, params=None, search=None):
+        try:
+            return await self.get_paginator(notes, search).apage(
+                request.GET.get("cursor"),
+                base_url=base_url or request.path,
+                params=params,
+            )
+        except ValueError:
+            raise BadRequest(_("Invalid cursor."))
+
+    def get_paginator(self, notes, search=None):
+        if search is None:
+            return KeysetPaginator(notes)
+        return RankedPaginator(notes, search)
+
+    def is_next_page(self, request):
+        return "cursor" in request.GET
+
+
+@method_decorator(conditional_notes(), name="get")
+class NoteListView(LoginRequiredMixin, NotePaginationMixin, View):
     """
     Display a list of all notes belonging to the logged-in user.
     """
     def get(self, request):
+        notes = self.paginate(request, Note.objects.filter(owner=request.user).for_cards())
+        return self.render_notes(request, notes)
+
+    def render_notes(self, request, notes):
+        if self.is_next_page(request):
+            return render(request, self.page_template_name, {"notes": notes})
+        
         form = NoteForm()
-        notes = Note.objects.filter(owner=request.user).order_by("-updated_at")
         return render(
             request, 
             "note/index.html", 
             {
                 "notes": notes,
                 "form": form,
+                "import_form": NoteImportForm(),
                 "title": "Notes"
             }
         )
@@ -52,31 +119,40 @@ class NoteCreateView(LoginRequiredMixin, View):
             note = form.save(commit=False)
             note.owner = request.user
             note.save()
+            
+            # The empty-state placeholder only exists while this is the sole note
+            is_first_note = not (
+                Note.objects.filter(owner=request.user).exclude(pk=note.pk).exists()
+            )
+            return self.created_response(request, note, is_first_note)
 
-            # Success message and updated list
-            message = _("New note was created successfully.")
-            notes = Note.objects.filter(owner=request.user).order_by("-updated_at")
+        return self.invalid_response(request, form)
 
-            # Return new note partial (HTMX target)
-            response = render(
-                request,
-                "note/partials/note_list.html",
-                {
-                    "notes": notes,
-                }
-            )
-            
-            response.status_code = 201  # HTTP 201 Created
-            response["HX-Reswap"] = "innerHTML"
-            response["HX-Retarget"] = f"#note-list"
-            response["HX-Trigger"] = json.dumps({
-                "noteCreated": {
-                    "message": str(message)
-                } 
-            })
+    def created_response(self, request, note, is_first_note):
+        message = _("New note was created successfully.")
 
-            return response
+        # Return only the new note, prepended to the list (HTMX target)
+        response = render(
+            request,
+            "note/partials/note_created.html",
+            {
+                "note": note,
+                "is_first_note": is_first_note,
+            }
+        )
+        
+        response.status_code = 201  # HTTP 201 Created
+        response["HX-Reswap"] = "afterbegin"
+        response["HX-Retarget"] = f"#note-list"
+        response["HX-Trigger"] = json.dumps({
+            "noteCreated": {
+                "message": str(message)
+            } 
+        })
 
+        return response
+
+    def invalid_response(self, request, form):
         # If form is invalid, return the form partial with errors
         response = render(
             request,
@@ -95,11 +171,14 @@ class NoteUpdateView(LoginRequiredMixin, View):
     """
     def get(self, request, pk):
         note = get_object_or_404(Note, pk=pk, owner=request.user)
+        return self.form_response(request, note)
+
+    def form_response(self, request, note):
         form = NoteForm(instance=note)
         
         return render (
             request,
-            "note/partials/edit_note_form.html",
+            "note/partials/edit_note_modal_content.html",
             {
                 "form": form, 
                 "note": note,
@@ -112,26 +191,30 @@ class NoteUpdateView(LoginRequiredMixin, View):
         
         if form.is_valid():
             note = form.save()
-            message = _("Note updated successfully.")
+            return self.updated_response(request, note)
 
-            # Return new note partial (HTMX target)
-            response = render(
-                request,
-                "note/partials/note_item.html",
-                {"note": note}
-            )
-            
-            response.status_code = 201  # HTTP 201 Updated
-            response["HX-Reswap"] = "outerHTML"
-            response["HX-Retarget"] = f"#note-{note.id}"
-            response["HX-Trigger"] = json.dumps({
-                "noteUpdated": {
-                    "message": str(message), 
-                    "noteId": str(note.id)
-                } 
-            })
-            return response
-          
+        return self.invalid_response(request, form, note)
+
+    def updated_response(self, request, note, message=_("Note updated successfully.")):
+        # Return new note partial (HTMX target)
+        response = render(
+            request,
+            "note/partials/note_item.html",
+            {"note": note}
+        )
+        
+        response.status_code = 201  # HTTP 201 Updated
+        response["HX-Reswap"] = "outerHTML"
+        response["HX-Retarget"] = f"#note-{note.id}"
+        response["HX-Trigger"] = json.dumps({
+            "noteUpdated": {
+                "message": str(message), 
+                "noteId": str(note.id)
+            } 
+        })
+        return response
+
+    def invalid_response(self, request, form, note):
         # If form is invalid, return the form partial with errors
         response = render(
             request,
@@ -147,21 +230,83 @@ class NoteUpdateView(LoginRequiredMixin, View):
         return response
 
 
+class NoteHistoryView(LoginRequiredMixin, View):
+    """
+    List the saved versions of a note, newest first, in the edit modal.
+
+    ``NOTE_REVISION_HISTORY_PAGE_SIZE`` versions at a time; ``?before=<number>``
+    renders the next older ones, which the modal appends to its list.
+    """
+    def get(self, request, pk):
+        note = get_object_or_404(Note, pk=pk, owner=request.user)
+        current = note.get_content()
+        page_size = getattr(settings, "NOTE_REVISION_HISTORY_PAGE_SIZE", 10)
+
+        try:
+            before = int(request.GET["before"])
+        except (KeyError, ValueError):
+            before = None
+
+        # One more than shown tells whether there are older versions.
+        history = get_history(note, before=before, limit=page_size + 1)
+        versions = [
+            {"revision": revision, "content": content, "is_current": content == current}
+            for revision, content in history[:page_size]
+        ]
+        older_url = None
+        if len(history) > page_size:
+            oldest = versions[-1]["revision"].number
+            older_url = f"{reverse('note:note_history', args=[note.pk])}?before={oldest}"
+
+        template = "note/partials/note_history.html"
+        if before is not None:
+            template = "note/partials/note_history_page.html"
+        return render(request, template, {"note": note, "versions": versions, "older_url": older_url})
+
+
+class NoteRestoreView(NoteUpdateView):
+    """
+    Save a note with the content of one of its revisions.
+
+    The restore becomes the newest revision, so it can be undone the same way.
+    """
+    http_method_names = ["post", "options"]
+
+    def post(self, request, pk, number):
+        note = get_object_or_404(Note, pk=pk, owner=request.user)
+        content = get_revision_content(note, number)
+        if content is None:
+            raise Http404("No revision matches the given query.")
+
+        for name, value in content.items():
+            setattr(note, name, value)
+        note.save()
+
+        message = _("Note restored to version %(number)s.") % {"number": number}
+        return self.updated_response(request, note, message)
+
+
 class NoteDeleteView(LoginRequiredMixin, View):
     """
     Handle deletion of a note.
     """
     def post(self, request, pk):
         note = get_object_or_404(Note, pk=pk, owner=request.user)
+        note_id = note.id
         note.delete()
-        notes = Note.objects.filter(owner=request.user).order_by("-updated_at")
+        has_notes = Note.objects.filter(owner=request.user).exists()
+        return self.deleted_response(request, note_id, has_notes)
+
+    def deleted_response(self, request, note_id, has_notes):
         message = _("Note deleted successfully.")
         
+        # Out-of-band removal of the card, plus the empty state if it was the last one
         response = render(
             request,
-            "note/partials/note_list.html",
+            "note/partials/note_deleted.html",
             {
-                "notes": notes
+                "deleted_ids": [note_id],
+                "has_notes": has_notes,
             }
         )
         
@@ -175,92 +320,319 @@ class NoteDeleteView(LoginRequiredMixin, View):
         return response
 
 
-class FavouriteNoteListView(LoginRequiredMixin, View):
+class NoteBulkActionView(LoginRequiredMixin, View):
+    """
+    Delete, favourite or unfavourite many notes in one request.
+    """
+    def post(self, request):
+        form = NoteBulkActionForm(request.POST)
+        
+        if not form.is_valid():
+            error = next(iter(form.errors.values()))[0]
+            response = HttpResponse(status=400)  # HTTP 400 Bad Request
+            response["HX-Trigger"] = json.dumps({
+                "noteBulkAction": {
+                    "message": str(error),
+                }
+            })
+            return response
+        
+        action = form.cleaned_data["action"]
+        note_ids = form.cleaned_data["note_ids"]
+        
+        if action == NoteBulkActionForm.DELETE:
+            deleted_ids = bulk_delete(request.user, note_ids)
+            notes = []
+            count = len(deleted_ids)
+            message = ngettext(
+                "%(count)d note deleted successfully.",
+                "%(count)d notes deleted successfully.",
+                count,
+            )
+        else:
+            deleted_ids = []
+            notes = bulk_set_favourite(
+                request.user, note_ids, action == NoteBulkActionForm.FAVOURITE
+            )
+            count = len(notes)
+            if action == NoteBulkActionForm.FAVOURITE:
+                message = ngettext(
+                    "%(count)d note added to favourites.",
+                    "%(count)d notes added to favourites.",
+                    count,
+                )
+            else:
+                message = ngettext(
+                    "%(count)d note removed from favourites.",
+                    "%(count)d notes removed from favourites.",
+                    count,
+                )
+        
+        # Out-of-band swaps only: removed cards, re-rendered cards, empty state
+        response = render(
+            request,
+            "note/partials/note_bulk.html",
+            {
+                "deleted_ids": deleted_ids,
+                "notes": notes,
+                "has_notes": not deleted_ids or Note.objects.filter(owner=request.user).exists(),
+            }
+        )
+        
+        response.status_code = 201  # HTTP 201 Updated
+        response["HX-Trigger"] = json.dumps({
+            "noteBulkAction": {
+                "message": message % {"count": count},
+                "action": action,
+                "count": count,
+            }
+        })
+        
+        return response
+
+
+@method_decorator(conditional_notes(), name="get")
+class FavouriteNoteListView(LoginRequiredMixin, NotePaginationMixin, View):
     """
     Display a list of favourites notes belonging to the logged-in user.
     """
     def get(self, request, is_favourite):
-        
+        notes = self.paginate(request, self.get_queryset(request, is_favourite))
+        return self.render_notes(request, notes)
+
+    def get_queryset(self, request, is_favourite):
         if bool(is_favourite):
-            notes = Note.objects.filter(owner=request.user, is_favourite=True).order_by("-updated_at")
-        else:
-            notes = Note.objects.filter(owner=request.user).order_by("-updated_at")
+            return Note.objects.filter(owner=request.user, is_favourite=True).for_cards()
+        return Note.objects.filter(owner=request.user).for_cards()
+
+    def render_notes(self, request, notes):
+        template_name = self.page_template_name if self.is_next_page(request) else "note/partials/note_list.html"
                
         return render(
             request,
-            "note/partials/note_list.html",
+            template_name,
             {
                 "notes": notes
             }
         )     
   
         
+class NoteExportView(LoginRequiredMixin, View):
+    """
+    Stream all of the logged-in user's notes as NDJSON, CSV or a Markdown zip.
+    """
+    def get(self, request):
+        try:
+            exporter_class = get_exporter(request.GET.get("format", "ndjson"))
+        except KeyError:
+            raise BadRequest(_("Unknown export format."))
+        
+        exporter = exporter_class.for_owner(request.user)
+        filename = f"notes-{now():%Y-%m-%d}.{exporter.extension}"
+        
+        response = StreamingHttpResponse(exporter, content_type=exporter.content_type)
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        response["Cache-Control"] = "private, no-store"
+        return response
+
+
+class NoteImportView(LoginRequiredMixin, View):
+    """
+    Import notes from an uploaded NDJSON, CSV or Markdown file.
+    """
+    def post(self, request):
+        form = NoteImportForm(request.POST, request.FILES)
+
+        if form.is_valid() and not form.cleaned_data["format"]:
+            try:
+                form.cleaned_data["format"] = detect_format(form.cleaned_data["file"].name)
+            except KeyError:
+                form.add_error("file", _("Unsupported file type; upload .ndjson, .csv, .md or .zip."))
+
+        if not form.is_valid():
+            error = next(iter(form.errors.values()))[0]
+            response = render(request, "note/partials/note_import_result.html", {"error": error})
+            response.status_code = 400  # HTTP 400 Bad Request
+            return response
+
+        upload = form.cleaned_data["file"]
+        status = 201  # HTTP 201 Created
+        error = None
+
+        try:
+            report = import_notes(
+                request.user,
+                upload.file,
+                form.cleaned_data["format"],
+                name=upload.name,
+                start=form.cleaned_data["resume_from"] or 0,
+            )
+        except ImportFailed as e:
+            # The rows before the failed batch are in; report them so the
+            # user can resume, and keep the cause for the logs.
+            logger.exception("Import of %r for user %s failed.", upload.name, request.user.pk)
+            report = e.report
+            error = _("The import stopped before the end of the file.")
+            status = 422  # HTTP 422 Unprocessable Content
+
+        message = ngettext(
+            "%(count)d note imported.",
+            "%(count)d notes imported.",
+            report.imported,
+        ) % {"count": report.imported}
+
+        response = render(
+            request,
+            "note/partials/note_import_result.html",
+            {
+                "report": report,
+                "error": error,
+            }
+        )
+        response.status_code = status
+        response["HX-Trigger"] = json.dumps({
+            "notesImported": {
+                "message": message,
+                **report.as_dict(),
+            }
+        })
+        return response
+
+
 class NoteFavoriteToggleView(LoginRequiredMixin, View):
     """
     Handle toggling favorite status of a note.
     """
     def post(self, request, pk):
-        note = get_object_or_404(Note, pk=pk, owner=request.user)
-        
-        # Toggle the favorite status
-        note.is_favourite = not note.is_favourite
-        note.save(update_fields=['is_favourite'])
+        # One owner-scoped UPDATE flips the flag and returns the row to render
+        notes = Note.objects.filter(pk=pk, owner=request.user).toggle("is_favourite")
+        return self.toggled_response(request, notes)
+
+    def toggled_response(self, request, notes):
+        if not notes:
+            raise Http404("No Note matches the given query.")
 
         return render(
             request,
             "note/partials/note_item.html",
             {
-                "note": get_object_or_404(Note, pk=pk)
+                "note": notes[0]
             }
         )
         
  
-class NoteSearchView(LoginRequiredMixin, View):
-    
-    @staticmethod
-    def highlight_query(text, query):
-        if not query:
-            return text
-        # Escape regex special chars in query
-        pattern = re.escape(query)
-        highlighted = re.sub(
-            pattern,
-            lambda m: f"<mark>{m.group(0)}</mark>",
-            text,
-            flags=re.IGNORECASE
-        )
-        return mark_safe(highlighted)
-
-
+class NoteSearchView(LoginRequiredMixin, NotePaginationMixin, View):
+    """
+    Search the logged-in user's notes, highlighting the matched terms.
+    """
     def get(self, request, *args, **kwargs):
         query = request.GET.get("search", "")
-        all_notes = Note.objects.filter(owner=request.user).order_by("-updated_at")
+        all_notes = Note.objects.filter(owner=request.user).for_cards()
+        cache_status = None
         
         if query:
-            notes = all_notes.filter(
-                Q(title__icontains=query)
-                | Q(description__icontains=query)
-            ).distinct()
-            
-            # Highlight results
-            for note in notes:
-                note.title = self.highlight_query(note.title, query)
-                note.description = self.highlight_query(note.description, query)
-
+            # Ranked ids come from the search cache or the full-text index
+            search = NoteSearch(request.user, query)
+            notes = self.paginate(request, with_excerpts(all_notes, parse_terms(query)), params={"search": query}, search=search)
+            add_compressed_excerpts(notes, parse_terms(query))
+            cache_status = search.cache_status
         else:
-            notes = all_notes
+            notes = self.paginate(request, all_notes)
             
+        return self.render_results(request, query, notes, cache_status)
+
+    def render_results(self, request, query, notes, cache_status=None):
+        if query:
+            # Highlight results, trimming the excerpts to the matched context
+            highlighter = Highlighter(parse_terms(query))
+            for note in notes:
+                note.title = highlighter.highlight(note.title)
+                note.preview = highlighter.snippets(
+                    note.excerpt, note.excerpt_start - 1, note.description_length,
+                )
+                note.is_highlighted = True
             
-        if query and not notes.exists():
-            no_results_message = mark_safe(f'No notes found matching <mark>{query}</mark>.')
+        if query and not notes:
+            no_results_message = format_html("No notes found matching <mark>{}</mark>.", query)
         else:
             no_results_message = None
             
-        return render(
+        template_name = self.page_template_name if self.is_next_page(request) else "note/partials/note_list.html"
+            
+        response = render(
             request, 
-            "note/partials/note_list.html",
+            template_name,
             {
                 "notes": notes, 
                 "no_results_message": no_results_message
             }
-        )       
\ No newline at end of file
+        )
+        
+        if cache_status:
+            response["X-Search-Cache"] = cache_status
+        return response
+
+
+class NoteEventStreamView(AsyncLoginRequiredMixin, View):
+    """
+    Stream the user's note changes as Server-Sent Events, each carrying the
+    out-of-band swaps that apply it to an open note list.
+
+    Always async: under ASGI an open stream waits on the broker in the event
+    loop rather than holding a worker thread. Under WSGI it answers 204,
+    which tells ``EventSource`` not to reconnect.
+    """
+    async def get(self, request):
+        if not isinstance(request, ASGIRequest):
+            return HttpResponse(status=204)
+
+        response = StreamingHttpResponse(self.stream(request), content_type="text/event-stream")
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"
+        return response
+
+    async def stream(self, request):
+        keepalive = getattr(settings, "NOTE_EVENTS_KEEPALIVE", 15)
+        channel = events.note_channel(request.user.pk)
+
+        async with events.get_broker().subscribe(channel) as subscription:
+            yield f"retry: {keepalive * 1000}\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.get(), keepalive)
+                except TimeoutError:
+                    # Lets proxies and the server notice closed connections.
+                    yield ": keepalive\n\n"
+                    continue
+
+                if event is None:
+                    # Events were dropped; the page reloads its list instead.
+                    yield self.format_event("note-resync", "")
+                    return
+
+                html = await self.render_event(request, event)
+                if html is not None:
+                    yield self.format_event(f"note-{event.type}", html)
+
+    async def render_event(self, request, event):
+        notes = Note.objects.filter(owner=request.user).for_cards()
+        context = {"event": event.type}
+
+        if event.type == events.DELETED:
+            context["deleted_ids"] = event.note_ids
+            context["has_notes"] = await notes.aexists()
+        else:
+            # Notes deleted since the event was published are left out.
+            changed = notes.filter(pk__in=event.note_ids).order_by("updated_at", "id")
+            context["notes"] = [note async for note in changed]
+            if not context["notes"]:
+                return None
+            if event.type == events.CREATED:
+                context["is_first_note"] = not await notes.exclude(pk__in=event.note_ids).aexists()
+
+        return render_to_string("note/partials/note_event.html", context, request=request)
+
+    @staticmethod
+    def format_event(name, data):
+        lines = "".join(f"data: {line}\n" for line in data.strip().splitlines()) or "data:\n"
+        return f"event: {name}\n{lines}\n"
@@ -0,0 +1,129 @@
+"""
+Helpers shared by the benchmark management commands.
+
+Benchmarks run against a throwaway test database, so they never touch the
+data of the configured database, and report plain JSON so results from
+different releases can be diffed or plotted.
+"""
+import os
+import sys
+import json
+import math
+import shutil
+import logging
+import platform
+import tempfile
+from contextlib import contextmanager
+
+import django
+from django.conf import settings
+from django.db import connection, connections
+from django.utils import timezone
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+
+def percentile(values, pct):
+    """
+    Nearest-rank percentile of ``values``; ``None`` when empty.
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(math.ceil(pct / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def summarize(values, digits=3):
+    """
+    Count, mean and the p50/p95/p99 percentiles of ``values``.
+    """
+    if not values:
+        return {"n": 0}
+    return {
+        "n": len(values),
+        "min": round(min(values), digits),
+        "mean": round(sum(values) / len(values), digits),
+        "p50": round(percentile(values, 50), digits),
+        "p95": round(percentile(values, 95), digits),
+        "p99": round(percentile(values, 99), digits),
+        "max": round(max(values), digits),
+    }
+
+
+def environment():
+    """
+    Describe where the numbers were taken.
+    """
+    return {
+        "started_at": timezone.now().isoformat(),
+        "python": platform.python_version(),
+        "django": django.get_version(),
+        "database": connection.vendor,
+        "platform": platform.platform(),
+    }
+
+
+@contextmanager
+def benchmark_database(verbosity=0, on_disk=False):
+    """
+    Run the block against a fresh test database, like the test runner does.
+
+    Static files are served from the sources, because the manifest storage
+    needs ``collectstatic`` to have run. With ``on_disk``, an SQLite test
+    database lives in a temporary file rather than in shared memory, where
+    concurrent writers fail on table locks at once instead of waiting.
+    Replicas read the test database, as under the test runner.
+    """
+    storages = {
+        **settings.STORAGES,
+        "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+    }
+
+    # Failing views show up as status codes in the report, not as tracebacks.
+    request_logger = logging.getLogger("django.request")
+    level = request_logger.level
+    request_logger.setLevel(logging.CRITICAL)
+
+    test_settings = connection.settings_dict["TEST"]
+    test_name = test_settings.get("NAME")
+    directory = None
+    if on_disk and connection.vendor == "sqlite" and not test_name:
+        directory = tempfile.mkdtemp(prefix="notes-benchmark-")
+        test_settings["NAME"] = os.path.join(directory, "benchmark.sqlite3")
+
+    mirrors = {
+        alias: connections[alias].settings_dict["NAME"]
+        for alias in connections
+        if connections[alias].settings_dict["TEST"].get("MIRROR") == connection.alias
+    }
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=verbosity, autoclobber=True)
+    for alias in mirrors:
+        connections[alias].close()
+        connections[alias].creation.set_as_test_mirror(connection.settings_dict)
+    try:
+        with override_settings(STORAGES=storages):
+            yield
+    finally:
+        for alias, name in mirrors.items():
+            connections[alias].close()
+            connections[alias].settings_dict["NAME"] = name
+        connection.creation.destroy_test_db(old_name, verbosity=verbosity)
+        teardown_test_environment()
+        request_logger.setLevel(level)
+        test_settings["NAME"] = test_name
+        if directory:
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+def write_report(report, output="-", stdout=None):
+    """
+    Write ``report`` as indented JSON to ``output``, or to ``stdout`` for '-'.
+    """
+    text = json.dumps(report, indent=2) + "\n"
+    if output == "-":
+        (stdout or sys.stdout).write(text)
+        return
+    with open(output, "w") as f:
+        f.write(text)
@@ -0,0 +1,131 @@
+"""
+Database profiles and routing.
+
+``database_settings()`` builds ``DATABASES`` from the environment:
+
+``NOTES_DB_PROFILE``
+    ``development`` (default) opens a plain SQLite connection per request.
+    ``production`` turns on WAL and the pragmas below on every new
+    connection, starts transactions with ``BEGIN IMMEDIATE`` so concurrent
+    writers queue on the busy timeout instead of failing with "database is
+    locked", and keeps connections open for ``NOTES_DB_CONN_MAX_AGE`` seconds
+    with health checks.
+``NOTES_DB_NAME``, ``NOTES_DB_REPLICA_NAME``
+    The database file, and an optional replica that ``NoteReplicaRouter``
+    sends note reads to. A copy of the database file works as a replica.
+``NOTES_DB_CONN_MAX_AGE``, ``NOTES_DB_BUSY_TIMEOUT``, ``NOTES_DB_MMAP_SIZE``
+    Seconds a connection is reused, milliseconds a writer waits for a lock,
+    and bytes of the file SQLite memory-maps.
+"""
+import os
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+REPLICA_DB_ALIAS = "replica"
+
+PROFILES = ("development", "production")
+
+
+def _sqlite_pragmas(busy_timeout, mmap_size, read_only=False):
+    pragmas = [
+        "PRAGMA journal_mode=WAL",
+        # With WAL a commit only fsyncs at checkpoints; still safe on crashes.
+        "PRAGMA synchronous=NORMAL",
+        f"PRAGMA busy_timeout={busy_timeout}",
+        f"PRAGMA mmap_size={mmap_size}",
+    ]
+    if read_only:
+        pragmas.append("PRAGMA query_only=ON")
+    return "; ".join(pragmas) + ";"
+
+
+def database_settings(base_dir, environ=os.environ):
+    """
+    Return ``DATABASES`` for the profile named by ``NOTES_DB_PROFILE``.
+    """
+    profile = environ.get("NOTES_DB_PROFILE", "development")
+    if profile not in PROFILES:
+        raise ValueError(f"NOTES_DB_PROFILE must be one of {', '.join(PROFILES)}, not {profile!r}.")
+
+    production = profile == "production"
+    busy_timeout = int(environ.get("NOTES_DB_BUSY_TIMEOUT", 5000))
+    mmap_size = int(environ.get("NOTES_DB_MMAP_SIZE", 256 * 1024 * 1024))
+
+    def sqlite(name, read_only=False):
+        database = {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": name,
+            # Seconds; the busy_timeout pragma overrides it once connected.
+            "OPTIONS": {"timeout": busy_timeout / 1000},
+        }
+        if production:
+            database["CONN_MAX_AGE"] = int(environ.get("NOTES_DB_CONN_MAX_AGE", 600))
+            database["CONN_HEALTH_CHECKS"] = True
+            database["OPTIONS"]["init_command"] = _sqlite_pragmas(busy_timeout, mmap_size, read_only)
+            if not read_only:
+                database["OPTIONS"]["transaction_mode"] = "IMMEDIATE"
+        return database
+
+    databases = {
+        DEFAULT_DB_ALIAS: sqlite(environ.get("NOTES_DB_NAME", base_dir / "db.sqlite3")),
+    }
+
+    replica_name = environ.get("NOTES_DB_REPLICA_NAME")
+    if replica_name:
+        databases[REPLICA_DB_ALIAS] = {
+            **sqlite(replica_name, read_only=True),
+            # The test database stands in for the replica in tests.
+            "TEST": {"MIRROR": DEFAULT_DB_ALIAS},
+        }
+
+    return databases
+
+
+class NoteReplicaRouter:
+    """
+    Send read-only ``Note`` queries to the ``replica`` database, if there is one.
+
+    Reads inside a transaction on ``default`` stay there, so a bulk action or
+    import reads its own uncommitted writes, and objects loaded from one
+    database keep using it for related lookups. Everything is written to and
+    migrated on ``default``.
+
+    A replica that lags behind can serve a page without a write the same user
+    just made; that is the trade for moving list and search reads off the
+    primary.
+    """
+    models = {"note.note"}
+
+    def replica_enabled(self):
+        return REPLICA_DB_ALIAS in settings.DATABASES
+
+    def db_for_read(self, model, **hints):
+        if model._meta.label_lower not in self.models or not self.replica_enabled():
+            return None
+
+        instance = hints.get("instance")
+        if instance is not None and instance._state.db:
+            return instance._state.db
+
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return REPLICA_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        # Without an answer Django writes to the instance's own database,
+        # which is the replica for a note (or its owner) read from there.
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the same rows as default.
+        databases = {DEFAULT_DB_ALIAS, REPLICA_DB_ALIAS}
+        if {obj1._state.db, obj2._state.db} <= databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == REPLICA_DB_ALIAS:
+            return False
+        return None
@@ -0,0 +1,310 @@
+"""
+Per-view request instrumentation.
+
+``MetricsMiddleware`` times SQL (through a wrapper installed on every
+database connection), template rendering (through the
+``TimedDjangoTemplates`` backend) and the whole request. It reports them
+in a ``Server-Timing`` header and folds them into in-process histograms
+labelled by resolved view name. ``MetricsView`` serves the histograms, and
+the note search cache counters, in the Prometheus text format to staff
+users.
+
+Histograms live in process memory: with several worker processes each one
+exposes its own, and Prometheus sums them per scrape target.
+"""
+import threading
+from bisect import bisect_left
+from contextvars import ContextVar
+from time import perf_counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse
+from django.views import View
+from django.template import TemplateDoesNotExist
+from django.template.backends.django import DjangoTemplates, Template, reraise
+from django.contrib.auth.mixins import UserPassesTestMixin
+
+from note.cache import get_search_cache
+
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram per label value, Prometheus style.
+    """
+
+    def __init__(self, name, help, buckets, label="view"):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.label = label
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_value, value):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_value)
+            if series is None:
+                # Bucket counts, then the +Inf bucket; plus the sum.
+                series = self._series[label_value] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+    @staticmethod
+    def _escape(value):
+        return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+
+        with self._lock:
+            series = sorted((label, list(counts), total) for label, (counts, total) in self._series.items())
+
+        for label_value, counts, total in series:
+            label = f'{self.label}="{self._escape(label_value)}"'
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{label},le="{bound}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{label}}} {total}")
+            lines.append(f"{self.name}_count{{{label}}} {cumulative}")
+
+        return "\n".join(lines)
+
+
+REQUEST_DURATION = Histogram(
+    "notes_request_duration_seconds",
+    "Time spent handling a request, by view.",
+    DURATION_BUCKETS,
+)
+DB_DURATION = Histogram(
+    "notes_request_db_duration_seconds",
+    "Time spent in SQL queries per request, by view.",
+    DURATION_BUCKETS,
+)
+DB_QUERIES = Histogram(
+    "notes_request_db_queries",
+    "SQL queries executed per request, by view.",
+    QUERY_COUNT_BUCKETS,
+)
+TEMPLATE_DURATION = Histogram(
+    "notes_request_template_duration_seconds",
+    "Time spent rendering templates per request, excluding SQL, by view.",
+    DURATION_BUCKETS,
+)
+
+HISTOGRAMS = (REQUEST_DURATION, DB_DURATION, DB_QUERIES, TEMPLATE_DURATION)
+
+
+class RequestTiming:
+    """
+    Accumulates the time split of one request.
+    """
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.template_db_time = 0.0
+        self.rendering = False
+
+    def __call__(self, execute, sql, params, many, context):
+        # connection.execute_wrapper hook.
+        start = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = perf_counter() - start
+            self.queries += 1
+            self.db_time += elapsed
+            if self.rendering:
+                self.template_db_time += elapsed
+
+    @property
+    def template_only_time(self):
+        # Lazy querysets evaluated while rendering count as SQL, not template.
+        return max(self.template_time - self.template_db_time, 0.0)
+
+
+_current_timing = ContextVar("notes_request_timing", default=None)
+
+
+def _time_query(execute, sql, params, many, context):
+    timing = _current_timing.get()
+    if timing is None:
+        return execute(sql, params, many, context)
+    return timing(execute, sql, params, many, context)
+
+
+def install_query_timer(connection, **kwargs):
+    """
+    Add the query timer to ``connection``'s execute wrappers, once.
+
+    The timer finds the request through a context variable, which async views
+    carry into the threads their ORM calls run in; a per-request
+    ``execute_wrapper`` would only see the event loop thread's connections.
+    """
+    if _time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_time_query)
+
+
+connection_created.connect(install_query_timer)
+
+
+class TimedTemplate(Template):
+    """
+    Django template that adds its outermost render time to the current request.
+    """
+
+    def render(self, context=None, request=None):
+        timing = _current_timing.get()
+        if timing is None or timing.rendering:
+            return super().render(context, request)
+
+        timing.rendering = True
+        start = perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            timing.template_time += perf_counter() - start
+            timing.rendering = False
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """
+    The Django template backend, returning ``TimedTemplate`` instances.
+    """
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return TimedTemplate(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
+
+
+class MetricsMiddleware:
+    """
+    Time SQL, templates and the whole request; add ``Server-Timing``.
+
+    Place it first in ``MIDDLEWARE`` so session and auth queries count too.
+    The body of a streaming response is produced after this middleware
+    returns, so only the time to start the stream is measured. It runs in
+    both modes, so it does not push async requests through a thread.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        # Connections opened before this module was imported missed the signal.
+        for connection in connections.all(initialized_only=True):
+            install_query_timer(connection)
+
+        timing = RequestTiming()
+        token = _current_timing.set(timing)
+        start = perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_timing.reset(token)
+        return self.finish(request, response, timing, start)
+
+    async def __acall__(self, request):
+        timing = RequestTiming()
+        token = _current_timing.set(timing)
+        start = perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current_timing.reset(token)
+        return self.finish(request, response, timing, start)
+
+    def finish(self, request, response, timing, start):
+        total = perf_counter() - start
+        template = timing.template_only_time
+        app = max(total - timing.db_time - template, 0.0)
+
+        response["Server-Timing"] = ", ".join((
+            f'db;dur={timing.db_time * 1000:.1f};desc="{timing.queries} queries"',
+            f"tpl;dur={template * 1000:.1f}",
+            f"app;dur={app * 1000:.1f}",
+            f"total;dur={total * 1000:.1f}",
+        ))
+
+        view = self.view_name(request)
+        REQUEST_DURATION.observe(view, total)
+        DB_DURATION.observe(view, timing.db_time)
+        DB_QUERIES.observe(view, timing.queries)
+        TEMPLATE_DURATION.observe(view, template)
+
+        return response
+
+    @staticmethod
+    def view_name(request):
+        match = getattr(request, "resolver_match", None)
+        if match is None:
+            # 404s and requests answered by middleware; keep the label set bounded.
+            return "<unresolved>"
+        return match.view_name or match._func_path
+
+
+def render_search_cache():
+    """
+    The lookup counters and size of this process's note search cache.
+    """
+    stats = get_search_cache().stats()
+    return "\n".join([
+        "# HELP notes_search_cache_lookups_total Note search cache lookups, by result.",
+        "# TYPE notes_search_cache_lookups_total counter",
+        *(
+            f'notes_search_cache_lookups_total{{result="{result}"}} {stats[key]}'
+            for result, key in (("hit", "hits"), ("refine", "refinements"), ("miss", "misses"))
+        ),
+        "# HELP notes_search_cache_users Users with cached note searches.",
+        "# TYPE notes_search_cache_users gauge",
+        f"notes_search_cache_users {stats['users']}",
+        "# HELP notes_search_cache_entries Cached note searches.",
+        "# TYPE notes_search_cache_entries gauge",
+        f"notes_search_cache_entries {stats['entries']}",
+    ])
+
+
+def render_metrics():
+    parts = [histogram.render() for histogram in HISTOGRAMS]
+    parts.append(render_search_cache())
+    return "\n".join(parts) + "\n"
+
+
+class MetricsView(UserPassesTestMixin, View):
+    """
+    Serve the request histograms and search cache counters in the
+    Prometheus text format to staff.
+    """
+    raise_exception = True
+
+    def test_func(self):
+        return self.request.user.is_active and self.request.user.is_staff
+
+    def get(self, request):
+        return HttpResponse(render_metrics(), content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -1,5 +1,8 @@
+import os
 from pathlib import Path
 
+from .database import database_settings
+
 # Build paths inside the project like this: BASE_DIR / "subdir".
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -39,6 +42,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so every other middleware's queries are timed too.
+    "notes_app.metrics.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -52,7 +57,8 @@ ROOT_URLCONF = "notes_app.urls"
 
 TEMPLATES = [
     {
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        # DjangoTemplates, plus render timing for MetricsMiddleware.
+        "BACKEND": "notes_app.metrics.TimedDjangoTemplates",
         "DIRS": [BASE_DIR / "notes_app/templates"],
         "APP_DIRS": True,
         "OPTIONS": {
@@ -71,13 +77,47 @@ WSGI_APPLICATION = "notes_app.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
+# Profile, file names and tuning come from NOTES_DB_* environment variables;
+# see notes_app/database.py.
+DATABASES = database_settings(BASE_DIR)
+
+# Note reads go to the "replica" database when NOTES_DB_REPLICA_NAME is set.
+DATABASE_ROUTERS = ["notes_app.database.NoteReplicaRouter"]
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+CACHES = {
     "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "OPTIONS": {
+            # Room for rendered note cards
+            "MAX_ENTRIES": 10000,
+        },
     }
 }
 
+# Sessions and the user row behind request.user are cached only in a cache
+# every worker process shares, or a logout or password change would only
+# reach the worker that handled it. Set NOTES_REDIS_URL to add one; without
+# it sessions are read from the database and user rows are not cached.
+NOTES_REDIS_URL = os.environ.get("NOTES_REDIS_URL")
+if NOTES_REDIS_URL:
+    CACHES["shared"] = {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": NOTES_REDIS_URL,
+    }
+    # Read from the cache and written through to the database.
+    SESSION_ENGINE = "django.contrib.sessions.backends.cached_db"
+    SESSION_CACHE_ALIAS = "shared"
+
+
+# Authentication
+# The user row behind request.user is cached in USER_CACHE; see
+# accounts/backends.py.
+AUTHENTICATION_BACKENDS = ["accounts.backends.CachedModelBackend"]
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -140,8 +180,19 @@ STORAGES = {
     "staticfiles": {
         "BACKEND": "django.contrib.staticfiles.storage.ManifestStaticFilesStorage",
     },
+    # Avatars are named after a hash of their content, so identical images
+    # share one file.
+    "avatars": {
+        "BACKEND": "accounts.storage.ContentAddressedFileSystemStorage",
+    },
 }
 
+# The default handlers, also hashing each upload while it streams in.
+FILE_UPLOAD_HANDLERS = [
+    "accounts.uploadhandlers.HashingMemoryFileUploadHandler",
+    "accounts.uploadhandlers.HashingTemporaryFileUploadHandler",
+]
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -151,4 +202,97 @@ AUTH_USER_MODEL = "accounts.User"
 
 LOGIN_REDIRECT_URL = "/dashboard/"
 
-LOGOUT_REDIRECT_URL = "/"
\ No newline at end of file
+LOGOUT_REDIRECT_URL = "/"
+
+# Notes
+# Number of notes rendered per keyset page / "load more" request.
+NOTE_PAGE_SIZE = 24
+
+# Characters of context kept on each side of a search match, and the
+# number of snippets shown per note description.
+NOTE_SEARCH_SNIPPET_CHARS = 80
+NOTE_SEARCH_MAX_SNIPPETS = 3
+
+# Characters of a matching description read from the database to cut the
+# search snippets from; matches past it are not shown.
+NOTE_SEARCH_EXCERPT_CHARS = 2000
+
+# Note descriptions of at least this many characters are stored compressed
+# (note/fields.py) with NOTE_COMPRESSION_CODEC: "zstd", "zlib", or None for
+# zstd when the zstandard package is installed and zlib otherwise. Once zstd
+# is used, every process reading the database needs zstandard.
+NOTE_COMPRESSION_MIN_LENGTH = 2048
+NOTE_COMPRESSION_CODEC = None
+
+# Cache alias and lifetime for rendered note cards (note_item.html).
+NOTE_FRAGMENT_CACHE = "default"
+NOTE_FRAGMENT_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Number of daily buckets the dashboard reads from NoteDailyStats.
+NOTE_STATS_CHART_DAYS = 90
+
+# Per-process search result cache: users kept, queries kept per user, and the
+# largest result set that is cached (larger ones are paged by the backend).
+NOTE_SEARCH_CACHE_USERS = 256
+NOTE_SEARCH_CACHE_ENTRIES = 16
+NOTE_SEARCH_CACHE_MAX_HITS = 500
+
+# Most notes one bulk delete / favourite request may touch.
+NOTE_BULK_MAX_NOTES = 500
+
+# Rows fetched per database round trip when streaming note exports.
+NOTE_EXPORT_CHUNK_SIZE = 2000
+
+# Notes written per bulk_create transaction when importing.
+NOTE_IMPORT_BATCH_SIZE = 500
+
+# Serve the note list, detail, CRUD and search views and the dashboard from
+# their async implementations (note/async_views.py, dashboard/async_views.py).
+# Only worthwhile under ASGI (notes_app/asgi.py); under WSGI each async view
+# runs in an event loop of its own.
+NOTE_ASYNC_VIEWS = False
+
+# Pub/sub carrying note changes to the live event stream (/notes/events/).
+# The in-process broker only reaches streams served by the same process.
+# Streams send a keepalive comment after this many idle seconds, and a page
+# whose stream falls this many events behind reloads its list instead.
+NOTE_EVENTS_BROKER = "note.events.InProcessBroker"
+NOTE_EVENTS_KEEPALIVE = 15
+NOTE_EVENTS_MAX_QUEUED = 100
+
+# Every Nth revision of a note stores its full content, the rest a diff from
+# the revision before, so rebuilding a version replays at most N revisions.
+# ``compact_note_revisions`` keeps one revision a day for those older than
+# NOTE_REVISION_COMPACT_AFTER_DAYS. The history modal lists
+# NOTE_REVISION_HISTORY_PAGE_SIZE versions at a time.
+NOTE_REVISION_SNAPSHOT_INTERVAL = 10
+NOTE_REVISION_COMPACT_AFTER_DAYS = 30
+NOTE_REVISION_HISTORY_PAGE_SIZE = 10
+
+
+# Accounts
+# Cache alias and lifetime, in seconds, for the user row of each session;
+# None to load it from the database. The cache must be shared by every
+# process (accounts/checks.py).
+USER_CACHE = "shared" if NOTES_REDIS_URL else None
+USER_CACHE_TIMEOUT = 5 * 60
+
+
+# Avatars
+# Uploads are checked against these from their header, before any decoding.
+AVATAR_MAX_UPLOAD_SIZE = 2 * 1024 * 1024
+AVATAR_MAX_PIXELS = 4096 * 4096
+
+# Square variants generated for every uploaded avatar, in px, as JPEG and WebP.
+AVATAR_SIZES = (40, 128, 256)
+AVATAR_QUALITY = 85
+
+# Variants are resized on this many background threads after the upload
+# commits; set AVATAR_VARIANTS_ASYNC = False to resize on commit in-thread.
+AVATAR_WORKERS = 2
+AVATAR_VARIANTS_ASYNC = True
+
+# Avatar files nobody references are deleted, when released or by
+# ``sweep_avatars``, only once they are this many seconds old, so uploads in
+# flight are left alone (saving an existing file refreshes its time).
+AVATAR_SWEEP_MIN_AGE = 60 * 60
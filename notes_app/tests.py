@@ -0,0 +1,213 @@
+import re
+from pathlib import Path
+from unittest import mock
+
+from django.db import connections, router
+from django.urls import reverse
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from accounts.models import User
+from note.models import Note
+from note.tests import TEST_STORAGES, ClearCacheMixin
+
+from .database import NoteReplicaRouter, database_settings
+from .metrics import DB_QUERIES, HISTOGRAMS, REQUEST_DURATION, TEMPLATE_DURATION, Histogram
+
+
+SERVER_TIMING_RE = re.compile(
+    r'^db;dur=[\d.]+;desc="(\d+) queries", tpl;dur=([\d.]+), app;dur=[\d.]+, total;dur=[\d.]+$'
+)
+
+
+class HistogramTests(SimpleTestCase):
+
+    def test_render(self):
+        histogram = Histogram("test_seconds", "Test durations.", (0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 3.0):
+            histogram.observe('a "quoted"\nview', value)
+
+        self.assertEqual(histogram.render().splitlines(), [
+            "# HELP test_seconds Test durations.",
+            "# TYPE test_seconds histogram",
+            'test_seconds_bucket{view="a \\"quoted\\"\\nview",le="0.1"} 2',
+            'test_seconds_bucket{view="a \\"quoted\\"\\nview",le="1.0"} 3',
+            'test_seconds_bucket{view="a \\"quoted\\"\\nview",le="+Inf"} 4',
+            'test_seconds_sum{view="a \\"quoted\\"\\nview"} 3.65',
+            'test_seconds_count{view="a \\"quoted\\"\\nview"} 4',
+        ])
+
+        histogram.reset()
+        self.assertEqual(len(histogram.render().splitlines()), 2)
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class MetricsMiddlewareTests(ClearCacheMixin, TestCase):
+    """
+    Every request gets a ``Server-Timing`` header and is counted in the
+    histograms under its view name, in sync and async mode alike.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("owner@example.com", "s3cret-pass!")
+        Note.objects.create(owner=cls.user, title="Groceries", description="Milk")
+
+    def setUp(self):
+        super().setUp()
+        for histogram in HISTOGRAMS:
+            histogram.reset()
+            self.addCleanup(histogram.reset)
+
+    def series(self, histogram, view):
+        counts, total = histogram._series[view]
+        return sum(counts), total
+
+    def assertTimed(self, response, view):
+        match = SERVER_TIMING_RE.match(response["Server-Timing"])
+        self.assertIsNotNone(match, response["Server-Timing"])
+        queries, template_ms = int(match[1]), float(match[2])
+        self.assertGreater(queries, 0)
+        self.assertGreater(template_ms, 0)
+
+        self.assertEqual(self.series(REQUEST_DURATION, view)[0], 1)
+        self.assertEqual(self.series(TEMPLATE_DURATION, view)[0], 1)
+        self.assertEqual(self.series(DB_QUERIES, view), (1, queries))
+
+    def test_sync(self):
+        self.client.force_login(self.user)
+        self.assertTimed(self.client.get(reverse("note:note_list")), "note:note_list")
+
+    async def test_async(self):
+        await self.async_client.aforce_login(self.user)
+        self.assertTimed(await self.async_client.get(reverse("note:note_list")), "note:note_list")
+
+    def test_unresolved(self):
+        response = self.client.get("/no-such-page/")
+        self.assertEqual(response.status_code, 404)
+        self.assertIn("<unresolved>", REQUEST_DURATION._series)
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class MetricsViewTests(ClearCacheMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("owner@example.com", "s3cret-pass!")
+        cls.staff = User.objects.create_user("staff@example.com", "s3cret-pass!", is_staff=True)
+
+    def test_staff_only(self):
+        self.assertEqual(self.client.get(reverse("metrics")).status_code, 403)
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(reverse("metrics")).status_code, 403)
+
+    def test_prometheus_text(self):
+        self.client.force_login(self.staff)
+        self.client.get(reverse("note:note_search"), {"search": "milk"})
+
+        response = self.client.get(reverse("metrics"))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain; version=0.0.4"))
+        content = response.content.decode()
+        for histogram in HISTOGRAMS:
+            self.assertIn(f"# TYPE {histogram.name} histogram", content)
+        self.assertIn('notes_request_duration_seconds_count{view="note:note_search"}', content)
+        self.assertRegex(content, r'notes_search_cache_lookups_total\{result="miss"\} [1-9]')
+
+
+class DatabaseSettingsTests(SimpleTestCase):
+
+    def test_development(self):
+        databases = database_settings(Path("/srv/notes"), {})
+        self.assertEqual(list(databases), ["default"])
+        self.assertEqual(databases["default"]["NAME"], Path("/srv/notes/db.sqlite3"))
+        self.assertNotIn("CONN_MAX_AGE", databases["default"])
+        self.assertNotIn("init_command", databases["default"]["OPTIONS"])
+
+    def test_production(self):
+        databases = database_settings(Path("/srv/notes"), {
+            "NOTES_DB_PROFILE": "production",
+            "NOTES_DB_REPLICA_NAME": "/srv/replica.sqlite3",
+            "NOTES_DB_BUSY_TIMEOUT": "2000",
+        })
+        default, replica = databases["default"], databases["replica"]
+        self.assertEqual((default["CONN_MAX_AGE"], default["CONN_HEALTH_CHECKS"]), (600, True))
+        self.assertEqual(default["OPTIONS"]["transaction_mode"], "IMMEDIATE")
+        self.assertEqual(default["OPTIONS"]["timeout"], 2)
+        for pragma in ("journal_mode=WAL", "synchronous=NORMAL", "busy_timeout=2000", "mmap_size="):
+            self.assertIn(pragma, default["OPTIONS"]["init_command"])
+        self.assertNotIn("query_only", default["OPTIONS"]["init_command"])
+
+        self.assertEqual(replica["NAME"], "/srv/replica.sqlite3")
+        self.assertIn("PRAGMA query_only=ON", replica["OPTIONS"]["init_command"])
+        self.assertNotIn("transaction_mode", replica["OPTIONS"])
+        self.assertEqual(replica["TEST"], {"MIRROR": "default"})
+
+    def test_unknown_profile(self):
+        with self.assertRaises(ValueError):
+            database_settings(Path("/srv/notes"), {"NOTES_DB_PROFILE": "staging"})
+
+
+@mock.patch.object(NoteReplicaRouter, "replica_enabled", return_value=True)
+class NoteReplicaRouterTests(SimpleTestCase):
+    """
+    Note reads go to the replica, everything else to ``default``.
+    """
+
+    def test_reads_and_writes(self, replica_enabled):
+        self.assertEqual(Note.objects.filter(title="Groceries").db, "replica")
+        self.assertEqual(Note.objects.select_for_update().db, "default")
+        self.assertEqual(router.db_for_write(Note), "default")
+        self.assertEqual(User.objects.all().db, "default")
+
+        replica_enabled.return_value = False
+        self.assertEqual(Note.objects.all().db, "default")
+
+    def test_reads_in_a_transaction_stay_on_default(self, replica_enabled):
+        with mock.patch.object(connections["default"], "in_atomic_block", True):
+            self.assertEqual(Note.objects.all().db, "default")
+
+    def test_related_lookups_follow_the_instance(self, replica_enabled):
+        note = Note(title="Groceries")
+        note._state.db = "default"
+        self.assertEqual(router.db_for_read(Note, instance=note), "default")
+        owner = User(id=1)
+        owner._state.db = "replica"
+        self.assertTrue(router.allow_relation(note, owner))
+
+    def test_instances_read_from_the_replica_are_written_to_default(self, replica_enabled):
+        note = Note(title="Groceries")
+        note._state.db = "replica"
+        self.assertEqual(router.db_for_write(Note, instance=note), "default")
+        owner = User(id=1)
+        owner._state.db = "replica"
+        self.assertEqual(router.db_for_write(User, instance=owner), "default")
+
+    def test_migrations_skip_the_replica(self, replica_enabled):
+        self.assertFalse(router.allow_migrate_model("replica", Note))
+        self.assertTrue(router.allow_migrate_model("default", Note))
+
+
+@mock.patch.object(NoteReplicaRouter, "replica_enabled", return_value=True)
+class NoteReplicaWriteTests(TestCase):
+    """
+    A note loaded from the replica is saved and deleted on ``default``.
+
+    The tests have no ``replica`` connection, so a write routed there fails.
+    """
+
+    def setUp(self):
+        self.owner = User.objects.create_user("replica@example.com", "password")
+        self.note = Note.objects.create(owner=self.owner, title="Original")
+        self.note._state.db = "replica"
+
+    def test_save(self, replica_enabled):
+        self.note.title = "Edited"
+        self.note.save()
+
+        self.assertEqual(self.note._state.db, "default")
+        self.assertEqual(Note.objects.using("default").get(pk=self.note.pk).title, "Edited")
+
+    def test_delete(self, replica_enabled):
+        self.note.delete()
+
+        self.assertFalse(Note.objects.using("default").filter(pk=self.note.pk).exists())